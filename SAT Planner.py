@@ -1,173 +1,19 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import json
 import os
-from datetime import datetime, timedelta
-import sys
-from pathlib import Path
-import calendar
-from tkcalendar import Calendar
-import random
-
-
-class SATTopics:
-    MATH_TOPICS = {
-        "Heart of Algebra": {
-            "Linear Equations": {
-                "subtopics": [
-                    "Single-variable equations",
-                    "Systems of linear equations",
-                    "Linear inequalities",
-                    "Graphing linear equations"
-                ],
-                "key_concepts": [
-                    "Solving for variables",
-                    "Understanding slope and y-intercept",
-                    "Interpreting graphs",
-                    "Word problems with linear relationships"
-                ],
-                "importance": "High - 25-30% of Math section"
-            },
-            "Linear Functions": {
-                "subtopics": [
-                    "Function notation",
-                    "Domain and range",
-                    "Function graphs",
-                    "Linear modeling"
-                ],
-                "key_concepts": [
-                    "Understanding f(x) notation",
-                    "Identifying functions",
-                    "Real-world applications",
-                    "Rate of change"
-                ],
-                "importance": "High - Part of algebra foundation"
-            }
-        },
-        "Problem Solving and Data Analysis": {
-            "Statistics": {
-                "subtopics": [
-                    "Mean, median, mode",
-                    "Standard deviation",
-                    "Interquartile range",
-                    "Data interpretation"
-                ],
-                "key_concepts": [
-                    "Calculating central tendency",
-                    "Understanding spread",
-                    "Reading charts and graphs",
-                    "Statistical significance"
-                ],
-                "importance": "Medium - 15-20% of Math section"
-            },
-            "Ratios and Proportions": {
-                "subtopics": [
-                    "Unit rates",
-                    "Proportional relationships",
-                    "Percentage problems",
-                    "Scale factors"
-                ],
-                "key_concepts": [
-                    "Setting up proportions",
-                    "Cross multiplication",
-                    "Unit conversion",
-                    "Real-world applications"
-                ],
-                "importance": "High - Frequently tested"
-            }
-        },
-        "Passport to Advanced Math": {
-            "Quadratic Equations": {
-                "subtopics": [
-                    "Factoring",
-                    "Completing the square",
-                    "Quadratic formula",
-                    "Graphing parabolas"
-                ],
-                "key_concepts": [
-                    "Finding roots",
-                    "Vertex form",
-                    "Maximum/minimum values",
-                    "Word problems"
-                ],
-                "importance": "High - 15-20% of Math section"
-            },
-            "Polynomial Functions": {
-                "subtopics": [
-                    "Operations with polynomials",
-                    "Polynomial factors",
-                    "Polynomial graphs",
-                    "Complex numbers"
-                ],
-                "key_concepts": [
-                    "Factor theorem",
-                    "Polynomial division",
-                    "End behavior",
-                    "Zeros of polynomials"
-                ],
-                "importance": "Medium - Advanced topic"
-            }
-        }
-    }
-
-    READING_TOPICS = {
-        "Command of Evidence": {
-            "Finding Evidence": {
-                "subtopics": [
-                    "Text citations",
-                    "Data interpretation",
-                    "Supporting claims",
-                    "Multiple sources"
-                ],
-                "key_concepts": [
-                    "Identifying relevant evidence",
-                    "Connecting ideas across passages",
-                    "Evaluating support",
-                    "Drawing conclusions"
-                ],
-                "importance": "High - Core reading skill"
-            }
-        },
-        "Words in Context": {
-            "Vocabulary": {
-                "subtopics": [
-                    "Context clues",
-                    "Multiple meanings",
-                    "Tone and connotation",
-                    "Academic vocabulary"
-                ],
-                "key_concepts": [
-                    "Using context",
-                    "Word families",
-                    "Denotation vs connotation",
-                    "Root words"
-                ],
-                "importance": "High - Throughout reading section"
-            }
-        }
-    }
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import date, timedelta
 
-    @classmethod
-    def add_new_topic(cls, subject, topic_name):
-        if subject == "Math":
-            cls.MATH_TOPICS[topic_name] = {}
-        else:
-            cls.READING_TOPICS[topic_name] = {}
+from satprep import StudyStore, create_storage
+from satprep.profiles import DEFAULT_PROFILE, PROFILES_DIR, ProfileStore
+from satprep.diagnostics import DIAGNOSTICS_FILE, PROFILE_FILE, Heartbeat, instrumentation
+from satprep.scheduler import StudyScheduler
+from satprep.heatmap import HeatmapLayout, effective_rating, rating_color
+from satprep.sharing import SHARE_POLL_INTERVAL
 
-    @classmethod
-    def add_new_subtopic(cls, subject, topic_name, subtopic_name):
-        new_subtopic = {
-            "subtopics": [],
-            "key_concepts": [],
-            "importance": "Not specified"
-        }
-        
-        if subject == "Math":
-            if topic_name in cls.MATH_TOPICS:
-                cls.MATH_TOPICS[topic_name][subtopic_name] = new_subtopic
-        else:
-            if topic_name in cls.READING_TOPICS:
-                cls.READING_TOPICS[topic_name][subtopic_name] = new_subtopic
+
+CHART_RANGES = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None}
 
 
 class ModernTheme:
@@ -238,8 +84,202 @@ class ModernTheme:
             foreground=[("selected", cls.DARKER_BG)])
 
 
+class MasteryHeatmap:
+    # Every leaf topic as a tile on one Canvas, colored by its rating. Only
+    # the screen is backed by canvas items: a pool of one rectangle per
+    # visible cell is recolored while scrolling and rebuilt only when the
+    # window or zoom changes, so the item count does not grow with the
+    # catalog.
+    MIN_TILE = 4
+    MAX_TILE = 48
+
+    def __init__(self, parent, store, on_open):
+        self.store = store
+        self.on_open = on_open
+        self.layout = None
+        self.tile = 14
+        self.top = 0              # first layout row in view
+        self.view_rows = 0
+        self.view_columns = 0
+        self.cells = []           # rectangle per screen cell, row-major
+        self.colors = []          # fill shown per cell; None while hidden
+        self.headers = []         # text item per screen row
+        self.header_texts = []
+        
+        self.frame = ttk.Frame(parent, style="Custom.TFrame")
+        self.info = ttk.Label(self.frame, style="Custom.TLabel")
+        self.info.pack(fill=tk.X, padx=5, pady=2)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.frame, bg=ModernTheme.DARKER_BG, highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        
+        self.canvas.bind("<Configure>", lambda event: self.resize())
+        self.canvas.bind("<MouseWheel>", lambda event: self.yview("scroll", -3 if event.delta > 0 else 3, "units"))
+        self.canvas.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+        self.canvas.bind("<Control-MouseWheel>", lambda event: self.zoom(1.25 if event.delta > 0 else 0.8))
+        self.canvas.bind("<Control-Button-4>", lambda event: self.zoom(1.25))
+        self.canvas.bind("<Control-Button-5>", lambda event: self.zoom(0.8))
+        self.canvas.bind("<Motion>", self.on_hover)
+        self.canvas.bind("<Leave>", lambda event: self.show_legend())
+        self.canvas.bind("<Button-1>", self.on_click)
+
+    def rebuild(self):
+        # Called after catalog changes; the layout is built on first display.
+        if self.layout is None:
+            return
+        self.layout.rebuild()
+        self.top = min(self.top, self.max_top())
+        self.render()
+
+    @instrumentation.timed()
+    def resize(self):
+        if self.layout is None:
+            self.layout = HeatmapLayout(self.store.registry)
+            self.show_legend()
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        columns = max(1, width // self.tile)
+        rows = height // self.tile + 1
+        if columns != self.layout.columns:
+            # Keep the first tile in view at the top across re-wrapping.
+            row = self.top + 1 if self.layout.row(self.top)[0] == "header" else self.top
+            first = self.layout.tile_at(row, 0)
+            self.layout.set_columns(columns)
+            cell = self.layout.cell(first) if first is not None else None
+            self.top = cell[0] if cell is not None else min(self.top, self.max_top())
+        if (rows, columns) != (self.view_rows, self.view_columns):
+            self.create_pool(rows, columns)
+        self.render()
+
+    def create_pool(self, rows, columns):
+        self.canvas.delete("all")
+        gap = 1 if self.tile >= 8 else 0
+        self.cells = []
+        self.headers = []
+        for row in range(rows):
+            y = row * self.tile
+            for column in range(columns):
+                x = column * self.tile
+                self.cells.append(self.canvas.create_rectangle(
+                    x, y, x + self.tile - gap, y + self.tile - gap,
+                    outline="", state="hidden"))
+            self.headers.append(self.canvas.create_text(
+                4, y + self.tile // 2, anchor="w", fill=ModernTheme.TEXT, state="hidden",
+                font=("Helvetica", max(7, min(12, self.tile - 4)), "bold")))
+        self.colors = [None] * len(self.cells)
+        self.header_texts = [None] * rows
+        self.view_rows, self.view_columns = rows, columns
+
+    @instrumentation.timed()
+    def render(self):
+        # Touches only the cells whose color or visibility changed.
+        if self.layout is None or not self.cells:
+            return
+        layout = self.layout
+        for screen_row in range(self.view_rows):
+            row = self.top + screen_row
+            base = screen_row * self.view_columns
+            content = layout.row(row) if row < layout.rows else None
+            header = None
+            if content is not None and content[0] == "header":
+                subject, leaves = layout.sections[content[1]]
+                header = f"{subject}  ·  {len(leaves)} topics"
+            self.set_header(screen_row, header)
+            for column in range(self.view_columns):
+                node_id = None
+                if content is not None and content[0] == "tiles":
+                    node_id = layout.tile_at(row, column)
+                color = None if node_id is None else rating_color(effective_rating(self.store, node_id))
+                self.paint(base + column, color)
+        rows = max(1, layout.rows)
+        self.scrollbar.set(self.top / rows, min(1.0, (self.top + self.view_rows) / rows))
+
+    def paint(self, cell, color):
+        if self.colors[cell] == color:
+            return
+        if color is None:
+            self.canvas.itemconfigure(self.cells[cell], state="hidden")
+        else:
+            self.canvas.itemconfigure(self.cells[cell], fill=color, state="normal")
+        self.colors[cell] = color
+
+    def set_header(self, screen_row, text):
+        if self.header_texts[screen_row] == text:
+            return
+        if text is None:
+            self.canvas.itemconfigure(self.headers[screen_row], state="hidden")
+        else:
+            self.canvas.itemconfigure(self.headers[screen_row], text=text, state="normal")
+        self.header_texts[screen_row] = text
+
+    def rating_changed(self, topic_id):
+        # A leaf repaints its own tile; a rating higher up can change every
+        # leaf below it that inherits it, so the visible cells are checked.
+        if self.layout is None:
+            return
+        cell = self.layout.cell(topic_id)
+        if cell is None:
+            self.render()
+            return
+        screen_row = cell[0] - self.top
+        if 0 <= screen_row < self.view_rows and cell[1] < self.view_columns:
+            self.paint(screen_row * self.view_columns + cell[1],
+                       rating_color(effective_rating(self.store, topic_id)))
+
+    def max_top(self):
+        return max(0, self.layout.rows - self.view_rows + 1)
+
+    def yview(self, action, amount, unit=None):
+        if self.layout is None:
+            return
+        if action == "moveto":
+            self.top = int(float(amount) * self.layout.rows)
+        elif unit == "pages":
+            self.top += int(amount) * max(1, self.view_rows - 1)
+        else:
+            self.top += int(amount)
+        self.top = max(0, min(self.top, self.max_top()))
+        self.render()
+
+    def zoom(self, factor):
+        tile = max(self.MIN_TILE, min(self.MAX_TILE, round(self.tile * factor)))
+        if tile == self.tile:
+            tile = max(self.MIN_TILE, min(self.MAX_TILE, self.tile + (1 if factor > 1 else -1)))
+        self.tile = tile
+        self.resize()
+
+    def node_at(self, x, y):
+        if self.layout is None:
+            return None
+        return self.layout.tile_at(self.top + int(y) // self.tile, int(x) // self.tile)
+
+    def on_hover(self, event):
+        node_id = self.node_at(event.x, event.y)
+        if node_id is None:
+            self.show_legend()
+            return
+        rating = self.store.get_rating(node_id)
+        if rating is None:
+            inherited = effective_rating(self.store, node_id)
+            rating = "not rated" if inherited is None else f"{inherited:.1f} (from parent)"
+        else:
+            rating = f"{rating:.1f}"
+        self.info.config(text=f"{' › '.join(self.store.path(node_id))}  —  {rating}")
+
+    def show_legend(self):
+        if self.layout is not None:
+            self.info.config(text=f"{len(self.layout)} topics  ·  red 1 → green 10  ·  "
+                                  f"scroll to browse, Ctrl+wheel to zoom, click to open")
+
+    def on_click(self, event):
+        node_id = self.node_at(event.x, event.y)
+        if node_id is not None:
+            self.on_open(node_id)
+
+
 class ModernSATStudyApp:
-    def __init__(self, root):
+    def __init__(self, root, storage=None, store=None, profiles=None, profile_name=None):
         self.root = root
         self.root.title("SAT Study Planner Pro")
         self.root.geometry("1400x800")
@@ -247,12 +287,25 @@ class ModernSATStudyApp:
         
         ModernTheme.apply_theme()
         
-        self.topics_data = SATTopics()
-        self.current_ratings = {}
-        self.topic_notes = {}
         self.selected_topic = None
+        self.scheduler = None
+        self.plan_calendar = None
+        self.plan_window = None
+        self.bulk_import = None
+        self.server = None
         
-        self.load_data()
+        # With a ProfileStore, each student has their own study data and the
+        # store is swapped when switching students.
+        self.profiles = profiles
+        if profiles is not None:
+            self.profile_name = profile_name or next(iter(profiles.names()), DEFAULT_PROFILE)
+            self.store, errors = profiles.open(self.profile_name)
+            self.root.title(f"SAT Study Planner Pro - {self.profile_name}")
+            for e in errors:
+                messagebox.showerror("Error", f"Error loading data: {str(e)}")
+        else:
+            self.store = store or StudyStore(storage)
+            self.load_data()
         
         # Create fullscreen button
         self.is_fullscreen = False
@@ -267,6 +320,10 @@ class ModernSATStudyApp:
                                    style="Custom.TButton")
         self.close_btn.place(relx=0.98, rely=0.02)
         
+        self.status_label = ttk.Label(self.root, style="Custom.TLabel")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+        self.update_status_bar()
+        
         self.main_frame = ttk.Frame(self.root, style="Custom.TFrame")
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
@@ -286,6 +343,20 @@ class ModernSATStudyApp:
         # Bind F11 to toggle fullscreen
         self.root.bind("<F11>", lambda event: self.toggle_fullscreen())
         self.root.bind("<Escape>", lambda event: self.exit_fullscreen())
+        
+        # Undo/redo for ratings, notes and added topics
+        self.root.bind("<Control-z>", lambda event: self.undo(event))
+        self.root.bind("<Control-y>", lambda event: self.redo(event))
+        self.root.bind("<Control-Z>", lambda event: self.redo(event))
+        
+        # Hidden diagnostics panel (Ctrl+Shift+D) and main-loop stall monitor
+        self.diagnostics_window = None
+        self.root.bind("<Control-D>", lambda event: self.show_diagnostics())
+        self.heartbeat = Heartbeat(self.root, instrumentation)
+        self.heartbeat.start()
+        
+        # Other windows and scripts may save to the same files
+        self.root.after(SHARE_POLL_INTERVAL, self.poll_shared_changes)
 
     def toggle_fullscreen(self):
         self.is_fullscreen = not self.is_fullscreen
@@ -313,6 +384,113 @@ class ModernSATStudyApp:
                                   style="Custom.TButton")
         self.file_btn.pack(side=tk.LEFT, padx=5)
 
+        self.plan_btn = ttk.Button(control_frame, text="📅 Study Plan",
+                                  command=self.show_study_plan,
+                                  style="Custom.TButton")
+        self.plan_btn.pack(side=tk.LEFT, padx=5)
+
+        self.import_btn = ttk.Button(control_frame, text="📥 Import",
+                                    command=self.import_topics,
+                                    style="Custom.TButton")
+        self.import_btn.pack(side=tk.LEFT, padx=5)
+
+        self.export_btn = ttk.Button(control_frame, text="📤 Export",
+                                    command=self.export_topics,
+                                    style="Custom.TButton")
+        self.export_btn.pack(side=tk.LEFT, padx=5)
+
+        self.sync_out_btn = ttk.Button(control_frame, text="🔄 Send Changes",
+                                      command=self.export_sync,
+                                      style="Custom.TButton")
+        self.sync_out_btn.pack(side=tk.LEFT, padx=5)
+
+        self.sync_in_btn = ttk.Button(control_frame, text="🔄 Receive Changes",
+                                     command=self.import_sync,
+                                     style="Custom.TButton")
+        self.sync_in_btn.pack(side=tk.LEFT, padx=5)
+
+        self.undo_btn = ttk.Button(control_frame, text="↶ Undo",
+                                  command=self.undo,
+                                  style="Custom.TButton")
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+
+        self.redo_btn = ttk.Button(control_frame, text="↷ Redo",
+                                  command=self.redo,
+                                  style="Custom.TButton")
+        self.redo_btn.pack(side=tk.LEFT, padx=5)
+
+        if self.profiles is not None:
+            self.profile_var = tk.StringVar(value=self.profile_name)
+            self.profile_combo = ttk.Combobox(control_frame, textvariable=self.profile_var,
+                                              values=self.profiles.names(), width=16)
+            self.profile_combo.bind("<<ComboboxSelected>>",
+                                    lambda event: self.switch_profile(self.profile_var.get()))
+            self.profile_combo.bind("<Return>", lambda event: self.switch_profile(self.profile_var.get()))
+            ttk.Label(control_frame, text="👤 Student:", style="Custom.TLabel").pack(side=tk.LEFT, padx=(10, 0))
+            self.profile_combo.pack(side=tk.LEFT, padx=5)
+
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(control_frame, textvariable=self.search_var)
+        self.search_entry.pack(side=tk.RIGHT, padx=5)
+        self.search_entry.bind("<KeyRelease>", lambda event: self.run_search())
+        ttk.Label(control_frame, text="🔍 Search:", style="Custom.TLabel").pack(side=tk.RIGHT)
+
+        self.search_results = tk.Listbox(self.left_panel, height=6,
+                                         bg=ModernTheme.LIGHTER_BG,
+                                         fg=ModernTheme.TEXT,
+                                         selectbackground=ModernTheme.ACCENT,
+                                         selectforeground=ModernTheme.DARKER_BG)
+        self.search_results.bind("<<ListboxSelect>>", self.on_search_select)
+        self.search_result_ids = []
+        self.search_anchor = control_frame
+
+    @instrumentation.timed()
+    def run_search(self):
+        query = self.search_var.get()
+        results = self.store.search(query) if query.strip() else []
+        self.search_results.delete(0, tk.END)
+        self.search_result_ids = [result["topic_id"] for result in results]
+        for result in results:
+            label = " › ".join(self.store.path(result["topic_id"]))
+            if result["kind"] == "note":
+                label += "  (notes)"
+            self.search_results.insert(tk.END, label)
+        if results:
+            self.search_results.pack(fill=tk.X, pady=(0, 5), after=self.search_anchor)
+        else:
+            self.search_results.pack_forget()
+
+    def on_search_select(self, event):
+        selection = self.search_results.curselection()
+        if selection:
+            self.reveal_topic(self.search_result_ids[selection[0]])
+
+    def reveal_topic(self, topic_id):
+        item = self.ensure_tree_item(topic_id)
+        if item is None:
+            return
+        tree = self.subject_tree(topic_id)
+        self.topics_notebook.select(tree.master)
+        tree.see(item)
+        tree.focus(item)
+        tree.selection_set(item)
+
+    def ensure_tree_item(self, topic_id):
+        # Materializes the rows leading to topic_id, expanding lazily
+        # populated parents on the way.
+        registry = self.store.registry
+        item = registry.items.get(topic_id)
+        if item is not None or not registry.is_linked(topic_id):
+            return item
+        parent_id = registry.parent(topic_id)
+        if parent_id is None or len(registry.path(parent_id)) == 1:
+            return None
+        parent_item = self.ensure_tree_item(parent_id)
+        if parent_item is None:
+            return None
+        self.populate_children(self.subject_tree(topic_id), parent_item)
+        return registry.items.get(topic_id)
+
     def add_new_topic(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Add New Topic")
@@ -333,8 +511,9 @@ class ModernSATStudyApp:
             subject = subject_var.get()
             topic_name = topic_entry.get().strip()
             if topic_name:
-                SATTopics.add_new_topic(subject, topic_name)
-                self.refresh_topic_tree()
+                self.apply_catalog_changes([
+                    {"op": "topic", "subject": subject, "topic": topic_name}
+                ])
                 dialog.destroy()
             else:
                 messagebox.showerror("Error", "Please enter a topic name")
@@ -359,7 +538,7 @@ class ModernSATStudyApp:
         topic_combo.pack(pady=10)
         
         def update_topics(*args):
-            topics = list(SATTopics.MATH_TOPICS.keys()) if subject_var.get() == "Math" else list(SATTopics.READING_TOPICS.keys())
+            topics = list(self.store.subject_topics(subject_var.get()))
             topic_combo['values'] = topics
             if topics:
                 topic_combo.set(topics[0])
@@ -376,53 +555,440 @@ class ModernSATStudyApp:
             topic_name = topic_var.get()
             subtopic_name = subtopic_entry.get().strip()
             if topic_name and subtopic_name:
-                SATTopics.add_new_subtopic(subject, topic_name, subtopic_name)
-                self.refresh_topic_tree()
+                self.apply_catalog_changes([
+                    {"op": "subtopic", "subject": subject,
+                     "topic": topic_name, "subtopic": subtopic_name}
+                ])
                 dialog.destroy()
             else:
                 messagebox.showerror("Error", "Please fill in all fields")
         
         ttk.Button(dialog, text="Save", command=save_subtopic, style="Custom.TButton").pack(pady=20)
 
+    def show_study_plan(self):
+        if self.plan_window is not None and self.plan_window.winfo_exists():
+            self.plan_window.lift()
+            return
+        try:
+            from tkcalendar import Calendar
+        except ImportError:
+            messagebox.showerror("Error", "The study plan calendar needs tkcalendar (pip install tkcalendar)")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Study Plan")
+        window.geometry("800x500")
+        window.configure(bg=ModernTheme.BACKGROUND)
+        self.plan_window = window
+        
+        form = ttk.Frame(window, style="Custom.TFrame")
+        form.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(form, text="Test Date (YYYY-MM-DD):", style="Custom.TLabel").pack(side=tk.LEFT)
+        test_date_entry = ttk.Entry(form, width=12)
+        test_date_entry.insert(0, (date.today() + timedelta(days=90)).isoformat())
+        test_date_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="Minutes per Day:", style="Custom.TLabel").pack(side=tk.LEFT, padx=(10, 0))
+        minutes_var = tk.StringVar(value="120")
+        ttk.Spinbox(form, from_=30, to=600, increment=30, width=6,
+                    textvariable=minutes_var).pack(side=tk.LEFT, padx=5)
+        
+        body = ttk.Frame(window, style="Custom.TFrame")
+        body.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.plan_calendar = Calendar(body, selectmode="day", date_pattern="y-mm-dd")
+        self.plan_calendar.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.plan_calendar.tag_config("study", background=ModernTheme.ACCENT,
+                                      foreground=ModernTheme.DARKER_BG)
+        self.plan_sessions = tk.Listbox(body, bg=ModernTheme.LIGHTER_BG, fg=ModernTheme.TEXT,
+                                        selectbackground=ModernTheme.ACCENT,
+                                        selectforeground=ModernTheme.DARKER_BG)
+        self.plan_sessions.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        self.plan_calendar.bind("<<CalendarSelected>>", lambda event: self.show_plan_day())
+        
+        def build_plan():
+            try:
+                test_date = date.fromisoformat(test_date_entry.get().strip())
+                minutes = int(minutes_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the test date as YYYY-MM-DD and whole minutes",
+                                     parent=window)
+                return
+            if test_date <= date.today():
+                messagebox.showerror("Error", "The test date must be in the future", parent=window)
+                return
+            self.scheduler = StudyScheduler(self.store, test_date, minutes)
+            self.scheduler.build()
+            self.plan_calendar.calevent_remove("all")
+            self.refresh_plan_days(range(self.scheduler.day_count))
+        
+        ttk.Button(form, text="Build Plan", command=build_plan,
+                   style="Custom.TButton").pack(side=tk.LEFT, padx=10)
+        window.protocol("WM_DELETE_WINDOW", self.close_study_plan)
+        build_plan()
+
+    def close_study_plan(self):
+        if self.plan_window is not None:
+            self.plan_window.destroy()
+        self.scheduler = None
+        self.plan_calendar = None
+        self.plan_window = None
+
+    def refresh_plan_days(self, days):
+        # Replaces the calendar events of only the given plan days.
+        if self.plan_calendar is None:
+            return
+        for day in days:
+            when = self.scheduler.day_date(day)
+            for event_id in self.plan_calendar.get_calevents(date=when):
+                self.plan_calendar.calevent_remove(event_id)
+            sessions = self.scheduler.sessions_on(when)
+            if sessions:
+                self.plan_calendar.calevent_create(when, f"{len(sessions)} study sessions", "study")
+        self.show_plan_day()
+
+    def show_plan_day(self):
+        when = self.plan_calendar.selection_get()
+        self.plan_sessions.delete(0, tk.END)
+        if when is None or self.scheduler is None:
+            return
+        for session in self.scheduler.sessions_on(when):
+            label = " › ".join(self.store.path(session.topic_id)[1:])
+            if session.repetition:
+                label += f"  (review {session.repetition})"
+            self.plan_sessions.insert(tk.END, label)
+
+    def import_topics(self):
+        path = filedialog.askopenfilename(
+            title="Import Topics",
+            filetypes=[("CSV or JSON Lines", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")])
+        if not path:
+            return
+        # Imported here, so csv is only loaded once the button is used.
+        from satprep.bulk import BackgroundImport
+
+        # Rows are parsed on a worker thread; batches are applied here, a
+        # slice at a time, and the tree is rebuilt once at the end.
+        self.bulk_import = BackgroundImport(path).start()
+        self.import_btn.config(state=tk.DISABLED)
+        self.poll_import()
+
+    def poll_import(self):
+        job = self.bulk_import
+        done = job.poll(self.store)
+        report = job.report
+        self.status_label.config(text=f"Importing {os.path.basename(job.path)}: "
+                                      f"{report.rows} rows read, {report.imported} added")
+        if not done:
+            self.root.after(50, self.poll_import)
+            return
+        self.bulk_import = None
+        self.import_btn.config(state=tk.NORMAL)
+        self.report_storage_errors()
+        self.refresh_topic_tree()
+        self.update_status_bar()
+        if job.error is not None:
+            messagebox.showerror("Error", f"Error importing topics: {str(job.error)}")
+        summary = (f"{report.imported} topics added, {report.duplicates} duplicates skipped, "
+                   f"{report.invalid} invalid rows.")
+        if report.errors:
+            summary += "\n\n" + "\n".join(report.errors[:10])
+        messagebox.showinfo("Import Complete", summary)
+
+    def export_topics(self):
+        path = filedialog.asksaveasfilename(
+            title="Export Topics", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
+        from satprep.bulk import BulkReport, catalog_snapshot, export_catalog
+
+        report = BulkReport()
+        catalogs = catalog_snapshot(self.store)
+        errors = []
+        
+        def run():
+            try:
+                export_catalog(catalogs, path, report)
+            except Exception as e:
+                errors.append(e)
+        
+        thread = threading.Thread(target=run, name="sat-export", daemon=True)
+        thread.start()
+        self.export_btn.config(state=tk.DISABLED)
+        self.poll_export(thread, report, errors, path)
+
+    def poll_export(self, thread, report, errors, path):
+        if thread.is_alive():
+            self.status_label.config(text=f"Exporting to {os.path.basename(path)}: {report.rows} rows written")
+            self.root.after(100, self.poll_export, thread, report, errors, path)
+            return
+        self.export_btn.config(state=tk.NORMAL)
+        self.update_status_bar()
+        if errors:
+            messagebox.showerror("Error", f"Error exporting topics: {str(errors[0])}")
+        else:
+            messagebox.showinfo("Export Complete", f"{report.rows} rows written to {path}")
+
+    def export_sync(self):
+        # Writes the changes other machines have not received yet, to be
+        # carried over in any shared folder or on a USB stick.
+        if self.store.sync is None:
+            messagebox.showerror("Error", "Syncing is not available for this data")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Send Changes", defaultextension=".satsync",
+            filetypes=[("Study changes", "*.satsync"), ("All files", "*.*")])
+        if not path:
+            return
+        from satprep.sync import export_delta
+
+        self.save_pending_note()
+        try:
+            count = export_delta(self.store, path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error exporting changes: {str(e)}")
+            return
+        self.report_storage_errors()
+        messagebox.showinfo("Changes Sent", f"{count} changes written to {path}")
+
+    def import_sync(self):
+        if self.store.sync is None:
+            messagebox.showerror("Error", "Syncing is not available for this data")
+            return
+        if self.bulk_import is not None:
+            messagebox.showerror("Error", "Please wait for the import to finish")
+            return
+        path = filedialog.askopenfilename(
+            title="Receive Changes",
+            filetypes=[("Study changes", "*.satsync"), ("All files", "*.*")])
+        if not path:
+            return
+        from satprep.sync import import_delta
+
+        self.save_pending_note()
+        try:
+            update, read, applied = import_delta(self.store, path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error importing changes: {str(e)}")
+            return
+        self.report_storage_errors()
+        self.show_update(update, keep_edits=False)
+        self.update_status_bar()
+        messagebox.showinfo("Changes Received", f"{applied} of {read} changes were newer and applied.")
+
+    def apply_catalog_changes(self, changes):
+        # Applies many topic/subtopic additions at once, then updates only the
+        # affected Treeview rows in a single pass.
+        update = self.store.apply_catalog_changes(changes)
+        self.report_storage_errors()
+        self.show_catalog_update(update)
+
+    def show_catalog_update(self, update):
+        for node_id in update["removed"]:
+            item = self.store.registry.items.get(node_id)
+            if item is not None:
+                tree = self.subject_tree(node_id)
+                self.forget_tree_items(tree, item)
+                tree.delete(item)
+            if node_id == self.selected_topic:
+                self.selected_topic = None
+                self.notes_text.delete("1.0", tk.END)
+        for node_id in update["reset"]:
+            # A re-added node's row keeps its place; its children are
+            # refilled from the registry, or left to its next expand.
+            self.clear_tree_node(node_id)
+            self.sync_tree_children(node_id)
+        for parent_id in update["affected"]:
+            self.sync_tree_children(parent_id)
+        if update["applied"]:
+            self.heatmap.rebuild()
+        self.refresh_rollup_rows(update["touched"])
+
+    @instrumentation.timed()
+    def undo(self, event=None):
+        self.replay_history(self.store.undo, event)
+
+    @instrumentation.timed()
+    def redo(self, event=None):
+        self.replay_history(self.store.redo, event)
+
+    def replay_history(self, replay, event):
+        # Keyboard shortcuts typed into a text field belong to that field.
+        if event is not None and isinstance(event.widget, (tk.Text, tk.Entry, ttk.Entry)):
+            return
+        if self.bulk_import is not None:
+            return
+        update = replay()
+        if update is None:
+            return
+        self.report_storage_errors()
+        self.show_update(update, keep_edits=False)
+
+    def show_update(self, update, keep_edits=True):
+        # Brings the rows, dashboard, plan and editor in line with changes
+        # applied to the store by undo/redo or by a remote client. With
+        # keep_edits, unsaved typing in the notes box is not overwritten.
+        self.show_catalog_update(update)
+        changed_days = set()
+        for topic_id in update["ratings"]:
+            item = self.store.registry.items.get(topic_id)
+            if item is not None:
+                self.subject_tree(topic_id).set(item, "rating", self.get_rating(topic_id))
+            self.heatmap.rating_changed(topic_id)
+            if self.scheduler is not None:
+                changed_days.update(self.scheduler.rating_changed(topic_id))
+        if changed_days:
+            self.refresh_plan_days(changed_days)
+        if self.selected_topic in update["ratings"]:
+            rating = self.store.get_rating(self.selected_topic, 1)
+            self.rating_var.set(rating)
+            self.rating_label.config(text=f"Current Rating: {rating}")
+        if self.selected_topic in update["notes"] and not (keep_edits and self.notes_text.edit_modified()):
+            self.show_note(self.selected_topic)
+
+    def show_note(self, topic_id):
+        self.notes_text.delete("1.0", tk.END)
+        note = self.store.get_note(topic_id)
+        if note is not None:
+            self.notes_text.insert("1.0", note)
+        self.notes_text.edit_modified(False)
+
+    def start_server(self, port=None):
+        # asyncio is only loaded when serving.
+        from satprep.server import SERVER_PORT, StoreExecutor, StudyServer
+
+        # Remote requests are answered by the server thread; everything that
+        # touches the store runs here, a slice at a time, from poll_server.
+        self.server_executor = StoreExecutor()
+        try:
+            self.server = StudyServer(lambda: self.store, port=port or SERVER_PORT, executor=self.server_executor,
+                                      on_change=self.show_update).start()
+        except OSError as e:
+            self.server = None
+            messagebox.showerror("Error", f"Could not start the API server: {str(e)}")
+            return
+        self.root.title(f"{self.root.title()} - serving {self.server.url}")
+        self.poll_server()
+
+    def poll_server(self):
+        if self.server is None:
+            return
+        self.server_executor.poll()
+        self.report_storage_errors()
+        self.root.after(20, self.poll_server)
+
+    @instrumentation.timed()
+    def poll_shared_changes(self):
+        # Only the fields another process changed are merged into the store,
+        # and only the rows showing them are updated.
+        update = self.store.poll_changes()
+        if update is not None:
+            self.show_update(update)
+        self.report_storage_errors()
+        self.root.after(SHARE_POLL_INTERVAL, self.poll_shared_changes)
+
+    def subject_tree(self, node_id):
+        return self.subject_trees[self.store.registry.path(node_id)[0]]
+
+    def clear_tree_node(self, node_id):
+        item = self.store.registry.items.get(node_id)
+        if item is None:
+            return
+        tree = self.subject_tree(node_id)
+        for child in tree.get_children(item):
+            self.forget_tree_items(tree, child)
+        tree.delete(*tree.get_children(item))
+
+    def forget_tree_items(self, tree, item):
+        if tree.tag_has("placeholder", item):
+            return
+        self.store.registry.items.pop(int(item), None)
+        for child in tree.get_children(item):
+            self.forget_tree_items(tree, child)
+
+    def sync_tree_children(self, parent_id):
+        tree = self.subject_tree(parent_id)
+        if len(self.store.registry.path(parent_id)) == 1:
+            item = ""
+        else:
+            item = self.store.registry.items.get(parent_id)
+        if item is None:
+            return  # parent row not materialized yet; it fills in on expand
+        children = tree.get_children(item)
+        if len(children) == 1 and tree.tag_has("placeholder", children[0]):
+            return
+        if item and not children and not tree.item(item, "open"):
+            if self.store.registry.has_children(parent_id):
+                tree.insert(item, "end", text="...", tags=("placeholder",))
+            return
+        for node_id in self.store.registry.children_of(parent_id):
+            if node_id not in self.store.registry.items:
+                self.insert_node(tree, item, node_id)
+
+    @instrumentation.timed()
     def refresh_topic_tree(self):
         self.topics_notebook.destroy()
         self.create_topic_tree()
 
     def create_topic_tree(self):
+        self.store.registry.items.clear()
         self.topics_notebook = ttk.Notebook(self.left_panel)
         self.topics_notebook.pack(fill=tk.BOTH, expand=True)
         
         math_frame = ttk.Frame(self.topics_notebook, style="Custom.TFrame")
-        self.math_tree = self.create_subject_tree(math_frame, self.topics_data.MATH_TOPICS, "Math")
+        self.math_tree = self.create_subject_tree(math_frame, self.store.subject_topics("Math"), "Math")
         self.topics_notebook.add(math_frame, text="Mathematics")
         
         reading_frame = ttk.Frame(self.topics_notebook, style="Custom.TFrame")
-        self.reading_tree = self.create_subject_tree(reading_frame, self.topics_data.READING_TOPICS, "Reading")
+        self.reading_tree = self.create_subject_tree(reading_frame, self.store.subject_topics("Reading"), "Reading")
         self.topics_notebook.add(reading_frame, text="Reading")
+        self.subject_trees = {"Math": self.math_tree, "Reading": self.reading_tree}
+        
+        self.heatmap = MasteryHeatmap(self.topics_notebook, self.store, self.reveal_topic)
+        self.topics_notebook.add(self.heatmap.frame, text="Dashboard")
 
     def create_subject_tree(self, parent, topics_dict, subject):
         tree = ttk.Treeview(parent, style="Treeview", show="tree headings")
         tree.pack(fill=tk.BOTH, expand=True)
         
-        tree["columns"] = ("rating",)
+        tree["columns"] = ("rating", "average")
         tree.column("rating", width=100, anchor="center")
         tree.heading("rating", text="Rating")
+        tree.column("average", width=120, anchor="center")
+        tree.heading("average", text="Average (rated)")
         
-        for main_topic, subtopics in topics_dict.items():
-            main_id = tree.insert("", "end", text=main_topic, values=(self.get_rating(f"{subject} - {main_topic}"),))
-            
-            for subtopic, details in subtopics.items():
-                sub_id = tree.insert(main_id, "end", text=subtopic, 
-                                   values=(self.get_rating(f"{subject} - {main_topic} - {subtopic}"),))
-                
-                if "subtopics" in details:
-                    for sub in details["subtopics"]:
-                        tree.insert(sub_id, "end", text=sub,
-                                  values=(self.get_rating(f"{subject} - {main_topic} - {subtopic} - {sub}"),))
+        # Only top-level topics are inserted up front; deeper levels are
+        # filled in from the registry when a node is first expanded.
+        self.insert_children(tree, "", self.store.registry.subject_id(subject))
         
         tree.bind("<<TreeviewSelect>>", self.on_topic_select)
+        tree.bind("<<TreeviewOpen>>", self.on_topic_open)
         return tree
 
+    def insert_children(self, tree, parent_item, parent_id):
+        for node_id in self.store.registry.children_of(parent_id):
+            self.insert_node(tree, parent_item, node_id)
+
+    def insert_node(self, tree, parent_item, node_id):
+        # Rows use the registry id as their Treeview item id.
+        with instrumentation.timer("Treeview.insert"):
+            item = tree.insert(parent_item, "end", iid=str(node_id),
+                               text=self.store.registry.path(node_id)[-1],
+                               values=(self.get_rating(node_id), self.get_average(node_id)))
+        self.store.registry.items[node_id] = item
+        if self.store.registry.has_children(node_id):
+            tree.insert(item, "end", text="...", tags=("placeholder",))
+
+    def on_topic_open(self, event):
+        tree = event.widget
+        self.populate_children(tree, tree.focus())
+
+    @instrumentation.timed()
+    def populate_children(self, tree, item):
+        children = tree.get_children(item)
+        if len(children) == 1 and tree.tag_has("placeholder", children[0]):
+            tree.delete(children[0])
+            self.insert_children(tree, item, int(item))
+
     def create_rating_section(self):
         self.rating_frame = ttk.LabelFrame(self.right_panel, text="Topic Rating", style="Custom.TFrame")
         self.rating_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -437,6 +1003,79 @@ class ModernSATStudyApp:
                                     text="Current Rating: 1",
                                     style="Custom.TLabel")
         self.rating_label.pack(pady=5)
+        
+        ttk.Button(self.rating_frame, text="📈 Progress", command=self.show_progress_chart,
+                   style="Custom.TButton").pack(pady=(0, 5))
+
+    def show_progress_chart(self):
+        window = tk.Toplevel(self.root)
+        window.title("Progress")
+        window.geometry("900x450")
+        window.configure(bg=ModernTheme.BACKGROUND)
+        
+        form = ttk.Frame(window, style="Custom.TFrame")
+        form.pack(fill=tk.X, padx=10, pady=10)
+        scope_var = tk.StringVar(value="Selected topic" if self.selected_topic is not None else "Math")
+        range_var = tk.StringVar(value="Last 90 days")
+        ttk.Combobox(form, textvariable=scope_var, state="readonly", width=16,
+                     values=["Selected topic", "Math", "Reading"]).pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(form, textvariable=range_var, state="readonly", width=14,
+                     values=list(CHART_RANGES)).pack(side=tk.LEFT, padx=5)
+        
+        canvas = tk.Canvas(window, bg=ModernTheme.LIGHTER_BG, highlightthickness=0)
+        canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        def redraw(event=None):
+            if scope_var.get() == "Selected topic":
+                path = self.store.path(self.selected_topic) if self.selected_topic is not None else None
+            else:
+                path = (scope_var.get(),)
+            self.draw_progress(canvas, path, CHART_RANGES[range_var.get()])
+        
+        canvas.bind("<Configure>", redraw)
+        scope_var.trace("w", lambda *args: redraw())
+        range_var.trace("w", lambda *args: redraw())
+
+    @instrumentation.timed()
+    def draw_progress(self, canvas, path, days):
+        # Plots one min-max bar and a mean point per bucket of roughly three
+        # pixels, so drawing cost depends on the width, not on history size.
+        canvas.delete("all")
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        margin = 40
+        if path is None:
+            canvas.create_text(width // 2, height // 2, text="Select a topic first", fill=ModernTheme.TEXT)
+            return
+        end = time.time()
+        span = self.store.history.time_span() if self.store.history is not None else None
+        start = end - days * 86400 if days is not None else (span[0] if span else end - 86400)
+        plot_width = max(1, width - 2 * margin)
+        buckets = self.store.progress(path, max(1, plot_width // 3), start, end)
+        
+        def x_of(when):
+            return margin + (when - start) / max(end - start, 1) * plot_width
+        
+        def y_of(rating):
+            return height - margin - (rating - 1) / 9 * (height - 2 * margin)
+        
+        for rating in (1, 5, 10):
+            canvas.create_line(margin, y_of(rating), width - margin, y_of(rating), fill=ModernTheme.SECONDARY_ACCENT)
+            canvas.create_text(margin - 10, y_of(rating), text=str(rating), fill=ModernTheme.TEXT)
+        samples = sum(bucket[4] for bucket in buckets)
+        canvas.create_text(margin, margin // 2, anchor="w", fill=ModernTheme.TEXT,
+                           text=f"{' › '.join(path)}  ({samples} ratings)")
+        if not buckets:
+            canvas.create_text(width // 2, height // 2, text="No ratings in this period", fill=ModernTheme.TEXT)
+            return
+        means = []
+        for bucket_start, low, high, mean, count in buckets:
+            x = x_of(bucket_start)
+            canvas.create_line(x, y_of(low), x, y_of(high) - 1, fill=ModernTheme.ACCENT, width=3)
+            means.extend((x, y_of(mean)))
+        if len(means) > 2:
+            canvas.create_line(*means, fill=ModernTheme.TEXT, width=2)
+        else:
+            canvas.create_oval(means[0] - 3, means[1] - 3, means[0] + 3, means[1] + 3, fill=ModernTheme.TEXT)
 
     def create_notes_section(self):
         self.notes_frame = ttk.LabelFrame(self.right_panel, text="Topic Notes", style="Custom.TFrame")
@@ -455,105 +1094,240 @@ class ModernSATStudyApp:
                                     style="Custom.TButton")
         self.save_button.pack(pady=5)
 
-    def get_rating(self, topic_path):
-        rating = self.current_ratings.get(topic_path, "Not Rated")
+    def get_rating(self, topic_id):
+        rating = self.store.get_rating(topic_id, "Not Rated")
         return rating if rating != "Not Rated" else "-"
 
+    def get_average(self, topic_id):
+        if not self.store.registry.has_children(topic_id):
+            return ""
+        summary = self.store.summary(topic_id)
+        if summary["mean"] is None:
+            return "-"
+        return f"{summary['mean']:.1f} ({summary['count']})"
+
+    def refresh_rollup_rows(self, topic_ids):
+        for topic_id in topic_ids:
+            item = self.store.registry.items.get(topic_id)
+            if item is not None:
+                self.subject_tree(topic_id).set(item, "average", self.get_average(topic_id))
+        self.update_status_bar()
+
+    def update_status_bar(self):
+        parts = []
+        for subject in ("Math", "Reading"):
+            mastery = self.store.mastery(subject)
+            if mastery["mean"] is None:
+                parts.append(f"{subject}: not rated yet")
+            else:
+                parts.append(f"{subject}: {mastery['mean']:.1f}/10 over {mastery['count']} ratings"
+                             f" (lowest {mastery['min']:.1f})")
+        self.status_label.config(text="    |    ".join(parts))
+
+    @instrumentation.timed()
     def on_topic_select(self, event):
         tree = event.widget
         selection = tree.selection()
-        if selection:
-            item = selection[0]
-            topic_path = self.get_topic_path(tree, item)
-            self.selected_topic = topic_path
+        if selection and not tree.tag_has("placeholder", selection[0]):
+            topic_id = int(selection[0])
+            self.selected_topic = topic_id
             
-            current_rating = self.current_ratings.get(topic_path, 1)
+            current_rating = self.store.get_rating(topic_id, 1)
             self.rating_var.set(current_rating)
             self.rating_label.config(text=f"Current Rating: {current_rating}")
             
-            self.notes_text.delete("1.0", tk.END)
-            if topic_path in self.topic_notes:
-                self.notes_text.insert("1.0", self.topic_notes[topic_path])
+            self.show_note(topic_id)
 
     def get_topic_path(self, tree, item):
-        path_parts = []
-        while item:
-            path_parts.insert(0, tree.item(item)["text"])
-            item = tree.parent(item)
-        
-        if tree == self.math_tree:
-            return "Math - " + " - ".join(path_parts)
-        else:
-            return "Reading - " + " - ".join(path_parts)
+        return self.store.registry.path(int(item))
 
+    @instrumentation.timed()
     def update_rating(self, value):
-        if self.selected_topic:
+        if self.selected_topic is not None:
             try:
                 rating = float(value)
-                self.current_ratings[self.selected_topic] = rating
+                with instrumentation.timer("StudyStore.set_rating"):
+                    touched = self.store.set_rating(self.selected_topic, rating)
+                self.report_storage_errors()
                 self.rating_label.config(text=f"Current Rating: {rating:.1f}")
                 
-                tree = self.math_tree if self.selected_topic.startswith("Math") else self.reading_tree
-                for item in tree.selection():
-                    tree.set(item, "rating", f"{rating:.1f}")
-                
-                self.save_data()
+                item = self.store.registry.items.get(self.selected_topic)
+                if item is not None:
+                    self.subject_tree(self.selected_topic).set(item, "rating", f"{rating:.1f}")
+                self.refresh_rollup_rows(touched)
+                self.heatmap.rating_changed(self.selected_topic)
+                if self.scheduler is not None:
+                    self.refresh_plan_days(self.scheduler.rating_changed(self.selected_topic))
             except ValueError:
                 pass
 
+    @instrumentation.timed()
     def save_notes(self):
-        if self.selected_topic:
+        if self.selected_topic is not None:
             notes_text = self.notes_text.get("1.0", "end-1c")
             if notes_text.strip():
-                self.topic_notes[self.selected_topic] = notes_text
-                self.save_data()
-                messagebox.showinfo("Success", "Notes saved successfully!")
+                self.store.set_note(self.selected_topic, notes_text)
+                self.notes_text.edit_modified(False)
+                self.report_storage_errors()
+                with instrumentation.timer("messagebox"):
+                    messagebox.showinfo("Success", "Notes saved successfully!")
 
+    @instrumentation.timed()
     def save_data(self):
-        data = {
-            "ratings": self.current_ratings,
-            "notes": self.topic_notes,
-            "custom_topics": {
-                "math": self.topics_data.MATH_TOPICS,
-                "reading": self.topics_data.READING_TOPICS
-            }
-        }
-        try:
-            with open("sat_study_data.json", "w") as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving data: {str(e)}")
+        self.store.save()
+        self.report_storage_errors()
+
+    def report_storage_errors(self):
+        source = self.profiles if self.profiles is not None else self.store
+        for e in source.pop_errors():
+            with instrumentation.timer("messagebox"):
+                messagebox.showerror("Error", f"Error saving data: {str(e)}")
 
+    @instrumentation.timed()
     def load_data(self):
+        for e in self.store.load():
+            messagebox.showerror("Error", f"Error loading data: {str(e)}")
+
+    def save_pending_note(self):
+        if self.selected_topic is not None:
+            notes_text = self.notes_text.get("1.0", "end-1c")
+            if notes_text.strip() and notes_text != self.store.get_note(self.selected_topic):
+                self.store.set_note(self.selected_topic, notes_text)
+
+    @instrumentation.timed()
+    def switch_profile(self, name):
+        name = name.strip()
+        if name == self.profile_name:
+            return
+        if self.bulk_import is not None:
+            messagebox.showerror("Error", "Please wait for the import to finish")
+            self.profile_var.set(self.profile_name)
+            return
+        self.save_pending_note()
         try:
-            if os.path.exists("sat_study_data.json"):
-                with open("sat_study_data.json", "r") as f:
-                    data = json.load(f)
-                    self.current_ratings = data.get("ratings", {})
-                    self.topic_notes = data.get("notes", {})
-                    if "custom_topics" in data:
-                        custom_topics = data["custom_topics"]
-                        self.topics_data.MATH_TOPICS.update(custom_topics.get("math", {}))
-                        self.topics_data.READING_TOPICS.update(custom_topics.get("reading", {}))
-        except Exception as e:
+            store, errors = self.profiles.open(name)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Error opening profile: {str(e)}")
+            self.profile_var.set(self.profile_name)
+            return
+        for e in errors:
             messagebox.showerror("Error", f"Error loading data: {str(e)}")
-            self.current_ratings = {}
-            self.topic_notes = {}
+        
+        self.store = store
+        self.profile_name = name
+        self.root.title(f"SAT Study Planner Pro - {name}")
+        self.profile_combo["values"] = self.profiles.names()
+        self.selected_topic = None
+        self.rating_var.set(1)
+        self.rating_label.config(text="Current Rating: 1")
+        self.notes_text.delete("1.0", tk.END)
+        self.search_var.set("")
+        self.run_search()
+        self.close_study_plan()
+        self.refresh_topic_tree()
+        self.update_status_bar()
+        self.report_storage_errors()
 
     def on_closing(self):
-        if self.selected_topic:
-            notes_text = self.notes_text.get("1.0", "end-1c")
-            if notes_text.strip():
-                self.topic_notes[self.selected_topic] = notes_text
+        self.save_pending_note()
+        if self.bulk_import is not None:
+            # Keep the batches applied so far.
+            self.bulk_import.cancel()
+            self.store.save()
         
-        self.save_data()
+        self.heartbeat.stop()
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        if self.profiles is not None:
+            self.profiles.close()
+        else:
+            self.store.close()
+        self.report_storage_errors()
         self.root.destroy()
 
+    def show_diagnostics(self):
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.configure(bg=ModernTheme.BACKGROUND)
+        self.diagnostics_window = window
+        
+        text = tk.Text(window, wrap=tk.NONE, width=90, height=24,
+                       bg=ModernTheme.LIGHTER_BG, fg=ModernTheme.TEXT,
+                       font=("Courier", 10))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        button_frame = ttk.Frame(window, style="Custom.TFrame")
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            text.delete("1.0", tk.END)
+            text.insert("1.0", instrumentation.format_table())
+            window.after(1000, refresh)
+        
+        def toggle_profiling():
+            if instrumentation.profiling:
+                report = instrumentation.stop_profiling(PROFILE_FILE)
+                profile_btn.config(text="Start Profiling")
+                messagebox.showinfo("Profile", f"Profile written to {PROFILE_FILE}\n\n{report[:2000]}",
+                                    parent=window)
+            else:
+                instrumentation.start_profiling()
+                profile_btn.config(text="Stop Profiling")
+        
+        def dump():
+            try:
+                instrumentation.dump(DIAGNOSTICS_FILE)
+                messagebox.showinfo("Diagnostics", f"Histograms written to {DIAGNOSTICS_FILE}", parent=window)
+            except OSError as e:
+                messagebox.showerror("Error", f"Error writing diagnostics: {str(e)}", parent=window)
+        
+        def reset():
+            instrumentation.reset()
+            text.delete("1.0", tk.END)
+        
+        profile_btn = ttk.Button(button_frame, style="Custom.TButton", command=toggle_profiling,
+                                 text="Stop Profiling" if instrumentation.profiling else "Start Profiling")
+        profile_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Dump to File", command=dump,
+                   style="Custom.TButton").pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Reset", command=reset,
+                   style="Custom.TButton").pack(side=tk.LEFT, padx=5)
+        refresh()
+
 
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SAT Study Planner Pro")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"], default="json",
+                        help="how study data is persisted (default: json)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"profile the whole session and write {PROFILE_FILE} and {DIAGNOSTICS_FILE} on exit")
+    parser.add_argument("--students", nargs="?", const=PROFILES_DIR, metavar="DIR",
+                        help=f"keep separate study data per student under DIR (default: {PROFILES_DIR})")
+    parser.add_argument("--serve", nargs="?", const=0, default=None, type=int, metavar="PORT",
+                        help="serve the study data as a JSON API on localhost, on PORT if given")
+    args = parser.parse_args()
+
+    if args.profile:
+        instrumentation.start_profiling()
     root = tk.Tk()
-    app = ModernSATStudyApp(root)
+    if args.students:
+        app = ModernSATStudyApp(root, profiles=ProfileStore(args.students, mode=args.storage))
+    else:
+        app = ModernSATStudyApp(root, storage=create_storage(args.storage))
+    if args.serve is not None:
+        app.start_server(args.serve)
     root.mainloop()
+    if args.profile:
+        instrumentation.stop_profiling(PROFILE_FILE)
+        instrumentation.dump(DIAGNOSTICS_FILE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from satprep import JournalStorage, JsonStorage, StudyStore  # noqa: E402
+from satprep.storage import write_json_atomic  # noqa: E402
+from synthetic import catalog_class, generate_catalog, generate_data  # noqa: E402
+
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(fn, iterations, budget):
+    # Runs fn(i) up to `iterations` times, stopping early once `budget`
+    # seconds have been spent, and returns the per-call latencies.
+    samples = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t)
+        if time.perf_counter() - start > budget:
+            break
+    return samples
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn(0)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(operation, storage, nodes, samples, peak):
+    total = sum(samples)
+    return {
+        "operation": operation,
+        "storage": storage,
+        "nodes": nodes,
+        "iterations": len(samples),
+        "total_s": total,
+        "throughput_per_s": len(samples) / total if total else None,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": max(samples) * 1000,
+        "peak_memory_bytes": peak
+    }
+
+
+class Workspace:
+    # Study data for one catalog size, written in the layout each storage
+    # backend expects.
+    def __init__(self, directory, mode, nodes, seed):
+        self.directory = directory
+        self.mode = mode
+        self.catalogs = generate_catalog(nodes, seed=seed)
+        self.catalog = catalog_class(self.catalogs)
+        self.json_path = os.path.join(directory, "data.json")
+        self.index_path = os.path.join(directory, "data.index.json")
+        write_json_atomic(self.json_path, generate_data(self.catalogs, seed=seed), indent=None)
+        # The first load migrates (SQLite) and writes the search index, as
+        # a first launch would.
+        store = self.open_store()
+        store.load()
+        store.close()
+
+    def storage(self):
+        if self.mode == "journal":
+            return JournalStorage(self.json_path, os.path.join(self.directory, "data.journal"))
+        if self.mode == "sqlite":
+            from satprep.sqlite_store import SqliteStorage
+
+            return SqliteStorage(os.path.join(self.directory, "data.db"), legacy_path=self.json_path)
+        return JsonStorage(self.json_path)
+
+    def open_store(self):
+        return StudyStore(self.storage(), catalog=self.catalog, index_path=self.index_path,
+                          history_path=os.path.join(self.directory, "history"),
+                          sync_path=os.path.join(self.directory, "data.sync"))
+
+
+def bench_headless(ws, nodes, args):
+    results = []
+    mode = ws.mode
+
+    def load(i):
+        store = ws.open_store()
+        store.load()
+        store.close()
+
+    results.append(report("load_data", mode, nodes,
+                          measure(load, args.iterations, args.budget), peak_memory(load)))
+
+    store = ws.open_store()
+    store.load()
+    ids = [topic_id for topic_id, path in enumerate(store.registry.paths) if len(path) > 1]
+    rng = random.Random(args.seed)
+
+    def save(i):
+        # Change a rating first, so every iteration has something to write.
+        topic_id = rng.choice(ids)
+        store.set_rating(topic_id, 1 if store.get_rating(topic_id) != 1 else 2)
+        store.save()
+        store.flush()
+
+    results.append(report("save_data", mode, nodes,
+                          measure(save, args.iterations, args.budget), peak_memory(save)))
+
+    def update_rating(i):
+        store.set_rating(rng.choice(ids), round(rng.uniform(1, 10), 1))
+
+    results.append(report("update_rating", mode, nodes,
+                          measure(update_rating, args.iterations * 100, args.budget),
+                          peak_memory(update_rating)))
+
+    def topic_path(i):
+        store.registry.path(rng.choice(ids))
+
+    results.append(report("get_topic_path", mode, nodes,
+                          measure(topic_path, args.iterations * 1000, args.budget),
+                          peak_memory(topic_path)))
+    store.close()
+    return results
+
+
+def start_display():
+    # Returns (display process or None, error message or None).
+    if os.environ.get("DISPLAY"):
+        return None, None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, "no DISPLAY and Xvfb is not installed"
+    proc = subprocess.Popen([xvfb, ":97", "-screen", "0", "1400x900x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = ":97"
+    time.sleep(1.0)
+    return proc, None
+
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location("sat_planner", os.path.join(ROOT, "SAT Planner.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_gui(ws, nodes, args, tk):
+    results = []
+    app_module = load_app_module()
+    root = tk.Tk()
+    root.withdraw()
+    app = app_module.ModernSATStudyApp(root, store=ws.open_store())
+    mode = ws.mode
+    rng = random.Random(args.seed)
+
+    def build_tree(i):
+        frame = tk.Frame(root)
+        app.create_subject_tree(frame, None, "Math")
+        frame.destroy()
+
+    results.append(report("create_subject_tree", mode, nodes,
+                          measure(build_tree, args.iterations, args.budget), peak_memory(build_tree)))
+
+    items = list(app.math_tree.get_children(""))
+
+    def topic_path(i):
+        app.get_topic_path(app.math_tree, rng.choice(items))
+
+    results.append(report("get_topic_path[tk]", mode, nodes,
+                          measure(topic_path, args.iterations * 100, args.budget),
+                          peak_memory(topic_path)))
+
+    ids = [int(item) for item in items]
+
+    def update_rating(i):
+        app.selected_topic = rng.choice(ids)
+        app.update_rating(str(round(rng.uniform(1, 10), 1)))
+
+    results.append(report("update_rating[tk]", mode, nodes,
+                          measure(update_rating, args.iterations * 100, args.budget),
+                          peak_memory(update_rating)))
+    app.store.close()
+    root.destroy()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SAT planner hot paths on synthetic catalogs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="catalog sizes in nodes (default: %(default)s)")
+    parser.add_argument("--storage", nargs="+", default=["json"], choices=["json", "journal", "sqlite"])
+    parser.add_argument("--iterations", type=int, default=10,
+                        help="repetitions of whole-dataset operations; per-item operations run more")
+    parser.add_argument("--budget", type=float, default=5.0,
+                        help="seconds allowed per operation and size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-gui", action="store_true", help="skip the Treeview benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    tk = None
+    gui_note = "disabled with --no-gui" if args.no_gui else None
+    display = None
+    if not args.no_gui:
+        display, gui_note = start_display()
+        if gui_note is None:
+            import tkinter as tk
+
+            try:
+                tk.Tk().destroy()
+            except tk.TclError as e:
+                tk, gui_note = None, f"Tk unavailable: {e}"
+
+    results = []
+    try:
+        for mode in args.storage:
+            for nodes in args.sizes:
+                with tempfile.TemporaryDirectory() as directory:
+                    ws = Workspace(directory, mode, nodes, args.seed)
+                    batch = bench_headless(ws, nodes, args)
+                    if tk is not None:
+                        batch.extend(bench_gui(ws, nodes, args, tk))
+                results.extend(batch)
+                for result in batch:
+                    print(f"{result['storage']:8} {result['nodes']:>8} {result['operation']:22}"
+                          f" p50 {result['p50_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms"
+                          f"  peak {result['peak_memory_bytes'] / 1e6:8.1f} MB")
+    finally:
+        if display is not None:
+            display.terminate()
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "gui": gui_note or "ok",
+            "results": results
+        }, f, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import random
+
+from satprep import SATTopics, path_key
+from satprep.catalog import freeze_topics
+
+
+IMPORTANCE = [
+    "High - Frequently tested",
+    "Medium - 15-20% of Math section",
+    "Low - Occasionally tested",
+]
+WORDS = [
+    "linear", "quadratic", "vertex", "form", "slope", "intercept", "ratio",
+    "evidence", "context", "inference", "function", "graph", "median",
+    "probability", "polynomial", "exponent", "passage", "tone", "claim",
+    "system", "inequality", "percent", "circle", "angle", "volume",
+]
+
+
+def catalog_shape(nodes, subtopics=10, leaves=8):
+    # Number of main topics per subject so both subjects together hold
+    # roughly `nodes` topic, subtopic and leaf nodes.
+    per_topic = 1 + subtopics + subtopics * leaves
+    return max(1, round(nodes / (2 * per_topic))), subtopics, leaves
+
+
+def generate_catalog(nodes, seed=0, subtopics=10, leaves=8):
+    rng = random.Random(seed)
+    topics, subtopics, leaves = catalog_shape(nodes, subtopics, leaves)
+    catalogs = {}
+    for subject in ("Math", "Reading"):
+        catalog = {}
+        for t in range(topics):
+            entries = {}
+            for s in range(subtopics):
+                entries[f"{subject} subtopic {t}.{s}"] = {
+                    "subtopics": [f"Item {t}.{s}.{leaf}" for leaf in range(leaves)],
+                    "key_concepts": [" ".join(rng.sample(WORDS, 3)) for _ in range(4)],
+                    "importance": rng.choice(IMPORTANCE)
+                }
+            catalog[f"{subject} topic {t}"] = entries
+        catalogs[subject] = catalog
+    return catalogs
+
+
+def catalog_class(catalogs):
+    # A SATTopics subclass, so benchmarks never touch the built-in catalog.
+    return type("SyntheticTopics", (SATTopics,), {
+        "MATH_TOPICS": freeze_topics(catalogs["Math"]),
+        "READING_TOPICS": freeze_topics(catalogs["Reading"])
+    })
+
+
+def iter_paths(catalogs):
+    for subject, topics in catalogs.items():
+        for topic, subtopics in topics.items():
+            yield (subject, topic)
+            for subtopic, details in subtopics.items():
+                yield (subject, topic, subtopic)
+                for leaf in details["subtopics"]:
+                    yield (subject, topic, subtopic, leaf)
+
+
+def generate_data(catalogs, rated=0.5, noted=0.1, note_words=60, seed=0):
+    # Study data in the on-disk format, rating and annotating a random
+    # fraction of all nodes.
+    rng = random.Random(seed)
+    ratings = {}
+    notes = {}
+    for path in iter_paths(catalogs):
+        if rng.random() < rated:
+            ratings[path_key(path)] = round(rng.uniform(1, 10), 1)
+        if rng.random() < noted:
+            notes[path_key(path)] = " ".join(rng.choices(WORDS, k=note_words))
+    return {
+        "ratings": ratings,
+        "notes": notes,
+        "custom_topics": {"math": {}, "reading": {}}
+    }
@@ -0,0 +1,43 @@
+from .catalog import SATTopics, TopicCatalog, copy_topics, freeze_topics
+from .diagnostics import Heartbeat, Instrumentation, LatencyHistogram, instrumentation
+from .heatmap import HeatmapLayout, effective_rating, rating_color
+from .history import HISTORY_DIR, RatingHistory
+from .notes import NOTES_FILE, NoteSegment
+from .profiles import ProfileStore
+from .registry import TopicRegistry, path_key, is_path_key, subject_of
+from .rollup import RatingRollup
+from .scheduler import StudyScheduler
+from .search import SearchIndex, tokenize
+from .sharing import SHARE_POLL_INTERVAL, ChangeInbox, FileLock
+from .storage import (
+    DATA_FILE,
+    JOURNAL_FILE,
+    SEARCH_INDEX_FILE,
+    SQLITE_FILE,
+    JournalStorage,
+    JsonStorage,
+    PersistenceEngine,
+    create_storage,
+)
+from .store import StudyStore
+from .sync import SYNC_FILE, SyncLog, export_delta, import_delta
+from .undo import UndoHistory
+
+__all__ = [
+    "SATTopics", "TopicCatalog", "copy_topics", "freeze_topics",
+    "Heartbeat", "Instrumentation", "LatencyHistogram", "instrumentation",
+    "HeatmapLayout", "effective_rating", "rating_color",
+    "HISTORY_DIR", "RatingHistory",
+    "NOTES_FILE", "NoteSegment",
+    "ProfileStore",
+    "TopicRegistry", "path_key", "is_path_key", "subject_of",
+    "RatingRollup",
+    "StudyScheduler",
+    "SearchIndex", "tokenize",
+    "SHARE_POLL_INTERVAL", "ChangeInbox", "FileLock",
+    "DATA_FILE", "JOURNAL_FILE", "SEARCH_INDEX_FILE", "SQLITE_FILE",
+    "JournalStorage", "JsonStorage", "PersistenceEngine", "create_storage",
+    "StudyStore",
+    "SYNC_FILE", "SyncLog", "export_delta", "import_delta",
+    "UndoHistory",
+]
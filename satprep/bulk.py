@@ -0,0 +1,260 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice
+
+from .catalog import LayeredTopics, TopicCatalog
+
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+CSV_FIELDS = ["subject", "topic", "subtopic", "importance", "key_concepts", "items"]
+LIST_SEPARATOR = ";"
+
+
+def is_csv(path):
+    return path.lower().endswith(".csv")
+
+
+class BulkReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, line, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+
+def read_rows(path):
+    # Yields (line number, raw row) one at a time from a CSV file with a
+    # header row, or from JSON Lines with one object per line.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if is_csv(path):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, e
+
+
+def split_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(LIST_SEPARATOR) if part.strip()]
+    if isinstance(value, list) and all(isinstance(part, str) for part in value):
+        return [part.strip() for part in value if part.strip()]
+    raise ValueError("expected a list of strings")
+
+
+def validate_rows(rows, report):
+    # Turns raw rows into catalog changes, skipping invalid rows. A row with
+    # a subtopic carries its details; one without only adds the topic.
+    for line, row in rows:
+        report.rows += 1
+        if not isinstance(row, dict):
+            report.reject(line, f"invalid JSON: {row}" if isinstance(row, Exception) else "not a JSON object")
+            continue
+        subject = str(row.get("subject") or "").strip().title()
+        topic = str(row.get("topic") or "").strip()
+        subtopic = str(row.get("subtopic") or "").strip()
+        if subject not in TopicCatalog.SUBJECTS:
+            report.reject(line, f"unknown subject {row.get('subject')!r}")
+            continue
+        if not topic:
+            report.reject(line, "missing topic")
+            continue
+        if not subtopic:
+            yield {"op": "topic", "subject": subject, "topic": topic}
+            continue
+        try:
+            details = {
+                "subtopics": split_list(row.get("items")),
+                "key_concepts": split_list(row.get("key_concepts")),
+                "importance": str(row.get("importance") or "Not specified").strip()
+            }
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+        yield {"op": "subtopic", "subject": subject, "topic": topic, "subtopic": subtopic, "details": details}
+
+
+def batched(changes, size=BATCH_SIZE):
+    changes = iter(changes)
+    while True:
+        batch = list(islice(changes, size))
+        if not batch:
+            return
+        yield batch
+
+
+def normalized(details):
+    return {key: list(value) if isinstance(value, (list, tuple)) else value
+            for key, value in details.items()}
+
+
+def apply_batch(store, batch, report):
+    # Drops rows that repeat within the batch or match the catalog, adds
+    # missing parent topics and applies the rest in one call.
+    unique = {}
+    for change in batch:
+        key = (change["subject"], change["topic"], change.get("subtopic"))
+        if key in unique:
+            report.duplicates += 1
+        unique[key] = change
+    changes = []
+    implicit = 0
+    new_topics = set()
+    for (subject, topic, subtopic), change in unique.items():
+        topics = store.subject_topics(subject)
+        exists = topic in topics or (subject, topic) in new_topics
+        if subtopic is None:
+            if exists:
+                report.duplicates += 1
+                continue
+        else:
+            current = topics[topic].get(subtopic) if topic in topics else None
+            if current is not None and normalized(current) == change["details"]:
+                report.duplicates += 1
+                continue
+            if not exists:
+                changes.append({"op": "topic", "subject": subject, "topic": topic})
+                implicit += 1
+        new_topics.add((subject, topic))
+        changes.append(change)
+    if changes:
+        # A full-snapshot store is saved once at the end instead of per batch.
+        # All batches of one import undo together.
+        update = store.apply_catalog_changes(changes, record=store.storage.journaled, undo_key=report)
+        report.imported += len(update["applied"]) - implicit
+    return report
+
+
+def import_catalog(store, path, batch_size=BATCH_SIZE, progress=None):
+    # Streams the file through validation into the store in batches, so only
+    # one batch of rows is in memory at a time.
+    report = BulkReport()
+    for batch in batched(validate_rows(read_rows(path), report), batch_size):
+        apply_batch(store, batch, report)
+        if progress is not None:
+            progress(report)
+    if not store.storage.journaled:
+        store.save()
+    return report
+
+
+class BackgroundImport:
+    # Reads and validates rows on a worker thread. Batches reach the caller's
+    # thread through a bounded queue, so the store is only touched there and
+    # the reader never runs far ahead of it.
+    def __init__(self, path, batch_size=BATCH_SIZE, queue_size=4):
+        self.path = path
+        self.batch_size = batch_size
+        self.report = BulkReport()
+        self.error = None
+        self.done = False
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, name="sat-import", daemon=True)
+        self._cancelled = False
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def poll(self, store, budget=0.03):
+        # Applies queued batches for up to `budget` seconds; returns True once
+        # the whole file has been applied.
+        deadline = time.perf_counter() + budget
+        while not self.done and time.perf_counter() < deadline:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if batch is None:
+                self.done = True
+                if not store.storage.journaled:
+                    store.save()
+            else:
+                apply_batch(store, batch, self.report)
+        return self.done
+
+    def _run(self):
+        try:
+            for batch in batched(validate_rows(read_rows(self.path), self.report), self.batch_size):
+                if self._cancelled:
+                    break
+                self._queue.put(batch)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(None)
+
+
+def iter_catalog_rows(catalogs):
+    for subject, topics in catalogs.items():
+        for topic, subtopics in topics.items():
+            if not subtopics:
+                yield {"subject": subject, "topic": topic}
+            for subtopic, details in subtopics.items():
+                yield {
+                    "subject": subject,
+                    "topic": topic,
+                    "subtopic": subtopic,
+                    "importance": details.get("importance", ""),
+                    "key_concepts": list(details.get("key_concepts", ())),
+                    "items": list(details.get("subtopics", ()))
+                }
+
+
+def export_catalog(catalogs, path, report=None):
+    # Writes one row per topic without subtopics and one per subtopic,
+    # streaming to a temporary file that replaces `path` when complete.
+    report = report or BulkReport()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        if is_csv(path):
+            writer = csv.DictWriter(f, CSV_FIELDS)
+            writer.writeheader()
+            for row in iter_catalog_rows(catalogs):
+                for field in ("key_concepts", "items"):
+                    if field in row:
+                        row[field] = f"{LIST_SEPARATOR} ".join(row[field])
+                writer.writerow(row)
+                report.rows += 1
+        else:
+            for row in iter_catalog_rows(catalogs):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                report.rows += 1
+    os.replace(tmp_path, path)
+    return report
+
+
+def catalog_snapshot(store):
+    # The base catalog is read-only, so only the overlay is copied before an
+    # export runs on another thread.
+    catalog = store.catalog
+    overlays = catalog.overlay_data()
+    return {subject: LayeredTopics(overlays[subject.lower()], catalog.base[subject])
+            for subject in TopicCatalog.SUBJECTS}
@@ -0,0 +1,266 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+def freeze_details(details):
+    return MappingProxyType({key: tuple(value) if isinstance(value, list) else value
+                             for key, value in details.items()})
+
+
+def freeze_topics(topics):
+    # Read-only view of a catalog, so one copy can be shared by every store.
+    return MappingProxyType({
+        topic: MappingProxyType({name: freeze_details(details) for name, details in subtopics.items()})
+        for topic, subtopics in topics.items()
+    })
+
+
+class SATTopics:
+    MATH_TOPICS = freeze_topics({
+        "Heart of Algebra": {
+            "Linear Equations": {
+                "subtopics": [
+                    "Single-variable equations",
+                    "Systems of linear equations",
+                    "Linear inequalities",
+                    "Graphing linear equations"
+                ],
+                "key_concepts": [
+                    "Solving for variables",
+                    "Understanding slope and y-intercept",
+                    "Interpreting graphs",
+                    "Word problems with linear relationships"
+                ],
+                "importance": "High - 25-30% of Math section"
+            },
+            "Linear Functions": {
+                "subtopics": [
+                    "Function notation",
+                    "Domain and range",
+                    "Function graphs",
+                    "Linear modeling"
+                ],
+                "key_concepts": [
+                    "Understanding f(x) notation",
+                    "Identifying functions",
+                    "Real-world applications",
+                    "Rate of change"
+                ],
+                "importance": "High - Part of algebra foundation"
+            }
+        },
+        "Problem Solving and Data Analysis": {
+            "Statistics": {
+                "subtopics": [
+                    "Mean, median, mode",
+                    "Standard deviation",
+                    "Interquartile range",
+                    "Data interpretation"
+                ],
+                "key_concepts": [
+                    "Calculating central tendency",
+                    "Understanding spread",
+                    "Reading charts and graphs",
+                    "Statistical significance"
+                ],
+                "importance": "Medium - 15-20% of Math section"
+            },
+            "Ratios and Proportions": {
+                "subtopics": [
+                    "Unit rates",
+                    "Proportional relationships",
+                    "Percentage problems",
+                    "Scale factors"
+                ],
+                "key_concepts": [
+                    "Setting up proportions",
+                    "Cross multiplication",
+                    "Unit conversion",
+                    "Real-world applications"
+                ],
+                "importance": "High - Frequently tested"
+            }
+        },
+        "Passport to Advanced Math": {
+            "Quadratic Equations": {
+                "subtopics": [
+                    "Factoring",
+                    "Completing the square",
+                    "Quadratic formula",
+                    "Graphing parabolas"
+                ],
+                "key_concepts": [
+                    "Finding roots",
+                    "Vertex form",
+                    "Maximum/minimum values",
+                    "Word problems"
+                ],
+                "importance": "High - 15-20% of Math section"
+            },
+            "Polynomial Functions": {
+                "subtopics": [
+                    "Operations with polynomials",
+                    "Polynomial factors",
+                    "Polynomial graphs",
+                    "Complex numbers"
+                ],
+                "key_concepts": [
+                    "Factor theorem",
+                    "Polynomial division",
+                    "End behavior",
+                    "Zeros of polynomials"
+                ],
+                "importance": "Medium - Advanced topic"
+            }
+        }
+    })
+
+    READING_TOPICS = freeze_topics({
+        "Command of Evidence": {
+            "Finding Evidence": {
+                "subtopics": [
+                    "Text citations",
+                    "Data interpretation",
+                    "Supporting claims",
+                    "Multiple sources"
+                ],
+                "key_concepts": [
+                    "Identifying relevant evidence",
+                    "Connecting ideas across passages",
+                    "Evaluating support",
+                    "Drawing conclusions"
+                ],
+                "importance": "High - Core reading skill"
+            }
+        },
+        "Words in Context": {
+            "Vocabulary": {
+                "subtopics": [
+                    "Context clues",
+                    "Multiple meanings",
+                    "Tone and connotation",
+                    "Academic vocabulary"
+                ],
+                "key_concepts": [
+                    "Using context",
+                    "Word families",
+                    "Denotation vs connotation",
+                    "Root words"
+                ],
+                "importance": "High - Throughout reading section"
+            }
+        }
+    })
+
+
+def new_subtopic():
+    return {
+        "subtopics": [],
+        "key_concepts": [],
+        "importance": "Not specified"
+    }
+
+
+def copy_details(details):
+    return {key: list(value) if isinstance(value, (list, tuple)) else value
+            for key, value in details.items()}
+
+
+def copy_topics(topics):
+    return {
+        topic: {name: copy_details(details) for name, details in subtopics.items()}
+        for topic, subtopics in topics.items()
+    }
+
+
+class LayeredTopics(Mapping):
+    # Read-only merge of `upper` over `lower`. With depth 2, a topic present
+    # in both merges its subtopics; deeper values come whole from `upper`.
+    def __init__(self, upper, lower, depth=2):
+        self.upper = upper
+        self.lower = lower
+        self.depth = depth
+
+    def __getitem__(self, key):
+        if key in self.upper:
+            if self.depth > 1 and key in self.lower:
+                return LayeredTopics(self.upper[key], self.lower[key], self.depth - 1)
+            return self.upper[key]
+        return self.lower[key]
+
+    def __contains__(self, key):
+        return key in self.upper or key in self.lower
+
+    def __iter__(self):
+        yield from self.lower
+        for key in self.upper:
+            if key not in self.lower:
+                yield key
+
+    def __len__(self):
+        return len(self.lower) + sum(1 for key in self.upper if key not in self.lower)
+
+
+class TopicCatalog:
+    # A shared, read-only base catalog plus the topics and subtopics one
+    # student added. Only the overlay is ever written or persisted.
+    SUBJECTS = ("Math", "Reading")
+
+    def __init__(self, base=SATTopics):
+        self.base = {"Math": base.MATH_TOPICS, "Reading": base.READING_TOPICS}
+        self.overlay = {"Math": {}, "Reading": {}}
+
+    def topics(self, subject):
+        subject = "Math" if subject == "Math" else "Reading"
+        return LayeredTopics(self.overlay[subject], self.base[subject])
+
+    def add_topic(self, subject, topic):
+        # Returns False when the topic already exists.
+        if topic in self.topics(subject):
+            return False
+        self.overlay[subject][topic] = {}
+        return True
+
+    def add_subtopic(self, subject, topic, subtopic, details=None):
+        # A subtopic that already exists is replaced; returns False when the
+        # topic does not exist.
+        if topic not in self.topics(subject):
+            return False
+        self.overlay[subject].setdefault(topic, {})[subtopic] = details or new_subtopic()
+        return True
+
+    def remove_topic(self, subject, topic):
+        # Only topics the student added can be removed; returns False for
+        # base topics and topics that do not exist.
+        if topic in self.base[subject]:
+            return False
+        return self.overlay[subject].pop(topic, None) is not None
+
+    def remove_subtopic(self, subject, topic, subtopic):
+        # Removes the student's version of a subtopic; a base subtopic it
+        # replaced shows through again.
+        subtopics = self.overlay[subject].get(topic)
+        if subtopics is None or subtopics.pop(subtopic, None) is None:
+            return False
+        if not subtopics and topic in self.base[subject]:
+            del self.overlay[subject][topic]
+        return True
+
+    def load_overlay(self, custom_topics):
+        # Older files stored the whole catalog under custom_topics; entries
+        # identical to the base are dropped so they are not saved again.
+        for subject in self.SUBJECTS:
+            overlay = self.overlay[subject] = {}
+            base = self.base[subject]
+            for topic, subtopics in custom_topics.get(subject.lower(), {}).items():
+                base_subtopics = base.get(topic)
+                if base_subtopics is None:
+                    overlay[topic] = copy_topics({topic: subtopics})[topic]
+                    continue
+                changed = {name: details for name, details in subtopics.items()
+                           if base_subtopics.get(name) != freeze_details(details)}
+                if changed:
+                    overlay[topic] = copy_topics({topic: changed})[topic]
+
+    def overlay_data(self):
+        return {subject.lower(): copy_topics(self.overlay[subject]) for subject in self.SUBJECTS}
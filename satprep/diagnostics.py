@@ -0,0 +1,166 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+
+DIAGNOSTICS_FILE = "sat_diagnostics.json"
+PROFILE_FILE = "sat_profile.prof"
+
+
+class LatencyHistogram:
+    # Log2 buckets over microseconds: bucket i counts durations below 2**i us.
+    BUCKETS = 32
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.counts[min(self.BUCKETS - 1, micros.bit_length())] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the requested rank, in seconds.
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (2 ** bucket) / 1e6)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "buckets_us": {f"<{2 ** bucket}": count
+                           for bucket, count in enumerate(self.counts) if count}
+        }
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = True
+        self.histograms = {}
+        self.profiler = None
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name=None):
+        # Decorator form of timer(); defaults to the function's qualified name.
+        def decorate(fn):
+            label = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(label, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profiling(self):
+        import cProfile
+
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profiling(self, path=None):
+        # Returns the top of the profile as text, and optionally writes the
+        # raw stats for pstats/snakeviz.
+        import io
+        import pstats
+
+        if self.profiler is None:
+            return ""
+        self.profiler.disable()
+        profiler, self.profiler = self.profiler, None
+        if path is not None:
+            profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        return out.getvalue()
+
+    def snapshot(self):
+        return {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+
+    def format_table(self):
+        lines = [f"{'handler':36} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name, stats in self.snapshot().items():
+            lines.append(f"{name:36} {stats['count']:>7} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f}"
+                         f" {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+    def reset(self):
+        self.histograms.clear()
+
+
+class Heartbeat:
+    # Schedules itself with after() and records how late each tick ran,
+    # which is how long the Tk main loop was blocked.
+    def __init__(self, widget, instrumentation, interval_ms=100, name="main_loop_stall"):
+        self.widget = widget
+        self.instrumentation = instrumentation
+        self.interval = interval_ms / 1000
+        self.interval_ms = interval_ms
+        self.name = name
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.instrumentation.record(self.name, max(0.0, now - self._expected))
+        self._expected = now + self.interval
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+
+instrumentation = Instrumentation()
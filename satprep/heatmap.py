@@ -0,0 +1,104 @@
+import bisect
+
+
+UNRATED_COLOR = "#4a4a5a"
+LOW_COLOR = (0xd0, 0x3a, 0x3a)   # rating 1
+MID_COLOR = (0xe8, 0xc2, 0x3a)   # rating 5.5
+HIGH_COLOR = (0x2e, 0xc2, 0x6b)  # rating 10
+
+
+def blend(low, high, fraction):
+    return "#%02x%02x%02x" % tuple(round(a + (b - a) * fraction) for a, b in zip(low, high))
+
+
+# One color per half point, so tiles share a small set of fill strings.
+RATING_COLORS = [blend(LOW_COLOR, MID_COLOR, step / 9) if step <= 9 else blend(MID_COLOR, HIGH_COLOR, (step - 9) / 9)
+                 for step in range(19)]
+
+
+def rating_color(rating):
+    if rating is None:
+        return UNRATED_COLOR
+    return RATING_COLORS[round((min(10, max(1, rating)) - 1) * 2)]
+
+
+def effective_rating(store, node_id):
+    # A leaf without its own rating shows the closest rated ancestor's.
+    registry = store.registry
+    while node_id is not None and len(registry.path(node_id)) > 1:
+        rating = store.get_rating(node_id)
+        if rating is not None:
+            return rating
+        node_id = registry.parent(node_id)
+    return None
+
+
+class HeatmapLayout:
+    # Every childless node below a subject as one tile on a grid with
+    # `columns` tiles per row. Each subject is a section that starts with a
+    # header row. Tile positions are arithmetic on the tile's index, so the
+    # tiles in a viewport are found without visiting the hidden ones.
+    def __init__(self, registry, subjects=("Math", "Reading")):
+        self.registry = registry
+        self.subjects = subjects
+        self.columns = 1
+        self.sections = []        # [(subject, [leaf id])]
+        self.section_rows = []    # first row (the header) of each section
+        self.position = {}        # leaf id -> (section, index)
+        self.rebuild()
+
+    def rebuild(self):
+        self.sections = []
+        self.position = {}
+        for subject in self.subjects:
+            leaves = []
+            stack = [self.registry.subject_id(subject)]
+            while stack:
+                node_id = stack.pop()
+                children = list(self.registry.children_of(node_id))
+                if children:
+                    stack.extend(reversed(children))
+                elif len(self.registry.path(node_id)) > 1:
+                    self.position[node_id] = (len(self.sections), len(leaves))
+                    leaves.append(node_id)
+            self.sections.append((subject, leaves))
+        self.set_columns(self.columns)
+
+    def set_columns(self, columns):
+        self.columns = max(1, columns)
+        self.section_rows = []
+        row = 0
+        for subject, leaves in self.sections:
+            self.section_rows.append(row)
+            row += 1 + -(-len(leaves) // self.columns)
+        self.rows = row
+
+    def __len__(self):
+        return len(self.position)
+
+    def row(self, row):
+        # ("header", section) or ("tiles", section, first leaf index).
+        section = bisect.bisect_right(self.section_rows, row) - 1
+        offset = row - self.section_rows[section]
+        if offset == 0:
+            return "header", section
+        return "tiles", section, (offset - 1) * self.columns
+
+    def tile_at(self, row, column):
+        if not 0 <= row < self.rows or not 0 <= column < self.columns:
+            return None
+        content = self.row(row)
+        if content[0] == "header":
+            return None
+        leaves = self.sections[content[1]][1]
+        index = content[2] + column
+        return leaves[index] if index < len(leaves) else None
+
+    def cell(self, node_id):
+        # (row, column) of a leaf's tile, or None for nodes without one.
+        position = self.position.get(node_id)
+        if position is None:
+            return None
+        section, index = position
+        return self.section_rows[section] + 1 + index // self.columns, index % self.columns
+
@@ -0,0 +1,294 @@
+import bisect
+import json
+import mmap
+import os
+import time
+from array import array
+from itertools import compress
+
+from .sharing import FileLock
+
+HISTORY_DIR = "sat_study_data.history"
+COALESCE_SECONDS = 2.0  # slider events for one topic closer than this merge
+TAIL_LIMIT = 4096  # in-memory samples before they are appended to disk
+
+
+class Column:
+    # One append-only column: samples already on disk are memory-mapped
+    # read-only, newer ones sit in an array until flush().
+    def __init__(self, path, typecode):
+        self.path = path
+        self.typecode = typecode
+        self.tail = array(typecode)
+        self.mapped = memoryview(b"").cast(typecode)
+        self._file = None
+        self._mmap = None
+
+    def open(self, count=None):
+        # `count` truncates a column left longer than the others by a crash
+        # between column writes.
+        self.close()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        itemsize = self.tail.itemsize
+        if count is not None and size > count * itemsize:
+            with open(self.path, "r+b") as f:
+                f.truncate(count * itemsize)
+            size = count * itemsize
+        size -= size % itemsize
+        if size:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            self.mapped = memoryview(self._mmap).cast(self.typecode)
+        return size // itemsize
+
+    def flush(self):
+        if not self.tail:
+            return
+        self.close()
+        with open(self.path, "ab") as f:
+            self.tail.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.tail = array(self.typecode)
+        self.open()
+
+    def close(self):
+        self.mapped.release()
+        self.mapped = memoryview(b"").cast(self.typecode)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def __len__(self):
+        return len(self.mapped) + len(self.tail)
+
+    def __getitem__(self, index):
+        mapped = len(self.mapped)
+        return self.mapped[index] if index < mapped else self.tail[index - mapped]
+
+    def segments(self, lo, hi):
+        # The [lo, hi) range as at most two slices, mapped then in-memory.
+        mapped = len(self.mapped)
+        if lo < mapped:
+            yield self.mapped[lo:min(hi, mapped)]
+        if hi > mapped:
+            yield self.tail[max(lo, mapped) - mapped:hi - mapped]
+
+
+class RatingHistory:
+    # Every rating change as a (timestamp, key, rating) sample, stored in
+    # three column files of doubles, uint32s and floats. Keys index a
+    # history-local table of topic path keys, since registry ids are only
+    # stable within one run. Processes sharing the directory append under
+    # a FileLock and pick up each other's keys before assigning their own.
+    def __init__(self, directory=HISTORY_DIR, coalesce=COALESCE_SECONDS):
+        self.directory = directory
+        self.coalesce = coalesce
+        self.keys = []        # history key -> topic path key
+        self.key_ids = {}
+        self.paths = []       # history key -> topic path tuple
+        self.samples_recorded = 0
+        self.samples_coalesced = 0
+        self._saved_keys = 0
+        self._keys_offset = 0
+        self.lock = FileLock(os.path.join(directory, "history.lock"))
+        self.times = Column(os.path.join(directory, "time.f64"), "d")
+        self.topics = Column(os.path.join(directory, "topic.u32"), "I")
+        self.ratings = Column(os.path.join(directory, "rating.f32"), "f")
+        self.columns = (self.times, self.topics, self.ratings)
+
+    @property
+    def keys_path(self):
+        return os.path.join(self.directory, "keys.jsonl")
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self._load_keys()
+            self._open_columns()
+
+    def record(self, key, rating, when=None):
+        when = time.time() if when is None else when
+        if len(self.times):
+            # Timestamps stay sorted so time ranges can be found by bisection.
+            when = max(when, self.times[len(self.times) - 1])
+        key_id = self.key_id(key)
+        tail = self.times.tail
+        if tail and self.topics.tail[-1] == key_id and when - tail[-1] < self.coalesce:
+            tail[-1] = when
+            self.ratings.tail[-1] = rating
+            self.samples_coalesced += 1
+            return
+        tail.append(when)
+        self.topics.tail.append(key_id)
+        self.ratings.tail.append(rating)
+        self.samples_recorded += 1
+        if len(tail) >= TAIL_LIMIT:
+            self.flush()
+
+    def key_id(self, key):
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.paths.append(tuple(json.loads(key)))
+        return key_id
+
+    def flush(self):
+        if not self.times.tail:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self._refresh()
+            if len(self.keys) > self._saved_keys:
+                with open(self.keys_path, "ab") as f:
+                    for key in self.keys[self._saved_keys:]:
+                        f.write((json.dumps(key, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self._keys_offset = f.tell()
+                self._saved_keys = len(self.keys)
+            for column in self.columns:
+                column.flush()
+
+    def refresh(self):
+        # Picks up what other processes flushed. Only the file sizes are
+        # checked unless something changed, so this is cheap to call before
+        # every read.
+        try:
+            changed = (os.path.getsize(self.keys_path) != self._keys_offset
+                       or os.path.getsize(self.times.path) != len(self.times.mapped) * self.times.tail.itemsize)
+        except OSError:
+            return
+        if changed:
+            with self.lock:
+                self._refresh()
+
+    def close(self):
+        self.flush()
+        for column in self.columns:
+            column.close()
+        self.lock.close()
+
+    def __len__(self):
+        return len(self.times)
+
+    def keys_under(self, path):
+        # History keys for the topic at `path` and everything below it.
+        depth = len(path)
+        return {key_id for key_id, key_path in enumerate(self.paths) if key_path[:depth] == path}
+
+    def samples(self, key_ids=None, start=None, end=None):
+        lo, hi = self._range(start, end)
+        for times, topics, ratings in zip(self.times.segments(lo, hi), self.topics.segments(lo, hi),
+                                          self.ratings.segments(lo, hi)):
+            for when, key_id, rating in zip(times, topics, ratings):
+                if key_ids is None or key_id in key_ids:
+                    yield when, key_id, rating
+
+    def buckets(self, key_ids, count, start, end):
+        # Downsamples the samples in [start, end) into `count` equal time
+        # buckets; returns [bucket start, min, max, mean, samples] for every
+        # bucket that has samples. Bucket edges are found by bisection and
+        # the per-sample work runs in C through compress() and min()/max().
+        width = (end - start) / count if end > start else 1.0
+        edges = [bisect.bisect_left(self.times, start + index * width) for index in range(count)]
+        edges.append(self._range(None, end)[1])
+        result = []
+        for index in range(count):
+            lo, hi = edges[index], edges[index + 1]
+            if lo >= hi:
+                continue
+            values = []
+            for topics, ratings in zip(self.topics.segments(lo, hi), self.ratings.segments(lo, hi)):
+                if key_ids is None:
+                    values.extend(ratings)
+                else:
+                    values.extend(compress(ratings, map(key_ids.__contains__, topics)))
+            if values:
+                result.append([start + index * width, min(values), max(values),
+                               sum(values) / len(values), len(values)])
+        return result
+
+    def time_span(self):
+        if not len(self.times):
+            return None
+        return self.times[0], self.times[len(self.times) - 1]
+
+    def _range(self, start, end):
+        lo = 0 if start is None else bisect.bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect.bisect_left(self.times, end)
+        return lo, hi
+
+    def _open_columns(self):
+        # Callers hold the lock, so columns of different lengths were left
+        # by a crash between column writes and are cut to the shortest.
+        counts = [column.open() for column in self.columns]
+        count = min(counts)
+        if max(counts) != count:
+            for column in self.columns:
+                column.open(count)
+        # Samples whose key line was lost are unusable; keys are always
+        # written before the samples that use them, so this only trims a
+        # damaged tail.
+        while count and self.topics.mapped[count - 1] >= self._saved_keys:
+            count -= 1
+            for column in self.columns:
+                column.open(count)
+        # Unsaved samples stay after the ones just read, so times stay sorted.
+        tail = self.times.tail
+        if count and tail:
+            last = self.times.mapped[count - 1]
+            for index, when in enumerate(tail):
+                if when >= last:
+                    break
+                tail[index] = last
+
+    def _refresh(self):
+        # Reads the keys and samples other processes saved. Keys this one
+        # has not saved yet are numbered after them, and its unsaved samples
+        # renumbered to match.
+        saved = self._saved_keys
+        pending = self.keys[saved:]
+        for key in pending:
+            del self.key_ids[key]
+        del self.keys[saved:]
+        del self.paths[saved:]
+        self._read_keys()
+        key_ids = [self.key_id(key) for key in pending]
+        if key_ids != list(range(saved, saved + len(pending))):
+            topics = self.topics.tail
+            for index, key_id in enumerate(topics):
+                if key_id >= saved:
+                    topics[index] = key_ids[key_id - saved]
+        self._open_columns()
+
+    def _load_keys(self):
+        self.keys = []
+        self.key_ids = {}
+        self.paths = []
+        self._keys_offset = 0
+        self._read_keys()
+
+    def _read_keys(self):
+        # Reads key lines from _keys_offset on; callers hold the lock, so a
+        # partial line at the end was torn by a crash.
+        if not os.path.exists(self.keys_path):
+            self._saved_keys = len(self.keys)
+            return
+        good = self._keys_offset
+        with open(self.keys_path, "rb") as f:
+            f.seek(good)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    key = json.loads(line)
+                except ValueError:
+                    break
+                self.key_id(key)
+                good += len(line)
+        if good != os.path.getsize(self.keys_path):
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(good)
+        self._keys_offset = good
+        self._saved_keys = len(self.keys)
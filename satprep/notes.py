@@ -0,0 +1,273 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from .registry import is_path_key
+
+
+NOTES_FILE = "sat_study_data.notes"
+COMPACT_MIN_BYTES = 1024 * 1024  # segment size below which dead notes are left alone
+MAGIC = b"SATNOTE1"
+FILE_HEADER = struct.Struct("<8sQ")   # magic, generation
+RECORD_HEADER = struct.Struct("<III")  # crc32, key bytes, text bytes
+DELETED = 0xFFFFFFFF
+
+
+def notes_path_for(data_path):
+    return os.path.splitext(data_path)[0] + ".notes"
+
+
+class NoteSegment:
+    # Notes as records appended to one memory-mapped file, found through an
+    # in-memory key -> (offset, length) index. Saving a note appends only
+    # that note; older versions become dead space that compact() drops. The
+    # index is written next to the segment on close, so opening reads it
+    # and scans only records appended after it was written.
+    def __init__(self, path=NOTES_FILE):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.index = {}
+        self.generation = 0
+        self.size = 0
+        self.live_bytes = 0
+        self.records_appended = 0
+        self.compactions = 0
+        self._file = None
+        self._mmap = None
+        self._writer = None
+        self._indexed_size = None
+
+    def open(self):
+        self.close()
+        if not os.path.exists(self.path):
+            self._create(self.path, 1)
+        with open(self.path, "rb") as f:
+            header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header)[0] != MAGIC:
+            raise ValueError(f"{self.path} is not a notes file")
+        self.generation = FILE_HEADER.unpack(header)[1]
+        start = self._load_index()
+        self._scan(start)
+        self._writer = open(self.path, "ab")
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def get(self, key):
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        if self._mmap is None or offset + length > len(self._mmap):
+            self._map()
+        return bytes(self._mmap[offset:offset + length]).decode("utf-8")
+
+    def items(self):
+        # In file order, so a full pass reads the segment front to back.
+        for key, _ in sorted(self.index.items(), key=lambda entry: entry[1][0]):
+            yield key, self.get(key)
+
+    def put(self, key, text):
+        self._append(key, text.encode("utf-8"))
+
+    def delete(self, key):
+        if key in self.index:
+            self._append(key, None)
+
+    def migrate_keys(self, resolve):
+        # A note saved under the newer path key for the same topic wins over
+        # one under its old key.
+        for key in self.keys():
+            if is_path_key(key):
+                continue
+            new_key = resolve(key)
+            if new_key != key:
+                if new_key not in self.index:
+                    self.put(new_key, self.get(key))
+                self.delete(key)
+
+    def refresh(self):
+        # Reads the records other processes appended since this segment
+        # last read the file, or the whole file if one of them compacted it,
+        # and returns the keys of the notes that changed. Callers hold the
+        # file lock, so a partial record at the end was left by a crash.
+        if self._writer is None:
+            return []
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return []
+        if st.st_ino != os.fstat(self._writer.fileno()).st_ino:
+            keys = set(self.index)
+            self._writer.close()
+            self._writer = None
+            self._unmap()
+            self.open()
+            return list(keys.union(self.index))
+        if st.st_size == self.size:
+            return []
+        return self._scan(self.size)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+
+    def close(self):
+        if self._writer is None:
+            return
+        # Notes other processes appended belong in a compacted copy too.
+        self.refresh()
+        self.flush()
+        self._writer.close()
+        self._writer = None
+        self._unmap()
+        if self.size > COMPACT_MIN_BYTES and self.live_bytes * 2 < self.size:
+            self.compact()
+        if self._indexed_size != self.size:
+            self._save_index()
+
+    def compact(self):
+        # Copies the live notes into a new segment with a new generation, so
+        # an index left from the old file is never applied to the new one.
+        reopen = self._writer is not None
+        if reopen:
+            self._writer.close()
+            self._writer = None
+        tmp_path = f"{self.path}.tmp"
+        notes = dict(self.items())
+        generation = self.generation + 1
+        index = {}
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, generation))
+            for key, text in notes.items():
+                index[key] = self._write_record(f, key, text.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self._unmap()
+        os.replace(tmp_path, self.path)
+        self.generation = generation
+        self.index = index
+        self.size = self.live_bytes = size
+        self.compactions += 1
+        self._save_index()
+        if reopen:
+            self._writer = open(self.path, "ab")
+
+    @property
+    def stats(self):
+        return {"notes": len(self.index), "note_bytes": self.size,
+                "live_note_bytes": self.live_bytes, "note_compactions": self.compactions}
+
+    def _append(self, key, body):
+        if self._writer is None:
+            self.open()
+        old = self.index.pop(key, None)
+        if old is not None:
+            self.live_bytes -= self._record_size(key, old[1])
+        # Records are located by position, and another process may have
+        # appended since this handle last wrote.
+        self._writer.seek(0, os.SEEK_END)
+        entry = self._write_record(self._writer, key, body)
+        self._writer.flush()
+        self.records_appended += 1
+        if body is not None:
+            self.index[key] = entry
+            self.live_bytes += self._record_size(key, len(body))
+        self.size = self._writer.tell()
+
+    def _write_record(self, f, key, body):
+        # Returns where the note text starts and how long it is.
+        key_bytes = key.encode("utf-8")
+        length = DELETED if body is None else len(body)
+        payload = key_bytes + (body or b"")
+        f.write(RECORD_HEADER.pack(zlib.crc32(payload), len(key_bytes), length))
+        f.write(payload)
+        return f.tell() - len(body or b""), length
+
+    @staticmethod
+    def _record_size(key, length):
+        return RECORD_HEADER.size + len(key.encode("utf-8")) + length
+
+    def _scan(self, start):
+        # Reads records from `start` to the end, dropping a record torn by a
+        # crash mid-append; returns the keys they touched.
+        offset = start
+        keys = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                crc, key_length, length = RECORD_HEADER.unpack(header)
+                payload = f.read(key_length + (0 if length == DELETED else length))
+                if len(payload) < key_length + (0 if length == DELETED else length) \
+                        or zlib.crc32(payload) != crc:
+                    break
+                key = payload[:key_length].decode("utf-8")
+                keys.append(key)
+                old = self.index.pop(key, None)
+                if old is not None:
+                    self.live_bytes -= self._record_size(key, old[1])
+                if length != DELETED:
+                    self.index[key] = (offset + RECORD_HEADER.size + key_length, length)
+                    self.live_bytes += self._record_size(key, length)
+                offset = f.tell()
+        if offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self.size = offset
+        return keys
+
+    def _load_index(self):
+        # Returns the offset to scan from: the end of what the saved index
+        # covers, or the first record if there is no usable index.
+        self.index = {}
+        self.live_bytes = FILE_HEADER.size
+        self._indexed_size = None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved["generation"] != self.generation or saved["size"] > os.path.getsize(self.path):
+                return FILE_HEADER.size
+            self.index = {key: tuple(entry) for key, entry in saved["notes"].items()}
+            self.live_bytes = saved["live_bytes"]
+            self._indexed_size = saved["size"]
+            return saved["size"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.index = {}
+            self.live_bytes = FILE_HEADER.size
+            return FILE_HEADER.size
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation, "size": self.size,
+                       "live_bytes": self.live_bytes, "notes": self.index}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        self._indexed_size = self.size
+
+    def _create(self, path, generation):
+        with open(path, "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, generation))
+
+    def _map(self):
+        self._unmap()
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
@@ -0,0 +1,84 @@
+import os
+from collections import OrderedDict
+
+from .catalog import SATTopics
+from .history import HISTORY_DIR
+from .storage import SEARCH_INDEX_FILE, create_storage
+from .store import StudyStore
+from .sync import SYNC_FILE
+
+
+PROFILES_DIR = "profiles"
+PROFILE_CACHE_SIZE = 8
+DEFAULT_PROFILE = "default"
+
+
+class ProfileStore:
+    # One StudyStore per student under <directory>/<name>/, all sharing the
+    # same read-only base catalog. Profiles are
+    # loaded when first opened and kept in a bounded LRU; the least recently
+    # used one is flushed and closed when the cache is full, so memory does
+    # not grow with the number of students.
+    def __init__(self, directory=PROFILES_DIR, mode="json", capacity=PROFILE_CACHE_SIZE, catalog=SATTopics):
+        self.directory = directory
+        self.mode = mode
+        self.capacity = max(1, capacity)
+        self.catalog = catalog
+        self.hits = 0
+        self.misses = 0
+        self._open = OrderedDict()
+        self._errors = []
+        os.makedirs(directory, exist_ok=True)
+
+    def names(self):
+        return sorted(entry.name for entry in os.scandir(self.directory)
+                      if entry.is_dir() and not entry.name.startswith("."))
+
+    def profile_dir(self, name):
+        name = name.strip()
+        if not name or name.startswith(".") or os.sep in name or "/" in name:
+            raise ValueError(f"Invalid profile name: {name!r}")
+        return os.path.join(self.directory, name)
+
+    def open(self, name):
+        # Returns the profile's store and any errors from loading it; a
+        # profile that does not exist yet is created.
+        store = self._open.get(name)
+        if store is not None:
+            self.hits += 1
+            self._open.move_to_end(name)
+            return store, []
+        self.misses += 1
+        directory = self.profile_dir(name)
+        os.makedirs(directory, exist_ok=True)
+        store = StudyStore(create_storage(self.mode, directory), catalog=self.catalog,
+                           index_path=os.path.join(directory, SEARCH_INDEX_FILE),
+                           history_path=os.path.join(directory, HISTORY_DIR),
+                           sync_path=os.path.join(directory, SYNC_FILE))
+        errors = store.load()
+        self._open[name] = store
+        while len(self._open) > self.capacity:
+            self._evict()
+        return store, errors
+
+    def is_open(self, name):
+        return name in self._open
+
+    def close(self):
+        while self._open:
+            self._evict()
+
+    def pop_errors(self):
+        errors, self._errors = self._errors, []
+        for store in self._open.values():
+            errors.extend(store.pop_errors())
+        return errors
+
+    @property
+    def stats(self):
+        return {"open": len(self._open), "hits": self.hits, "misses": self.misses}
+
+    def _evict(self):
+        name, store = self._open.popitem(last=False)
+        store.close()
+        self._errors.extend(store.pop_errors())
@@ -0,0 +1,109 @@
+import json
+
+
+def path_key(path):
+    return json.dumps(list(path), ensure_ascii=False, separators=(",", ":"))
+
+
+def is_path_key(key):
+    return key.startswith("[")
+
+
+def subject_of(key):
+    if is_path_key(key):
+        return json.loads(key)[0]
+    return key.split(" - ", 1)[0]
+
+
+class TopicRegistry:
+    # Interns every catalog node as a small integer id. Ids never change for
+    # the lifetime of the registry, even when a node is re-added, so ratings
+    # and notes keyed by id stay attached to the same path.
+    def __init__(self, catalogs):
+        self.paths = []      # id -> path tuple
+        self.ids = {}        # path tuple -> id
+        self.children = {}   # id -> {child name: child id}, in catalog order
+        self.items = {}      # id -> Treeview item, for rows that exist
+        self._keys = []      # id -> path key, or None until first asked for
+        self._legacy = None  # old "A - B - C" key -> id, built on first use
+        for subject, topics in catalogs.items():
+            self.add_subject(subject, topics)
+
+    def intern(self, path):
+        node_id = self.ids.get(path)
+        if node_id is None:
+            node_id = len(self.paths)
+            self.paths.append(path)
+            self._keys.append(None)
+            self.ids[path] = node_id
+            if self._legacy is not None:
+                self._legacy[" - ".join(path)] = node_id
+        return node_id
+
+    def add_subject(self, subject, topics):
+        subject_id = self.intern((subject,))
+        self.children[subject_id] = {}
+        for topic, subtopics in topics.items():
+            topic_id = self.add_child(subject_id, topic)
+            for subtopic, details in subtopics.items():
+                subtopic_id = self.add_child(topic_id, subtopic)
+                for leaf in details.get("subtopics", []):
+                    self.add_child(subtopic_id, leaf)
+        return subject_id
+
+    def add_child(self, parent_id, name):
+        node_id = self.intern(self.paths[parent_id] + (name,))
+        # Re-adding a node replaces it with an empty one, as SATTopics does.
+        self.children.pop(node_id, None)
+        self.children.setdefault(parent_id, {})[name] = node_id
+        return node_id
+
+    def remove_child(self, parent_id, name):
+        # Unlinks the node; its id and path stay interned, so ratings and
+        # notes keyed by it come back if the node is added again.
+        return self.children.get(parent_id, {}).pop(name, None)
+
+    def subject_id(self, subject):
+        return self.ids[(subject,)]
+
+    def parent(self, node_id):
+        path = self.paths[node_id]
+        return self.ids.get(path[:-1]) if len(path) > 1 else None
+
+    def is_linked(self, node_id):
+        # False for ids that only exist for stored data, or whose branch was
+        # dropped when an ancestor was re-added.
+        path = self.paths[node_id]
+        while len(path) > 1:
+            parent_id = self.ids.get(path[:-1])
+            if parent_id is None or self.children.get(parent_id, {}).get(path[-1]) != node_id:
+                return False
+            node_id, path = parent_id, path[:-1]
+        return True
+
+    def path(self, node_id):
+        return self.paths[node_id]
+
+    def key(self, node_id):
+        # Paths never change, so each key is built once.
+        key = self._keys[node_id]
+        if key is None:
+            key = self._keys[node_id] = path_key(self.paths[node_id])
+        return key
+
+    def children_of(self, node_id):
+        return self.children.get(node_id, {}).values()
+
+    def has_children(self, node_id):
+        return bool(self.children.get(node_id))
+
+    def resolve_key(self, key):
+        # Accepts both the current path keys and the old "A - B - C" strings.
+        if is_path_key(key):
+            return self.intern(tuple(json.loads(key)))
+        if self._legacy is None:
+            self._legacy = {" - ".join(path): node_id for node_id, path in enumerate(self.paths)}
+        node_id = self._legacy.get(key)
+        if node_id is None:
+            node_id = self.intern(tuple(key.split(" - ")))
+        return node_id
@@ -0,0 +1,101 @@
+class RatingRollup:
+    # Per-node [sum, count, min] over every rating in the node's subtree,
+    # the node's own rating included.
+    def __init__(self, registry, ratings):
+        self.registry = registry
+        self.ratings = ratings
+        self.aggs = {}
+        self.rebuild()
+
+    def rebuild(self):
+        self.aggs.clear()
+        for path in self.registry.paths:
+            if len(path) == 1:
+                self._compute_subtree(self.registry.ids[path])
+
+    def rating_changed(self, node_id, old, new):
+        # O(depth): sums and counts take the delta; a min is only rescanned
+        # over direct children when the old minimum itself went away.
+        if not self.registry.is_linked(node_id):
+            return []
+        d_sum = (new or 0.0) - (old or 0.0)
+        d_count = (new is not None) - (old is not None)
+        touched = []
+        while node_id is not None:
+            agg = self.aggs.setdefault(node_id, [0.0, 0, None])
+            agg[0] += d_sum
+            agg[1] += d_count
+            low = agg[2]
+            if new is not None and (low is None or new <= low):
+                agg[2] = new
+            elif old is not None and low is not None and old <= low:
+                agg[2] = self._min_of(node_id)
+            touched.append(node_id)
+            node_id = self.registry.parent(node_id)
+        return touched
+
+    def detach(self, node_id):
+        # Called before a catalog edit drops or re-links a branch.
+        if node_id not in self.aggs or not self.registry.is_linked(node_id):
+            return []
+        old = self.aggs[node_id]
+        self._forget_subtree(node_id)
+        return self._propagate(node_id, -old[0], -old[1], rescan_min=True)
+
+    def attach(self, node_id):
+        if not self.registry.is_linked(node_id):
+            return []
+        new = self._compute_subtree(node_id)
+        return [node_id] + self._propagate(node_id, new[0], new[1], new_min=new[2])
+
+    def _propagate(self, node_id, d_sum, d_count, new_min=None, rescan_min=False):
+        touched = []
+        parent_id = self.registry.parent(node_id)
+        while parent_id is not None:
+            agg = self.aggs.setdefault(parent_id, [0.0, 0, None])
+            agg[0] += d_sum
+            agg[1] += d_count
+            if rescan_min:
+                agg[2] = self._min_of(parent_id)
+            elif new_min is not None and (agg[2] is None or new_min < agg[2]):
+                agg[2] = new_min
+            touched.append(parent_id)
+            parent_id = self.registry.parent(parent_id)
+        return touched
+
+    def _forget_subtree(self, node_id):
+        self.aggs.pop(node_id, None)
+        for child_id in self.registry.children_of(node_id):
+            self._forget_subtree(child_id)
+
+    def summary(self, node_id):
+        total, count, low = self.aggs.get(node_id, (0.0, 0, None))
+        return {
+            "sum": total,
+            "count": count,
+            "min": low,
+            "mean": total / count if count else None
+        }
+
+    def mastery(self, subject):
+        return self.summary(self.registry.subject_id(subject))
+
+    def _compute_subtree(self, node_id):
+        own = self.ratings.get(node_id)
+        agg = [own or 0.0, 0 if own is None else 1, own]
+        for child_id in self.registry.children_of(node_id):
+            child = self._compute_subtree(child_id)
+            agg[0] += child[0]
+            agg[1] += child[1]
+            if child[2] is not None and (agg[2] is None or child[2] < agg[2]):
+                agg[2] = child[2]
+        self.aggs[node_id] = agg
+        return agg
+
+    def _min_of(self, node_id):
+        low = self.ratings.get(node_id)
+        for child_id in self.registry.children_of(node_id):
+            child_min = self.aggs.get(child_id, (0.0, 0, None))[2]
+            if child_min is not None and (low is None or child_min < low):
+                low = child_min
+        return low
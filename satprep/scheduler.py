@@ -0,0 +1,236 @@
+import bisect
+import heapq
+from datetime import date, timedelta
+
+
+SESSION_MINUTES = 30
+DEFAULT_RATING = 1
+# Days until the next review after each repetition.
+REVIEW_INTERVALS = [1, 3, 7, 14, 30]
+IMPORTANCE_WEIGHTS = {"high": 3.0, "medium": 2.0, "low": 1.0}
+DEFAULT_IMPORTANCE = 2.0
+
+
+def importance_weight(importance):
+    # Catalog importance strings look like "High - Frequently tested".
+    level = importance.split(" - ", 1)[0].strip().lower()
+    return IMPORTANCE_WEIGHTS.get(level, DEFAULT_IMPORTANCE)
+
+
+def repetitions_for(rating):
+    # Weak topics get the full review ladder; mastered ones a single pass.
+    weakness = (10 - min(10, max(1, rating))) / 9
+    return 1 + round(weakness * (len(REVIEW_INTERVALS) - 1))
+
+
+class Session:
+    __slots__ = ("topic_id", "repetition", "repetitions", "priority", "due")
+
+    def __init__(self, topic_id, repetition, repetitions, priority, due):
+        self.topic_id = topic_id
+        self.repetition = repetition
+        self.repetitions = repetitions
+        self.priority = priority
+        self.due = due
+
+    def __lt__(self, other):
+        # Inverted so heapq pops the most urgent session first.
+        return (self.priority, -self.due) > (other.priority, -other.due)
+
+
+class StudyScheduler:
+    # Turns ratings into a day-by-day plan of study sessions up to the test
+    # date. Every childless node below a subject is a study unit; its
+    # priority grows with weakness and catalog importance, and each unit is
+    # scheduled once per repetition, spaced by REVIEW_INTERVALS.
+    def __init__(self, store, test_date, daily_minutes, start=None, session_minutes=SESSION_MINUTES):
+        self.store = store
+        self.start = start or date.today()
+        self.test_date = test_date
+        self.session_minutes = session_minutes
+        self.capacity = max(1, daily_minutes // session_minutes)
+        self.days = []            # day index -> [Session]
+        self.free_days = []       # sorted day indexes with spare capacity
+        self.placed = {}          # topic id -> [(day index, Session)]
+        self.unscheduled = []     # heap of sessions that did not fit
+        self.spawned = set()      # (topic id, repetition) placed or unscheduled
+
+    @property
+    def day_count(self):
+        return max(0, (self.test_date - self.start).days)
+
+    def day_date(self, day):
+        return self.start + timedelta(days=day)
+
+    def day_index(self, when):
+        return (when - self.start).days
+
+    def study_units(self):
+        registry = self.store.registry
+        stack = [registry.subject_id(subject) for subject in ("Math", "Reading")]
+        while stack:
+            node_id = stack.pop()
+            if registry.has_children(node_id):
+                stack.extend(registry.children_of(node_id))
+            elif len(registry.path(node_id)) > 2:
+                yield node_id
+
+    def effective_rating(self, topic_id):
+        # Unrated items inherit the rating of their closest rated ancestor.
+        registry = self.store.registry
+        node_id = topic_id
+        while node_id is not None and len(registry.path(node_id)) > 1:
+            rating = self.store.get_rating(node_id)
+            if rating is not None:
+                return rating
+            node_id = registry.parent(node_id)
+        return DEFAULT_RATING
+
+    def weight(self, topic_id):
+        path = self.store.registry.path(topic_id)
+        if len(path) < 3:
+            return DEFAULT_IMPORTANCE
+        details = self.store.subject_topics(path[0]).get(path[1], {}).get(path[2], {})
+        return importance_weight(details.get("importance", ""))
+
+    def sessions_for(self, topic_id):
+        rating = self.effective_rating(topic_id)
+        priority = self.weight(topic_id) * (11 - rating)
+        return priority, repetitions_for(rating)
+
+    def build(self):
+        self.days = [[] for _ in range(self.day_count)]
+        self.free_days = list(range(self.day_count))
+        self.placed = {}
+        self.unscheduled = []
+        self.spawned = set()
+        heap = [self._first_session(topic_id) for topic_id in self.study_units()]
+        heapq.heapify(heap)
+        self._drain(heap)
+        return self.days
+
+    def rating_changed(self, topic_id):
+        # Re-plans only the study units under topic_id and returns the day
+        # indexes whose sessions changed.
+        if not self.days:
+            return set()
+        changed = set()
+        units = [topic_id] if not self.store.registry.has_children(topic_id) else []
+        stack = list(self.store.registry.children_of(topic_id))
+        while stack:
+            node_id = stack.pop()
+            if self.store.registry.has_children(node_id):
+                stack.extend(self.store.registry.children_of(node_id))
+            else:
+                units.append(node_id)
+        removed = set(units)
+        for unit in units:
+            for day, session in self.placed.pop(unit, ()):
+                self.days[day].remove(session)
+                self._mark_free(day)
+                changed.add(day)
+            for repetition in range(len(REVIEW_INTERVALS)):
+                self.spawned.discard((unit, repetition))
+        self.unscheduled = [session for session in self.unscheduled if session.topic_id not in removed]
+        heapq.heapify(self.unscheduled)
+
+        heap = [self._first_session(unit) for unit in units if len(self.store.registry.path(unit)) > 2]
+        heapq.heapify(heap)
+        changed.update(self._drain(heap, evict=removed))
+        changed.update(self._refill())
+        return changed
+
+    def sessions_on(self, when):
+        day = self.day_index(when)
+        if 0 <= day < len(self.days):
+            return self.days[day]
+        return []
+
+    def _first_session(self, topic_id):
+        priority, repetitions = self.sessions_for(topic_id)
+        self.spawned.add((topic_id, 0))
+        return Session(topic_id, 0, repetitions, priority, 0)
+
+    def _drain(self, heap, evict=()):
+        # Sessions of topics in `evict` may displace less urgent sessions
+        # when no free day is left.
+        changed = set()
+        while heap:
+            session = heapq.heappop(heap)
+            day = self._next_free_day(session.due)
+            displaced = None
+            if day is None and session.topic_id in evict:
+                day, displaced = self._evict(session)
+            if day is None:
+                heapq.heappush(self.unscheduled, session)
+                continue
+            self._place(day, session)
+            changed.add(day)
+            if displaced is not None:
+                self._replace(displaced, changed)
+            following = (session.topic_id, session.repetition + 1)
+            due = day + REVIEW_INTERVALS[session.repetition]
+            if session.repetition + 1 < session.repetitions and due < len(self.days) \
+                    and following not in self.spawned:
+                self.spawned.add(following)
+                # Reviews rank a little below first passes so new material
+                # is covered before revisiting what was already studied.
+                heapq.heappush(heap, Session(session.topic_id, session.repetition + 1,
+                                             session.repetitions, session.priority * 0.8, due))
+        return changed
+
+    def _refill(self):
+        # Sessions that were squeezed out earlier get another chance at any
+        # freed days, most urgent first.
+        changed = set()
+        retry = []
+        while self.free_days and self.unscheduled:
+            session = heapq.heappop(self.unscheduled)
+            if session.due > self.free_days[-1]:
+                retry.append(session)
+            else:
+                changed.update(self._drain([session]))
+        for session in retry:
+            heapq.heappush(self.unscheduled, session)
+        return changed
+
+    def _replace(self, session, changed):
+        # A displaced session keeps its later reviews; it only moves to an
+        # earlier free day if there is one.
+        day = self._next_free_day(session.due)
+        if day is None:
+            heapq.heappush(self.unscheduled, session)
+        else:
+            self._place(day, session)
+            changed.add(day)
+
+    def _next_free_day(self, due):
+        index = bisect.bisect_left(self.free_days, due)
+        return self.free_days[index] if index < len(self.free_days) else None
+
+    def _place(self, day, session):
+        self.days[day].append(session)
+        self.placed.setdefault(session.topic_id, []).append((day, session))
+        if len(self.days[day]) >= self.capacity:
+            self.free_days.pop(bisect.bisect_left(self.free_days, day))
+
+    def _mark_free(self, day):
+        index = bisect.bisect_left(self.free_days, day)
+        if index == len(self.free_days) or self.free_days[index] != day:
+            self.free_days.insert(index, day)
+
+    def _evict(self, session):
+        # Frees the slot of the least urgent session on or after the due
+        # day, if it is less urgent than the one being placed.
+        weakest = None
+        for day in range(session.due, len(self.days)):
+            for other in self.days[day]:
+                if weakest is None or other.priority < weakest[1].priority:
+                    weakest = (day, other)
+        if weakest is None or weakest[1].priority >= session.priority:
+            return None, None
+        day, displaced = weakest
+        self.days[day].remove(displaced)
+        self.placed[displaced.topic_id].remove((day, displaced))
+        self._mark_free(day)
+        return day, displaced
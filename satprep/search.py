@@ -0,0 +1,109 @@
+import heapq
+import json
+import os
+import re
+from collections import Counter
+
+from .storage import write_json_atomic
+
+
+INDEX_FORMAT = 1
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    # Inverted index from term to {doc number: term frequency}. Documents are
+    # identified by string keys such as "note:<path key>"; every update
+    # replaces a single document's postings, so edits never trigger a rebuild.
+    def __init__(self):
+        self.postings = {}
+        self.doc_terms = {}
+        self.docs = []
+        self.doc_numbers = {}
+
+    def update(self, doc, text):
+        number = self.doc_numbers.get(doc)
+        if number is None:
+            number = len(self.docs)
+            self.docs.append(doc)
+            self.doc_numbers[doc] = number
+        else:
+            self._remove_postings(number)
+        counts = Counter(tokenize(text))
+        if counts:
+            self.doc_terms[number] = counts
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[number] = count
+
+    def remove(self, doc):
+        number = self.doc_numbers.get(doc)
+        if number is not None:
+            self._remove_postings(number)
+
+    def search(self, query, limit=50):
+        # Every query term must match; results are ranked by the summed term
+        # frequency of the query terms in each document.
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        lists = []
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                return []
+            lists.append(postings)
+        lists.sort(key=len)
+        scores = dict(lists[0])
+        for postings in lists[1:]:
+            scores = {number: score + postings[number]
+                      for number, score in scores.items() if number in postings}
+            if not scores:
+                return []
+        best = heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+        return [(self.docs[number], score) for number, score in best]
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def save(self, path, signature):
+        # Stale document slots are dropped so the saved index stays compact.
+        live = sorted(self.doc_terms)
+        write_json_atomic(path, {
+            "format": INDEX_FORMAT,
+            "signature": signature,
+            "docs": [self.docs[number] for number in live],
+            "terms": [self.doc_terms[number] for number in live]
+        }, indent=None)
+
+    @classmethod
+    def load(cls, path, signature):
+        # Returns None when the index is missing or was written against data
+        # that has changed since, in which case the caller rebuilds it.
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            return None
+        if data.get("format") != INDEX_FORMAT or data.get("signature") != signature:
+            return None
+        index = cls()
+        for number, (doc, counts) in enumerate(zip(data["docs"], data["terms"])):
+            index.docs.append(doc)
+            index.doc_numbers[doc] = number
+            index.doc_terms[number] = counts
+            for term, count in counts.items():
+                index.postings.setdefault(term, {})[number] = count
+        return index
+
+    def _remove_postings(self, number):
+        for term in self.doc_terms.pop(number, ()):
+            postings = self.postings[term]
+            del postings[number]
+            if not postings:
+                del self.postings[term]
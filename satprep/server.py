@@ -0,0 +1,468 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import parse_qs, urlsplit
+
+from .bulk import split_list
+from .catalog import TopicCatalog, copy_topics
+from .registry import path_key
+from .sharing import SHARE_POLL_INTERVAL
+
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+MAX_HEADERS = 100
+IDLE_TIMEOUT = 30.0  # seconds a keep-alive connection may sit unused
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+    422: "Unprocessable Entity", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.close = close
+
+
+class StoreExecutor:
+    # Runs jobs on the thread that owns the store. Other threads submit()
+    # and get a Future; the owner calls poll() regularly, e.g. from Tk's
+    # after(), and runs whatever is queued within a time budget.
+    def __init__(self):
+        self._jobs = queue.Queue()
+
+    def submit(self, fn):
+        future = Future()
+        self._jobs.put((future, fn))
+        return future
+
+    def poll(self, budget=0.01):
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            try:
+                future, fn = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip("/") or "/"
+        self.query = parse_qs(url.query)
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise HttpError(400, f"invalid JSON: {e}")
+
+    def not_modified(self, etag):
+        tags = self.headers.get("if-none-match", "")
+        return tags.strip() == "*" or etag in (tag.strip() for tag in tags.split(","))
+
+
+def encode(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_path(value):
+    # Topic paths are accepted as path keys or as lists of names.
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise HttpError(400, f"invalid topic path {value!r}")
+    if not isinstance(value, list) or not value or not all(isinstance(part, str) for part in value):
+        raise HttpError(400, f"invalid topic path {value!r}")
+    return tuple(value)
+
+
+def parse_paths(payload):
+    paths = payload.get("paths") if isinstance(payload, dict) else None
+    if not isinstance(paths, list):
+        raise HttpError(400, 'expected {"paths": [...]}')
+    return [parse_path(path) for path in paths]
+
+
+def validate_change(change):
+    # Returns the change in storage-record form; raises ValueError.
+    if not isinstance(change, dict):
+        raise ValueError("not an object")
+    op = change.get("op")
+    if op == "rating":
+        value = change.get("value")
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or not 1 <= value <= 10):
+            raise ValueError("value must be a number from 1 to 10, or null")
+        return {"op": op, "path": parse_path(change.get("path")), "value": value}
+    if op == "note":
+        text = change.get("text")
+        if text is not None and not isinstance(text, str):
+            raise ValueError("text must be a string or null")
+        return {"op": op, "path": parse_path(change.get("path")), "text": text}
+    if op not in ("topic", "subtopic", "remove_topic", "remove_subtopic"):
+        raise ValueError(f"unknown op {op!r}")
+    if change.get("subject") not in TopicCatalog.SUBJECTS:
+        raise ValueError(f"unknown subject {change.get('subject')!r}")
+    names = ("topic",) if op in ("topic", "remove_topic") else ("topic", "subtopic")
+    for name in names:
+        if not isinstance(change.get(name), str) or not change[name].strip():
+            raise ValueError(f"missing {name}")
+    result = {"op": op, "subject": change["subject"]}
+    result.update((name, change[name].strip()) for name in names)
+    if op == "subtopic":
+        details = change.get("details") or {}
+        if not isinstance(details, dict):
+            raise ValueError("details must be an object")
+        result["details"] = {
+            "subtopics": split_list(details.get("subtopics")),
+            "key_concepts": split_list(details.get("key_concepts")),
+            "importance": str(details.get("importance") or "Not specified")
+        }
+    return result
+
+
+class StudyServer:
+    # A small HTTP/1.1 JSON API over one StudyStore, served by asyncio on a
+    # background thread. `store` may be a callable returning the current
+    # store, so a GUI that switches students keeps serving the one shown.
+    # With an executor, store access is handed to the thread that owns the
+    # store; without one, the server's own thread is taken to own it.
+    # Full reads are cached per store revision, so repeated and conditional
+    # reads of unchanged data never wait for the store thread.
+    def __init__(self, store, host=SERVER_HOST, port=SERVER_PORT, executor=None, on_change=None):
+        self._store = store if callable(store) else (lambda: store)
+        self.host = host
+        self.port = port
+        self.executor = executor
+        self.on_change = on_change
+        self.requests = 0
+        self.connections = 0
+        self.token = os.urandom(4).hex()  # keeps ETags from matching across runs
+        self.routes = {
+            "/catalog": {"GET": self.get_catalog},
+            "/ratings": {"GET": self.get_ratings},
+            "/ratings/query": {"POST": self.query_ratings},
+            "/notes": {"GET": self.get_note},
+            "/notes/query": {"POST": self.query_notes},
+            "/changes": {"POST": self.post_changes},
+            "/status": {"GET": self.get_status},
+        }
+        self._cache = {}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        # Returns once the socket is listening; port=0 picks a free port.
+        self._thread = threading.Thread(target=self._run, name="sat-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._serve_client, self.host, self.port))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            # Connections idling in keep-alive end with the server.
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(self._server.wait_closed())
+            loop.close()
+
+    async def _serve_client(self, reader, writer):
+        # One connection, any number of requests while it is kept alive.
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                keep_alive = False
+                try:
+                    request = await self._read_request(line, reader)
+                    keep_alive = request.keep_alive
+                    status, headers, body = await self._dispatch(request)
+                except HttpError as e:
+                    keep_alive = keep_alive and not e.close
+                    status, headers, body = e.status, {}, encode({"error": str(e)})
+                except Exception as e:
+                    status, headers, body = 500, {}, encode({"error": str(e)})
+                self.requests += 1
+                writer.write(self._response(status, headers, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass  # the server is stopping
+        finally:
+            writer.close()
+
+    async def _read_request(self, line, reader):
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "malformed request line", close=True)
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HttpError(431, "header line too long", close=True)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(431, "too many headers", close=True)
+        if "transfer-encoding" in headers:
+            raise HttpError(411, "chunked bodies are not supported; send Content-Length", close=True)
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "invalid Content-Length", close=True)
+        if length > MAX_BODY:
+            raise HttpError(413, "request body too large", close=True)
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, version, headers, body)
+
+    async def _dispatch(self, request):
+        methods = self.routes.get(request.path)
+        if methods is None:
+            raise HttpError(404, f"no such resource {request.path}")
+        handler = methods.get(request.method)
+        if handler is None:
+            raise HttpError(405, f"use {', '.join(methods)} for {request.path}")
+        return await handler(request)
+
+    def _response(self, status, headers, body, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 "Content-Type: application/json; charset=utf-8",
+                 f"Content-Length: {len(body) if status != 304 else 0}",
+                 "Cache-Control: no-cache",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return head if status == 304 else head + body
+
+    async def run(self, fn):
+        # Calls fn(store) on the thread that owns the store.
+        if self.executor is None:
+            return fn(self._store())
+        return await asyncio.wrap_future(self.executor.submit(lambda: fn(self._store())))
+
+    async def cached(self, request, kind, build):
+        # Revisions are plain ints replaced on every change, so reading one
+        # from this thread is safe; it only decides whether a copy is current.
+        revision = self._store().revisions[kind]
+        etag = f'"{kind}-{self.token}-{revision}"'
+        if request.not_modified(etag):
+            return 304, {"ETag": etag}, b""
+        entry = self._cache.get(kind)
+        if entry is None or entry[0] != revision:
+            revision, data = await self.run(lambda store: (store.revisions[kind], build(store)))
+            entry = self._cache[kind] = (revision, encode(data))
+            etag = f'"{kind}-{self.token}-{revision}"'
+        return 200, {"ETag": etag}, entry[1]
+
+    async def get_catalog(self, request):
+        return await self.cached(request, "catalog", lambda store: {
+            subject: copy_topics(store.subject_topics(subject)) for subject in TopicCatalog.SUBJECTS})
+
+    async def get_ratings(self, request):
+        return await self.cached(request, "ratings", lambda store: {
+            store.key(topic_id): rating for topic_id, rating in store.current_ratings.items()})
+
+    async def query_ratings(self, request):
+        paths = parse_paths(request.json())
+
+        def query(store):
+            ids = store.registry.ids
+            return {path_key(path): store.get_rating(ids[path]) if path in ids else None for path in paths}
+        return 200, {}, encode({"ratings": await self.run(query)})
+
+    async def get_note(self, request):
+        if "path" not in request.query:
+            raise HttpError(400, "missing ?path=")
+        path = parse_path(request.query["path"][0])
+
+        def read(store):
+            node_id = store.registry.ids.get(path)
+            return None if node_id is None else store.get_note(node_id)
+        text = await self.run(read)
+        etag = '"note-%s"' % hashlib.sha1(encode(text)).hexdigest()[:16]
+        if request.not_modified(etag):
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, encode({"path": path_key(path), "text": text})
+
+    async def query_notes(self, request):
+        paths = parse_paths(request.json())
+
+        def query(store):
+            ids = store.registry.ids
+            return {path_key(path): store.get_note(ids[path]) if path in ids else None for path in paths}
+        return 200, {}, encode({"notes": await self.run(query)})
+
+    async def post_changes(self, request):
+        # Applies a batch of changes in one step on the store thread. Invalid
+        # changes, and ratings or notes for topics not in the catalog, are
+        # returned as rejected; the rest are applied. When every change is
+        # rejected, the status is 422.
+        payload = request.json()
+        changes = payload.get("changes") if isinstance(payload, dict) else None
+        if not isinstance(changes, list):
+            raise HttpError(400, 'expected {"changes": [...]}')
+        valid = []
+        rejected = []
+        for index, change in enumerate(changes):
+            try:
+                valid.append((index, validate_change(change)))
+            except (ValueError, HttpError) as e:
+                rejected.append({"index": index, "error": str(e)})
+        if not valid:
+            return 422 if rejected else 200, {}, encode({"applied": 0, "rejected": rejected})
+
+        def apply(store):
+            accepted = []
+            for index, change in valid:
+                if change["op"] in ("rating", "note"):
+                    node_id = store.registry.ids.get(change["path"])
+                    if node_id is None or not store.registry.is_linked(node_id):
+                        rejected.append({"index": index, "error": "unknown topic"})
+                        continue
+                    change["path"] = path_key(change["path"])
+                accepted.append(change)
+            if not accepted:
+                return None
+            update = store.apply_changes(accepted, undoable=False)
+            if self.on_change is not None:
+                self.on_change(update)
+            applied = len(update["ratings"]) + len(update["notes"]) + len(update["applied"])
+            return {"applied": applied, "rejected": sorted(rejected, key=lambda entry: entry["index"]),
+                    "revisions": dict(store.revisions)}
+        result = await self.run(apply)
+        if result is None:
+            return 422, {}, encode({"applied": 0, "rejected": sorted(rejected, key=lambda entry: entry["index"])})
+        return 200, {}, encode(result)
+
+    async def get_status(self, request):
+        def status(store):
+            return {"revisions": dict(store.revisions), "ratings": len(store.current_ratings),
+                    "topics": len(store.registry.paths), "requests": self.requests,
+                    "connections": self.connections}
+        return 200, {}, encode(await self.run(status))
+
+
+def main():
+    import argparse
+
+    from .history import HISTORY_DIR
+    from .storage import SEARCH_INDEX_FILE, create_storage
+    from .store import StudyStore
+    from .sync import SYNC_FILE
+
+    parser = argparse.ArgumentParser(description="Serve SAT study data as JSON over HTTP")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"], default="json")
+    parser.add_argument("--directory", default="", help="directory holding the study data")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    directory = args.directory
+    store = StudyStore(create_storage(args.storage, directory),
+                       index_path=os.path.join(directory, SEARCH_INDEX_FILE),
+                       history_path=os.path.join(directory, HISTORY_DIR),
+                       sync_path=os.path.join(directory, SYNC_FILE))
+    for e in store.load():
+        print(f"Error loading data: {e}")
+    # The main thread owns the store, as the GUI's does, so it can also pick
+    # up changes other processes save to the same files.
+    executor = StoreExecutor()
+    server = StudyServer(store, args.host, args.port, executor=executor).start()
+    print(f"Serving study data on {server.url}")
+    try:
+        next_poll = 0.0
+        while True:
+            executor.poll()
+            if time.monotonic() >= next_poll:
+                store.poll_changes()
+                for e in store.pop_errors():
+                    print(f"Error: {e}")
+                next_poll = time.monotonic() + SHARE_POLL_INTERVAL / 1000
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        store.close()
+        for e in store.pop_errors():
+            print(f"Error saving data: {e}")
+
+
+if __name__ == "__main__":
+    main()
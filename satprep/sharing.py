@@ -0,0 +1,114 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+SHARE_POLL_INTERVAL = 1000  # ms between checks for changes saved by other processes
+
+
+def lock_path_for(data_path):
+    return os.path.splitext(data_path)[0] + ".lock"
+
+
+def change_field(change):
+    # What a change modifies, keyed the same way as undo steps.
+    op = change["op"]
+    if op in ("rating", "note"):
+        return op, change["path"]
+    if op in ("topic", "remove_topic"):
+        return "topic", change["subject"], change["topic"]
+    return "subtopic", change["subject"], change["topic"], change["subtopic"]
+
+
+class FileLock:
+    # Advisory lock on a file next to the study data, taken around every
+    # write so processes sharing the data take turns. It is re-entrant, and
+    # threads of one process queue on an RLock because the OS lock is held
+    # per process.
+    def __init__(self, path):
+        self.path = path
+        self.acquisitions = 0
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._lock_file()
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._depth == 0:
+                self._file.close()
+                self._file = None
+
+    def _lock_file(self):
+        if self._file is None:
+            self._file = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds; keep waiting
+        self.acquisitions += 1
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChangeInbox:
+    # Changes other processes saved, held until the store applies them. A
+    # newer change to a field replaces the older one, and a local change
+    # to the field drops it, so for each field the last save wins.
+    def __init__(self):
+        self.changes = {}  # field -> change, oldest first
+        self.received = 0
+
+    def __len__(self):
+        return len(self.changes)
+
+    def add(self, changes):
+        for change in changes:
+            field = change_field(change)
+            self.changes.pop(field, None)
+            self.changes[field] = change
+            self.received += 1
+
+    def discard(self, changes):
+        for change in changes:
+            self.changes.pop(change_field(change), None)
+
+    def pop(self):
+        changes = list(self.changes.values())
+        self.changes = {}
+        return changes
+
+    def clear(self):
+        self.changes = {}
@@ -0,0 +1,313 @@
+import json
+import os
+
+from .catalog import new_subtopic
+from .notes import NoteSegment, notes_path_for
+from .registry import path_key, subject_of
+from .sharing import ChangeInbox
+from .storage import DATA_FILE, SQLITE_FILE, empty_data, file_signature, read_json
+
+
+def change_triggers():
+    # Every write to ratings, notes or topics stamps the row's path in
+    # `changes` with the next sequence number, so other connections can
+    # find what changed since the last number they saw.
+    triggers = []
+    for table, kind in (("ratings", "rating"), ("notes", "note"), ("topics", "topic")):
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            triggers.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_changes AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO changes (kind, path, seq) VALUES "
+                f"('{kind}', {row}.path, (SELECT IFNULL(MAX(seq), 0) + 1 FROM changes)) "
+                f"ON CONFLICT (kind, path) DO UPDATE SET seq = excluded.seq; END;")
+    return "\n".join(triggers)
+
+
+class SqliteStorage:
+    # Notes are read one at a time through load_note instead of being
+    # returned by load(), so startup cost does not grow with note volume.
+    # SQLite does the locking between processes sharing the database; the
+    # changes table tells each of them what the others wrote.
+    journaled = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ratings (
+            path TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            rating REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ratings_subject ON ratings (subject);
+        CREATE INDEX IF NOT EXISTS ratings_rating ON ratings (rating);
+        CREATE TABLE IF NOT EXISTS notes (
+            path TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS notes_subject ON notes (subject);
+        CREATE TABLE IF NOT EXISTS topics (
+            path TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            subtopic TEXT,
+            details TEXT
+        );
+        CREATE INDEX IF NOT EXISTS topics_subject ON topics (subject, topic);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (kind, path)
+        );
+        CREATE INDEX IF NOT EXISTS changes_seq ON changes (seq);
+    """ + change_triggers()
+
+    def __init__(self, path=SQLITE_FILE, legacy_path=DATA_FILE):
+        import sqlite3
+
+        self.path = path
+        self.legacy_path = legacy_path
+        self.statements = 0
+        self.inbox = ChangeInbox()
+        self._seen_seq = 0
+        self._data_version = None
+        self._errors = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def load(self):
+        self._migrate_legacy()
+        self._seen_seq = self._last_seq()
+        self._data_version = self._version()
+        data = empty_data()
+        data["ratings"] = dict(self.conn.execute("SELECT path, rating FROM ratings"))
+        rows = self.conn.execute(
+            "SELECT subject, topic, subtopic, details FROM topics ORDER BY rowid")
+        for subject, topic, subtopic, details in rows:
+            topics = data["custom_topics"].setdefault(subject.lower(), {})
+            entry = topics.setdefault(topic, {})
+            if subtopic is not None:
+                entry[subtopic] = json.loads(details)
+        return data
+
+    def load_note(self, topic_path):
+        row = self.conn.execute(
+            "SELECT body FROM notes WHERE path = ?", (topic_path,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_keys(self, resolve):
+        # Rewrites "A - B - C" keys written by older versions. This has to
+        # happen here because notes are never loaded in bulk.
+        done = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'key_format'").fetchone()
+        if done:
+            return
+        with self.conn:
+            for table in ("ratings", "notes"):
+                rows = self.conn.execute(
+                    f"SELECT path FROM {table} WHERE path NOT LIKE '[%'").fetchall()
+                for (old_key,) in rows:
+                    self.conn.execute(
+                        f"UPDATE OR REPLACE {table} SET path = ? WHERE path = ?",
+                        (resolve(old_key), old_key))
+            rows = self.conn.execute(
+                "SELECT path, subject, topic, subtopic FROM topics WHERE path NOT LIKE '[%'").fetchall()
+            for old_key, subject, topic, subtopic in rows:
+                parts = [subject, topic] if subtopic is None else [subject, topic, subtopic]
+                self.conn.execute("UPDATE OR REPLACE topics SET path = ? WHERE path = ?",
+                                  (path_key(parts), old_key))
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('key_format', '2')")
+
+    def iter_notes(self):
+        return self.conn.execute("SELECT path, body FROM notes")
+
+    def signature(self):
+        # The WAL is empty after a clean close; a non-empty one means the
+        # main file alone does not describe the data.
+        main, wal = file_signature(self.path, f"{self.path}-wal")
+        return [main, wal[2] or 0]
+
+    def ratings_for_subject(self, subject):
+        return dict(self.conn.execute(
+            "SELECT path, rating FROM ratings WHERE subject = ?", (subject,)))
+
+    def weakest_topics(self, limit=10, subject=None):
+        if subject is None:
+            return self.conn.execute(
+                "SELECT path, rating FROM ratings ORDER BY rating LIMIT ?",
+                (limit,)).fetchall()
+        return self.conn.execute(
+            "SELECT path, rating FROM ratings WHERE subject = ? ORDER BY rating LIMIT ?",
+            (subject, limit)).fetchall()
+
+    def record(self, change, snapshot):
+        self.record_many([change], snapshot)
+
+    def record_many(self, changes, snapshot):
+        try:
+            with self.conn:
+                self._begin()
+                for change in changes:
+                    self._apply(change)
+                self._seen_seq = self._last_seq()
+            self.inbox.discard(changes)
+        except Exception as e:
+            self._errors.append(e)
+
+    def save(self, data):
+        try:
+            with self.conn:
+                self._begin()
+                self._save_all(data)
+                self._seen_seq = self._last_seq()
+        except Exception as e:
+            self._errors.append(e)
+
+    def poll_changes(self, snapshot):
+        # Returns the changes other connections committed since the last
+        # call; data_version only moves when one of them commits.
+        version = self._version()
+        if version != self._data_version:
+            self._data_version = version
+            self._absorb()
+        return self.inbox.pop()
+
+    def flush(self):
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def pop_errors(self):
+        errors, self._errors = self._errors, []
+        return errors
+
+    @property
+    def stats(self):
+        return {"statements": self.statements, "remote_changes": self.inbox.received}
+
+    def _begin(self):
+        # Takes the write lock first, so what others wrote before it is
+        # queued and everything after the last seen number is this write's.
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._absorb()
+
+    def _absorb(self):
+        rows = self.conn.execute(
+            "SELECT kind, path, seq FROM changes WHERE seq > ? ORDER BY seq", (self._seen_seq,)).fetchall()
+        for kind, key, seq in rows:
+            self.inbox.add([self._current(kind, key)])
+            self._seen_seq = seq
+
+    def _current(self, kind, key):
+        # The change that brings another copy of this row up to date.
+        if kind == "rating":
+            row = self.conn.execute("SELECT rating FROM ratings WHERE path = ?", (key,)).fetchone()
+            return {"op": "rating", "path": key, "value": row[0] if row else None}
+        if kind == "note":
+            return {"op": "note", "path": key, "text": self.load_note(key)}
+        parts = json.loads(key)
+        change = {"subject": parts[0], "topic": parts[1]}
+        row = self.conn.execute("SELECT details FROM topics WHERE path = ?", (key,)).fetchone()
+        if len(parts) == 2:
+            return dict(change, op="topic" if row else "remove_topic")
+        if row is None:
+            return dict(change, op="remove_subtopic", subtopic=parts[2])
+        return dict(change, op="subtopic", subtopic=parts[2], details=json.loads(row[0]))
+
+    def _last_seq(self):
+        return self.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _apply(self, change):
+        op = change["op"]
+        if op == "rating" and change["value"] is None:
+            self._execute("DELETE FROM ratings WHERE path = ?", (change["path"],))
+        elif op == "note" and change["text"] is None:
+            self._execute("DELETE FROM notes WHERE path = ?", (change["path"],))
+        elif op == "rating":
+            self._execute(
+                "INSERT INTO ratings (path, subject, rating) VALUES (?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET rating = excluded.rating",
+                (change["path"], subject_of(change["path"]), change["value"]))
+        elif op == "note":
+            self._execute(
+                "INSERT INTO notes (path, subject, body) VALUES (?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET body = excluded.body",
+                (change["path"], subject_of(change["path"]), change["text"]))
+        elif op == "topic":
+            self._put_topic(change["subject"], change["topic"], None, None)
+        elif op == "subtopic":
+            self._put_topic(change["subject"], change["topic"], None, None)
+            self._put_topic(change["subject"], change["topic"], change["subtopic"],
+                            change.get("details") or new_subtopic())
+        elif op == "remove_topic":
+            self._execute("DELETE FROM topics WHERE subject = ? AND topic = ?",
+                          (change["subject"], change["topic"]))
+        elif op == "remove_subtopic":
+            self._execute("DELETE FROM topics WHERE path = ?",
+                          (path_key([change["subject"], change["topic"], change["subtopic"]]),))
+
+    def _save_all(self, data):
+        # Rows missing from the snapshot are deleted. Snapshots leave notes
+        # out unless they carry them, so notes are only replaced then.
+        ratings = data.get("ratings", {})
+        for (topic_path,) in self.conn.execute("SELECT path FROM ratings").fetchall():
+            if topic_path not in ratings:
+                self._apply({"op": "rating", "path": topic_path, "value": None})
+        for topic_path, rating in ratings.items():
+            self._apply({"op": "rating", "path": topic_path, "value": rating})
+        if "notes" in data:
+            for (topic_path,) in self.conn.execute("SELECT path FROM notes").fetchall():
+                if topic_path not in data["notes"]:
+                    self._apply({"op": "note", "path": topic_path, "text": None})
+        for topic_path, text in data.get("notes", {}).items():
+            self._apply({"op": "note", "path": topic_path, "text": text})
+        # custom_topics is the student's whole overlay, which replaces any
+        # full catalog copy an older version stored.
+        self._execute("DELETE FROM topics", ())
+        for key, topics in data.get("custom_topics", {}).items():
+            subject = "Math" if key == "math" else "Reading"
+            for topic, subtopics in topics.items():
+                self._put_topic(subject, topic, None, None)
+                for subtopic, details in subtopics.items():
+                    self._put_topic(subject, topic, subtopic, details)
+
+    def _put_topic(self, subject, topic, subtopic, details):
+        parts = [subject, topic] if subtopic is None else [subject, topic, subtopic]
+        self._execute(
+            "INSERT INTO topics (path, subject, topic, subtopic, details) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET details = excluded.details",
+            (path_key(parts), subject, topic, subtopic,
+             None if details is None else json.dumps(details)))
+
+    def _execute(self, sql, params):
+        self.statements += 1
+        self.conn.execute(sql, params)
+
+    def _migrate_legacy(self):
+        done = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        if done or not os.path.exists(self.legacy_path):
+            return
+        data = read_json(self.legacy_path)
+        notes_path = notes_path_for(self.legacy_path)
+        if os.path.exists(notes_path):
+            # Newer JSON installs keep notes beside the snapshot.
+            notes = NoteSegment(notes_path)
+            notes.open()
+            data.setdefault("notes", {}).update(notes.items())
+            notes.close()
+        with self.conn:
+            self._save_all(data)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                              (os.path.abspath(self.legacy_path),))
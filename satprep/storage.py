@@ -0,0 +1,721 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from .catalog import copy_topics, new_subtopic
+from .notes import NOTES_FILE, NoteSegment, notes_path_for
+from .sharing import ChangeInbox, FileLock, change_field, lock_path_for
+
+
+DATA_FILE = "sat_study_data.json"
+JOURNAL_FILE = "sat_study_data.journal"
+SQLITE_FILE = "sat_study_data.db"
+SEARCH_INDEX_FILE = "sat_study_data.index.json"
+SAVE_INTERVAL = 0.5  # seconds between background writes
+COMPACT_THRESHOLD = 1024 * 1024  # journal bytes before compaction
+
+
+def empty_data():
+    return {"ratings": {}, "custom_topics": {"math": {}, "reading": {}}}
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return empty_data()
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_json_atomic(path, data, indent=4):
+    # Returns a digest of what was written, to tell it apart from later
+    # writes by other processes.
+    body = json.dumps(data, indent=indent).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return hashlib.sha1(body).hexdigest()
+
+
+def copy_data(data):
+    return {"ratings": dict(data.get("ratings", {})),
+            "custom_topics": {key: copy_topics(topics)
+                              for key, topics in data.get("custom_topics", {}).items()}}
+
+
+def file_signature(*paths):
+    # Cheap fingerprint used to tell whether derived files are still current.
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            signature.append([path, None, 0])
+    return signature
+
+
+def move_notes(data, notes):
+    # Moves notes kept in the snapshot by older versions into the note
+    # segment. Anything already in the segment was saved later, so it wins.
+    # Returns whether the snapshot changed and should be rewritten.
+    moved = data.pop("notes", None)
+    if not moved:
+        return moved is not None
+    for key, text in moved.items():
+        if key not in notes:
+            notes.put(key, text)
+    notes.flush()
+    return True
+
+
+def store_notes(changes, notes):
+    # Notes go straight to the segment; returns the remaining changes.
+    rest = []
+    for change in changes:
+        if change["op"] != "note":
+            rest.append(change)
+        elif change["text"] is None:
+            notes.delete(change["path"])
+        else:
+            notes.put(change["path"], change["text"])
+    return rest
+
+
+def apply_change(data, change):
+    # A rating or note of None, and the remove_* ops, come from undo.
+    op = change["op"]
+    if op == "rating":
+        ratings = data.setdefault("ratings", {})
+        if change["value"] is None:
+            ratings.pop(change["path"], None)
+        else:
+            ratings[change["path"]] = change["value"]
+    elif op == "note":
+        notes = data.setdefault("notes", {})
+        if change["text"] is None:
+            notes.pop(change["path"], None)
+        else:
+            notes[change["path"]] = change["text"]
+    else:
+        catalogs = data.setdefault("custom_topics", {})
+        topics = catalogs.setdefault(change["subject"].lower(), {})
+        if op == "remove_topic":
+            topics.pop(change["topic"], None)
+            return
+        if op == "remove_subtopic":
+            topics.get(change["topic"], {}).pop(change["subtopic"], None)
+            return
+        # custom_topics only holds additions; a subtopic may extend a topic
+        # that exists only in the base catalog.
+        entry = topics.setdefault(change["topic"], {})
+        if op == "subtopic":
+            entry[change["subtopic"]] = change.get("details") or new_subtopic()
+
+
+def diff_data(old, new):
+    # The changes that turn snapshot `old` into `new`, one per rating or
+    # catalog entry, topics before their subtopics and catalog before
+    # ratings. Notes are not part of snapshots.
+    changes = []
+    for key, subject in (("math", "Math"), ("reading", "Reading")):
+        before = old.get("custom_topics", {}).get(key, {})
+        after = new.get("custom_topics", {}).get(key, {})
+        for topic, subtopics in after.items():
+            previous = before.get(topic)
+            if previous is None:
+                changes.append({"op": "topic", "subject": subject, "topic": topic})
+                previous = {}
+            for name, details in subtopics.items():
+                if previous.get(name) != details:
+                    changes.append({"op": "subtopic", "subject": subject, "topic": topic,
+                                    "subtopic": name, "details": details})
+            changes.extend({"op": "remove_subtopic", "subject": subject, "topic": topic, "subtopic": name}
+                           for name in previous if name not in subtopics)
+        for topic, subtopics in before.items():
+            if topic not in after:
+                changes.extend({"op": "remove_subtopic", "subject": subject, "topic": topic, "subtopic": name}
+                               for name in subtopics)
+                changes.append({"op": "remove_topic", "subject": subject, "topic": topic})
+    before = old.get("ratings", {})
+    after = new.get("ratings", {})
+    changes.extend({"op": "rating", "path": key, "value": value}
+                   for key, value in after.items() if before.get(key) != value)
+    changes.extend({"op": "rating", "path": key, "value": None}
+                   for key in before if key not in after)
+    return changes
+
+
+def note_changes(notes, keys):
+    return [{"op": "note", "path": key, "text": notes.get(key)} for key in keys]
+
+
+class PersistenceEngine:
+    # `write(path, data)` does the writing and returns something false when
+    # there turned out to be nothing to write; the default writes `data` as
+    # JSON.
+    def __init__(self, path=DATA_FILE, interval=SAVE_INTERVAL, write=None):
+        self.path = path
+        self.interval = interval
+        self.write = write or write_json_atomic
+        self.writes_requested = 0
+        self.writes_performed = 0
+        self._pending = None
+        self._errors = []
+        self._last_write = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sat-writer", daemon=True)
+        self._thread.start()
+
+    def request_write(self, data):
+        # Newer snapshots replace older pending ones, so a burst of requests
+        # collapses into a single write per interval.
+        with self._cond:
+            self._pending = data
+            self.writes_requested += 1
+            self._cond.notify()
+
+    def flush(self):
+        self._write_pending()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def pop_errors(self):
+        with self._cond:
+            errors, self._errors = self._errors, []
+        return errors
+
+    @property
+    def stats(self):
+        return {
+            "writes_requested": self.writes_requested,
+            "writes_performed": self.writes_performed,
+            "pending": self._pending is not None,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                delay = self._last_write + self.interval - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            self._write_pending()
+
+    def _write_pending(self):
+        # Taking the snapshot under the write lock keeps an older snapshot
+        # from landing on disk after a newer one.
+        with self._write_lock:
+            with self._cond:
+                data, self._pending = self._pending, None
+            if data is None:
+                return
+            try:
+                wrote = self.write(self.path, data)
+            except Exception as e:
+                with self._cond:
+                    self._errors.append(e)
+                return
+            finally:
+                self._last_write = time.monotonic()
+            if wrote:
+                self.writes_performed += 1
+
+
+class JsonStorage:
+    # Every recorded change other than a note rewrites a full snapshot;
+    # notes live in a NoteSegment and are read one at a time. Changes are
+    # queued and applied to a copy of the data on the writer thread, so
+    # recording one costs the caller O(1) however large the data. Other
+    # processes may share the files: each write merges this process's
+    # edits into what is on disk instead of replacing it, and
+    # poll_changes() hands over what the others saved.
+    journaled = False
+
+    def __init__(self, path=DATA_FILE, interval=SAVE_INTERVAL, notes_path=None):
+        self.path = path
+        self.lock = FileLock(lock_path_for(path))
+        self.engine = PersistenceEngine(path, interval, write=self._write_snapshot)
+        self.notes = NoteSegment(notes_path or notes_path_for(path))
+        self.inbox = ChangeInbox()
+        self.merges = 0
+        self._queue = deque()        # changes and full snapshots not yet in _state
+        self._state = empty_data()   # the store's data as of the changes taken off _queue
+        self._disk = empty_data()    # the file as last read or written
+        self._written = self._disk   # the store's state as of _disk, minus unsaved edits
+        self._seen = (None, None)    # signature and digest of _disk
+        self._unsynced = False       # whether _disk has changes the store has not seen
+        self._writing = False        # whether the writer thread holds the lock
+
+    def load(self):
+        with self.lock:
+            data = read_json(self.path)
+            self.notes.open()
+            if move_notes(data, self.notes):
+                digest = write_json_atomic(self.path, data)
+            else:
+                digest = None
+            self._disk = self._written = data
+            self._state = copy_data(data)
+            self._queue.clear()
+            self._seen = (file_signature(self.path), digest)
+            self._unsynced = False
+        return data
+
+    def load_note(self, topic_path):
+        return self.notes.get(topic_path)
+
+    def iter_notes(self):
+        return self.notes.items()
+
+    def record(self, change, snapshot):
+        self.record_many([change], snapshot)
+
+    def record_many(self, changes, snapshot):
+        # Runs on the Tk thread. Only notes are written here, under the
+        # lock; anything else is queued, so it never waits for a write.
+        self.inbox.discard(changes)
+        if any(change["op"] == "note" for change in changes):
+            with self.lock:
+                self.inbox.add(note_changes(self.notes, self.notes.refresh()))
+                self.inbox.discard(changes)
+                changes = store_notes(changes, self.notes)
+        if changes:
+            self._queue.extend(changes)
+            self.engine.request_write(self._queue)
+
+    def save(self, data):
+        self._queue.append({"op": "snapshot", "data": data})
+        self.engine.request_write(self._queue)
+
+    def poll_changes(self, snapshot):
+        # Returns the changes other processes saved since the last call.
+        # Where this process has an unsaved edit to the same field, the edit
+        # wins: it is written over theirs. Skipped while this process is
+        # writing, rather than waiting for the lock.
+        if self._writing:
+            return self.inbox.pop()
+        with self.lock:
+            self.inbox.add(note_changes(self.notes, self.notes.refresh()))
+            if self._read_disk() or self._unsynced:
+                self._drain()
+                edited = set(map(change_field, diff_data(self._written, self._state)))
+                remote = [change for change in diff_data(self._written, self._disk)
+                          if change_field(change) not in edited]
+                self._unsynced = False
+                if remote:
+                    self._written = copy_data(self._written)
+                    for change in remote:
+                        apply_change(self._written, change)
+                        apply_change(self._state, change)
+                    self.inbox.add(remote)
+                    # Writes what is left: the unsaved edits.
+                    self.engine.request_write(self._queue)
+            return self.inbox.pop()
+
+    def migrate_keys(self, resolve):
+        # Old rating keys are rewritten by the next write.
+        with self.lock:
+            self.notes.migrate_keys(resolve)
+            self._drain()
+            self._state["ratings"] = {resolve(key): value for key, value in self._state.get("ratings", {}).items()}
+
+    def signature(self):
+        return file_signature(self.path, self.notes.path)
+
+    def flush(self):
+        self.engine.flush()
+        self.notes.flush()
+
+    def close(self):
+        self.engine.close()
+        with self.lock:
+            self.notes.close()
+        self.lock.close()
+
+    def pop_errors(self):
+        return self.engine.pop_errors()
+
+    @property
+    def stats(self):
+        return dict(self.engine.stats, merges=self.merges, remote_changes=self.inbox.received,
+                    **self.notes.stats)
+
+    def _drain(self):
+        # Callers hold the lock; the Tk thread may still be appending.
+        while self._queue:
+            change = self._queue.popleft()
+            if change["op"] == "snapshot":
+                self._state = change["data"]
+            else:
+                apply_change(self._state, change)
+
+    def _write_snapshot(self, path, queue):
+        # Runs on the writer thread. Only what the store changed since the
+        # last write is applied to the file, so fields other processes
+        # changed meanwhile are kept.
+        with self.lock:
+            self._writing = True
+            try:
+                return self._merge_snapshot(path)
+            finally:
+                self._writing = False
+
+    def _merge_snapshot(self, path):
+        self._drain()
+        if self._read_disk():
+            self._unsynced = True
+            self.merges += 1
+        changes = diff_data(self._written, self._state)
+        if not changes:
+            return False
+        merged = copy_data(self._disk)
+        for change in changes:
+            apply_change(merged, change)
+        digest = write_json_atomic(path, merged)
+        self._disk = merged
+        self._written = copy_data(self._state)
+        self._seen = (file_signature(path), digest)
+        return True
+
+    def _read_disk(self):
+        # Re-reads the file if its size or mtime changed and its contents
+        # differ from the last read or write; returns whether they did.
+        signature = file_signature(self.path)
+        if signature == self._seen[0]:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return False
+        digest = hashlib.sha1(body).hexdigest()
+        if digest == self._seen[1]:
+            self._seen = (signature, digest)
+            return False
+        data = json.loads(body)
+        data.pop("notes", None)
+        self._disk = data
+        self._seen = (signature, digest)
+        return True
+
+
+class JournalStorage:
+    journaled = True
+
+    # Changes are appended to the journal as one JSON record per line and
+    # replayed over the last snapshot on load. Every record is an idempotent
+    # "set", so replaying a record the snapshot already contains is harmless.
+    # Notes bypass the journal and are appended to a NoteSegment instead.
+    # Processes sharing the files append under a FileLock, and each reads
+    # the records the others appended from where it last stopped.
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE,
+                 threshold=COMPACT_THRESHOLD, fsync=False, notes_path=None):
+        self.path = path
+        self.lock = FileLock(lock_path_for(path))
+        self.notes = NoteSegment(notes_path or notes_path_for(path))
+        self.journal_path = journal_path
+        self.rotated_path = f"{journal_path}.old"
+        self.threshold = threshold
+        self.fsync = fsync
+        self.inbox = ChangeInbox()
+        self.records_appended = 0
+        self.compactions = 0
+        self._journal = None
+        self._journal_ino = None     # inode of the file self._journal appends to
+        self._journal_id = None      # inode of the journal read up to _offset
+        self._offset = 0
+        self._snapshot_seen = None   # signature of the snapshot and rotated journal
+        self._compactor = None
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        self._wait_for_compaction()
+        with self.lock:
+            recovered = os.path.exists(self.rotated_path)
+            data = self._read_state()
+            if recovered:
+                # A compaction was interrupted; finish it before appending again.
+                write_json_atomic(self.path, data)
+                os.remove(self.rotated_path)
+            self.notes.open()
+            if move_notes(data, self.notes):
+                self._rotate()
+                self._write_snapshot(data)
+            self._mark_synced()
+        return data
+
+    def load_note(self, topic_path):
+        return self.notes.get(topic_path)
+
+    def iter_notes(self):
+        return self.notes.items()
+
+    def record(self, change, snapshot):
+        self.record_many([change], snapshot)
+
+    def record_many(self, changes, snapshot):
+        with self.lock:
+            self._absorb(snapshot)
+            self.inbox.add(note_changes(self.notes, self.notes.refresh()))
+            self.inbox.discard(changes)
+            changes = store_notes(changes, self.notes)
+            if not changes:
+                return
+            if self._journal is not None and self._journal_ino != self._journal_id:
+                # Another process rotated the journal this one appended to.
+                self._journal.close()
+                self._journal = None
+            if self._journal is None:
+                self._journal = open(self.journal_path, "ab")
+                self._journal_ino = os.fstat(self._journal.fileno()).st_ino
+            lines = "".join(json.dumps(change, separators=(",", ":")) + "\n" for change in changes)
+            self._journal.write(lines.encode("utf-8"))
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self.records_appended += len(changes)
+            self._journal_id = self._journal_ino
+            self._offset = self._journal.tell()
+            if self._offset >= self.threshold and not self._compacting():
+                self.compact(snapshot())
+
+    def poll_changes(self, snapshot):
+        # Returns the changes other processes saved since the last call.
+        with self.lock:
+            self._absorb(snapshot)
+            self.inbox.add(note_changes(self.notes, self.notes.refresh()))
+            return self.inbox.pop()
+
+    def migrate_keys(self, resolve):
+        # Other old keys are rewritten by the next compaction.
+        with self.lock:
+            self.notes.migrate_keys(resolve)
+
+    def signature(self):
+        return file_signature(self.path, self.journal_path, self.rotated_path, self.notes.path)
+
+    def save(self, data):
+        self._wait_for_compaction()
+        with self.lock:
+            self._absorb(lambda: data)
+            self._add_inbox(data)
+            self._rotate()
+            self._write_snapshot(data)
+            self._mark_synced()
+
+    def compact(self, data):
+        with self.lock:
+            self._add_inbox(data)
+            self._rotate()
+            rotated = file_signature(self.rotated_path)
+            self._journal_id, self._offset = None, 0
+        self._compactor = threading.Thread(target=self._compact, args=(data, rotated),
+                                           name="sat-compactor", daemon=True)
+        self._compactor.start()
+
+    def flush(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        self.notes.flush()
+
+    def close(self):
+        self._wait_for_compaction()
+        with self.lock:
+            if self._journal is not None:
+                self.flush()
+                self._journal.close()
+                self._journal = None
+            self.notes.close()
+        self.lock.close()
+
+    def pop_errors(self):
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    @property
+    def stats(self):
+        size = self._journal.tell() if self._journal is not None else 0
+        return dict({
+            "records_appended": self.records_appended,
+            "journal_bytes": size,
+            "compactions": self.compactions,
+            "remote_changes": self.inbox.received,
+        }, **self.notes.stats)
+
+    def _read_state(self):
+        data = read_json(self.path)
+        self._replay(data, self.rotated_path)
+        self._replay(data, self.journal_path)
+        return data
+
+    def _mark_synced(self):
+        self._snapshot_seen = file_signature(self.path, self.rotated_path)
+        try:
+            st = os.stat(self.journal_path)
+            self._journal_id, self._offset = st.st_ino, st.st_size
+        except FileNotFoundError:
+            self._journal_id, self._offset = None, 0
+
+    def _absorb(self, snapshot):
+        # Queues what other processes journaled since this one last read or
+        # wrote the files. Once another process has compacted, the whole
+        # state is compared with the store's instead; every change made here
+        # is journaled as it is made, so any difference came from elsewhere.
+        try:
+            st = os.stat(self.journal_path)
+            journal_id, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            journal_id, size = None, 0
+        if file_signature(self.path, self.rotated_path) != self._snapshot_seen or size < self._offset \
+                or (self._journal_id is not None and journal_id != self._journal_id):
+            self.inbox.clear()
+            self.inbox.add(diff_data(snapshot(), self._read_state()))
+            self._mark_synced()
+            return
+        if size == self._offset:
+            return
+        changes = []
+        good = self._offset
+        with open(self.journal_path, "rb") as f:
+            f.seek(good)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    changes.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+        if good != size:
+            # No one else can be mid-append while the lock is held, so this
+            # record was torn by a crash.
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good)
+        self.inbox.add(changes)
+        self._journal_id, self._offset = journal_id, good
+
+    def _add_inbox(self, data):
+        # Changes read from the journal that is about to be rotated away
+        # must be in the snapshot that replaces it.
+        for change in self.inbox.changes.values():
+            if change["op"] != "note":
+                apply_change(data, change)
+
+    def _compact(self, data, rotated):
+        # The snapshot is written beside the real one without the lock, so
+        # appends never wait for it; only the rename is done under the lock.
+        tmp_path = f"{self.path}.{os.getpid()}.compact"
+        try:
+            write_json_atomic(tmp_path, data)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(e)
+            return
+        with self.lock:
+            if not os.path.exists(self.rotated_path):
+                os.remove(tmp_path)
+                return  # another process already wrote a newer snapshot
+            # Records another process moved into the rotated journal since
+            # are not in `data`; the rotated journal is then kept, and load
+            # replays it over this snapshot.
+            kept = file_signature(self.rotated_path) != rotated
+            try:
+                os.replace(tmp_path, self.path)
+                if not kept:
+                    os.remove(self.rotated_path)
+            except Exception as e:
+                with self._lock:
+                    self._errors.append(e)
+                return
+            self.compactions += 1
+            if not kept:
+                self._snapshot_seen = file_signature(self.path, self.rotated_path)
+
+    def _replay(self, data, path):
+        if not os.path.exists(path):
+            return
+        good = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                apply_change(data, change)
+                good += len(line)
+        if good != os.path.getsize(path):
+            # Drop a record torn by a crash mid-append.
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def _rotate(self):
+        # The rotated journal is only removed once the snapshot covering it
+        # is on disk, so a crash in between is recovered by load().
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not os.path.exists(self.journal_path):
+            return
+        if os.path.exists(self.rotated_path):
+            # An earlier snapshot write failed; keep its records as well.
+            with open(self.rotated_path, "ab") as dst, open(self.journal_path, "rb") as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_path)
+
+    def _write_snapshot(self, data, remove_rotated=True):
+        try:
+            write_json_atomic(self.path, data)
+            if remove_rotated and os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(e)
+            return
+        self.compactions += 1
+
+    def _compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+
+def create_storage(mode="json", directory=""):
+    # `directory` holds one student's files; the default is the working
+    # directory, as for a single-user install.
+    data_path = os.path.join(directory, DATA_FILE)
+    notes_path = os.path.join(directory, NOTES_FILE)
+    if mode == "journal":
+        return JournalStorage(data_path, os.path.join(directory, JOURNAL_FILE), notes_path=notes_path)
+    if mode == "sqlite":
+        from .sqlite_store import SqliteStorage
+
+        return SqliteStorage(os.path.join(directory, SQLITE_FILE), legacy_path=data_path)
+    return JsonStorage(data_path, notes_path=notes_path)
@@ -0,0 +1,418 @@
+from collections import OrderedDict
+from itertools import count, groupby
+
+from .catalog import SATTopics, TopicCatalog, copy_details
+from .registry import TopicRegistry, is_path_key
+from .rollup import RatingRollup
+from .history import HISTORY_DIR, RatingHistory
+from .search import SearchIndex
+from .sharing import change_field
+from .storage import SEARCH_INDEX_FILE, JsonStorage
+from .sync import SYNC_FILE, SyncLog, existing_changes
+from .undo import UndoHistory
+
+
+NOTE_CACHE_SIZE = 32
+REVISIONS = count(1)
+
+
+class StudyStore:
+    # Ratings, notes and the topic catalog for one student, with no GUI
+    # dependency. Ratings and notes are keyed by TopicRegistry ids. `catalog`
+    # is the shared base; the student's own topics live in an overlay. Notes
+    # stay in the storage and only recently viewed ones are kept in memory.
+    def __init__(self, storage=None, catalog=SATTopics, index_path=SEARCH_INDEX_FILE, history_path=HISTORY_DIR,
+                 sync_path=SYNC_FILE):
+        self.storage = storage or JsonStorage()
+        self.catalog = TopicCatalog(catalog)
+        self.index_path = index_path
+        # Rating history is optional; history_path=None turns it off.
+        self.history = RatingHistory(history_path) if history_path is not None else None
+        # So are the stamps used to sync with other machines.
+        self.sync = SyncLog(sync_path) if sync_path is not None else None
+        self.current_ratings = {}
+        self.note_cache = OrderedDict()  # topic id -> text or None, LRU order
+        self.undo_history = UndoHistory()
+        # Bumped from one process-wide counter on every change, so a
+        # revision also tells stores apart; used for ETags and polling.
+        self.revisions = dict.fromkeys(("ratings", "notes", "catalog"), next(REVISIONS))
+        self.registry = None
+        self.rollup = None
+        self.search_index = None
+        self._errors = []
+
+    def load(self):
+        errors = []
+        data = {}
+        try:
+            data = self.storage.load()
+            self.catalog.load_overlay(data.get("custom_topics", {}))
+        except Exception as e:
+            errors.append(e)
+            data = {}
+
+        self.registry = TopicRegistry(self.catalogs())
+        try:
+            self.current_ratings = self.keys_to_ids(data.get("ratings", {}))
+            self.note_cache = OrderedDict()
+            self.undo_history.clear()
+            self.storage.migrate_keys(lambda key: self.registry.key(self.registry.resolve_key(key)))
+        except Exception as e:
+            errors.append(e)
+            self.current_ratings = {}
+        self.rollup = RatingRollup(self.registry, self.current_ratings)
+        self.revisions = dict.fromkeys(self.revisions, next(REVISIONS))
+        try:
+            self.search_index = SearchIndex.load(self.index_path, self.storage.signature())
+        except Exception as e:
+            errors.append(e)
+        if self.search_index is None:
+            self.rebuild_search_index()
+        if self.history is not None:
+            try:
+                self.history.open()
+            except Exception as e:
+                errors.append(e)
+                self.history = None
+        if self.sync is not None:
+            try:
+                if self.sync.open():
+                    self.sync.stamp(list(existing_changes(self)))
+                    self.sync.write_pending()
+            except Exception as e:
+                errors.append(e)
+                self.sync = None
+        return errors
+
+    def rebuild_search_index(self):
+        self.search_index = SearchIndex()
+        for topic_id, path in enumerate(self.registry.paths):
+            if len(path) in (2, 3) and self.registry.is_linked(topic_id):
+                self.index_topic(topic_id)
+        for key, text in self.storage.iter_notes():
+            self.search_index.update(f"note:{key}", text)
+
+    def index_topic(self, topic_id):
+        # Topics are indexed by name; subtopics also by their key concepts,
+        # importance and the names of their leaf items.
+        path = self.registry.path(topic_id)
+        text = [path[-1]]
+        if len(path) == 3:
+            details = self.subject_topics(path[0]).get(path[1], {}).get(path[2], {})
+            text.extend(details.get("key_concepts", []))
+            text.extend(details.get("subtopics", []))
+            text.append(details.get("importance", ""))
+        self.search_index.update(f"topic:{self.key(topic_id)}", "\n".join(text))
+
+    def unindex_descendants(self, topic_id):
+        for child_id in self.registry.children_of(topic_id):
+            self.search_index.remove(f"topic:{self.key(child_id)}")
+            self.unindex_descendants(child_id)
+
+    def search(self, query, limit=50):
+        results = []
+        for doc, score in self.search_index.search(query, limit):
+            kind, key = doc.split(":", 1)
+            results.append({"topic_id": self.registry.resolve_key(key), "kind": kind, "score": score})
+        return results
+
+    def keys_to_ids(self, entries):
+        # Old "Subject - Topic - ..." keys are applied first so that a value
+        # saved under the newer path key for the same topic wins.
+        resolve = self.registry.resolve_key
+        converted = {resolve(key): value for key, value in entries.items() if not is_path_key(key)}
+        converted.update((resolve(key), value) for key, value in entries.items() if is_path_key(key))
+        return converted
+
+    def catalogs(self):
+        return {subject: self.catalog.topics(subject) for subject in TopicCatalog.SUBJECTS}
+
+    def subject_topics(self, subject):
+        return self.catalog.topics(subject)
+
+    def path(self, topic_id):
+        return self.registry.path(topic_id)
+
+    def key(self, topic_id):
+        return self.registry.key(topic_id)
+
+    def get_rating(self, topic_id, default=None):
+        return self.current_ratings.get(topic_id, default)
+
+    def set_rating(self, topic_id, rating):
+        # A rating of None removes it.
+        touched, change = self._set_rating(topic_id, rating)
+        self.record_change(change)
+        return touched
+
+    def _set_rating(self, topic_id, rating, history=True):
+        old = self.current_ratings.get(topic_id)
+        if rating is None:
+            self.current_ratings.pop(topic_id, None)
+        else:
+            self.current_ratings[topic_id] = rating
+        self.revisions["ratings"] = next(REVISIONS)
+        touched = self.rollup.rating_changed(topic_id, old, rating)
+        if history and self.history is not None and rating is not None:
+            try:
+                self.history.record(self.key(topic_id), rating)
+            except OSError as e:
+                self._errors.append(e)
+        key = self.key(topic_id)
+        change = {"op": "rating", "path": key, "value": rating}
+        # Slider drags on one topic merge into a single undo step.
+        self.undo_history.push([(("rating", key), dict(change, value=old), change)],
+                               merge_key=("rating", topic_id))
+        return touched, change
+
+    def get_note(self, topic_id):
+        if topic_id in self.note_cache:
+            self.note_cache.move_to_end(topic_id)
+            return self.note_cache[topic_id]
+        note = self.storage.load_note(self.key(topic_id))
+        self._cache_note(topic_id, note)
+        return note
+
+    def set_note(self, topic_id, text):
+        # A note of None removes it.
+        self.record_change(self._set_note(topic_id, text))
+
+    def _set_note(self, topic_id, text):
+        key = self.key(topic_id)
+        change = {"op": "note", "path": key, "text": text}
+        self.undo_history.push([(("note", key), dict(change, text=self.get_note(topic_id)), change)])
+        self._cache_note(topic_id, text)
+        self.revisions["notes"] = next(REVISIONS)
+        if text is None:
+            self.search_index.remove(f"note:{key}")
+        else:
+            self.search_index.update(f"note:{key}", text)
+        return change
+
+    def _cache_note(self, topic_id, text):
+        # Topics without a note are cached too, so browsing them does not
+        # go back to the storage.
+        self.note_cache[topic_id] = text
+        self.note_cache.move_to_end(topic_id)
+        while len(self.note_cache) > NOTE_CACHE_SIZE:
+            self.note_cache.popitem(last=False)
+
+    def apply_catalog_changes(self, changes, record=True, undo_key=None):
+        # Applies many topic/subtopic additions and removals and records them
+        # in one call. Returns which registry nodes were re-added or removed,
+        # which parents gained or lost children and which rollups changed,
+        # for the view to update. With record=False the caller saves a
+        # snapshot afterwards instead. Calls with the same undo_key in quick
+        # succession undo as one step.
+        applied = []
+        affected = {}
+        reset = {}
+        removed = {}
+        touched = {}
+        entries = []
+        for change in changes:
+            subject = "Math" if change["subject"] == "Math" else "Reading"
+            topic = change["topic"]
+            op = change["op"]
+            subtopic = change["subtopic"] if op in ("subtopic", "remove_subtopic") else None
+            restore = self.catalog_restore(subject, topic, subtopic)
+            if op == "topic":
+                done = self.catalog.add_topic(subject, topic)
+            elif op == "subtopic":
+                done = self.catalog.add_subtopic(subject, topic, subtopic, change.get("details"))
+            elif op == "remove_topic":
+                # Undoing the removal has to bring its subtopics back first.
+                for name in self.catalog.overlay[subject].get(topic, ()):
+                    entries.append((("subtopic", subject, topic, name),
+                                    self.catalog_restore(subject, topic, name),
+                                    {"op": "remove_subtopic", "subject": subject,
+                                     "topic": topic, "subtopic": name}))
+                done = self.catalog.remove_topic(subject, topic)
+            else:
+                done = self.catalog.remove_subtopic(subject, topic, subtopic)
+            if not done:
+                continue
+            if subtopic is None:
+                parent_id = self.registry.subject_id(subject)
+                name = topic
+            else:
+                parent_id = self.registry.ids[(subject, topic)]
+                name = subtopic
+            existing = self.registry.children.get(parent_id, {}).get(name)
+            if existing is not None:
+                touched.update(dict.fromkeys(self.rollup.detach(existing)))
+                self.unindex_descendants(existing)
+            topics = self.subject_topics(subject)
+            details = topics[topic].get(subtopic) if subtopic is not None and topic in topics else None
+            if topic in topics and (subtopic is None or details is not None):
+                # An added node, or a removed subtopic the base catalog
+                # still has, is (re)built from the catalog.
+                node_id = self.registry.add_child(parent_id, name)
+                for leaf in (details or {}).get("subtopics", ()):
+                    self.registry.add_child(node_id, leaf)
+                self.index_topic(node_id)
+                touched.update(dict.fromkeys(self.rollup.attach(node_id)))
+                reset[node_id] = None
+            elif existing is not None:
+                self.search_index.remove(f"topic:{self.key(existing)}")
+                self.registry.remove_child(parent_id, name)
+                removed[existing] = None
+            applied.append(dict(change, subject=subject))
+            affected[parent_id] = None
+            entries.append((change_field(applied[-1]), restore, applied[-1]))
+
+        if applied:
+            self.revisions["catalog"] = next(REVISIONS)
+        if applied and record:
+            self.storage.record_many(applied, self.snapshot_data)
+        self.stamp(applied)
+        self.undo_history.push(entries, merge_key=undo_key)
+        return {"applied": applied, "affected": list(affected), "reset": list(reset),
+                "removed": list(removed), "touched": list(touched)}
+
+    def catalog_restore(self, subject, topic, subtopic=None):
+        # The change that puts this catalog entry back the way it is now.
+        topics = self.subject_topics(subject)
+        if subtopic is None:
+            op = "topic" if topic in topics else "remove_topic"
+            return {"op": op, "subject": subject, "topic": topic}
+        change = {"op": "remove_subtopic", "subject": subject, "topic": topic, "subtopic": subtopic}
+        # Removing the student's copy is what brings a base subtopic back.
+        if subtopic in self.catalog.overlay[subject].get(topic, {}):
+            change.update(op="subtopic", details=copy_details(topics[topic][subtopic]))
+        return change
+
+    def undo(self):
+        # Reverts the last undo step; returns what changed, as for
+        # apply_changes, or None when there is nothing to undo.
+        changes = self.undo_history.undo()
+        return None if changes is None else self.apply_changes(changes, undoable=False)
+
+    def redo(self):
+        changes = self.undo_history.redo()
+        return None if changes is None else self.apply_changes(changes, undoable=False)
+
+    def poll_changes(self):
+        # Applies what other processes saved to the same files since the
+        # last poll; returns what changed, as for apply_changes, or None.
+        # Edits made here since the last poll are stamped first, one stamp
+        # per field.
+        if self.sync is not None:
+            try:
+                self.sync.write_pending()
+            except OSError as e:
+                self._errors.append(e)
+        try:
+            changes = self.storage.poll_changes(self.snapshot_data)
+        except (OSError, ValueError) as e:
+            self._errors.append(e)
+            return None
+        if not changes:
+            return None
+        if self.sync is None:
+            return self.apply_changes(changes, undoable=False, record=False)
+        # The process that saved them stamped them too.
+        self.sync.paused = True
+        try:
+            return self.apply_changes(changes, undoable=False, record=False)
+        finally:
+            self.sync.paused = False
+
+    def apply_changes(self, changes, undoable=True, record=True):
+        # Applies changes in storage-record form, as kept by undo or sent by
+        # another client, recording each run of ratings and notes in one
+        # call. Returns what changed as for apply_catalog_changes, plus the
+        # topic ids whose "ratings" and "notes" were set. record=False is for
+        # changes already saved, which another process also put in the
+        # rating history.
+        update = {"ratings": [], "notes": [], "applied": [], "affected": [],
+                  "reset": [], "removed": [], "touched": []}
+        replaying = self.undo_history.replaying
+        self.undo_history.replaying = replaying or not undoable
+        try:
+            for is_catalog, group in groupby(changes, lambda change: change["op"] not in ("rating", "note")):
+                if is_catalog:
+                    for name, values in self.apply_catalog_changes(list(group), record=record).items():
+                        update[name].extend(values)
+                    continue
+                recorded = []
+                for change in group:
+                    topic_id = self.registry.resolve_key(change["path"])
+                    if change["op"] == "rating":
+                        touched, change = self._set_rating(topic_id, change["value"], history=record)
+                        update["touched"].extend(touched)
+                        update["ratings"].append(topic_id)
+                    else:
+                        change = self._set_note(topic_id, change["text"])
+                        update["notes"].append(topic_id)
+                    recorded.append(change)
+                if record:
+                    self.storage.record_many(recorded, self.snapshot_data)
+                self.stamp(recorded)
+        finally:
+            self.undo_history.replaying = replaying
+        return update
+
+    def summary(self, topic_id):
+        return self.rollup.summary(topic_id)
+
+    def mastery(self, subject):
+        return self.rollup.mastery(subject)
+
+    def record_change(self, change):
+        self.storage.record(change, self.snapshot_data)
+        self.stamp([change])
+
+    def stamp(self, changes):
+        # Marks changes made here as the latest for syncing.
+        if self.sync is None:
+            return
+        try:
+            self.sync.stamp(changes)
+        except OSError as e:
+            self._errors.append(e)
+
+    def save(self):
+        self.storage.save(self.snapshot_data())
+
+    def snapshot_data(self):
+        # Copies are handed to the writer thread, so later edits on the Tk
+        # thread cannot race with serialization.
+        key = self.registry.key
+        return {
+            "ratings": {key(topic_id): rating for topic_id, rating in self.current_ratings.items()},
+            "custom_topics": self.catalog.overlay_data()
+        }
+
+    def pop_errors(self):
+        errors, self._errors = self._errors, []
+        return errors + self.storage.pop_errors()
+
+    def progress(self, path, count, start, end):
+        # Downsampled rating history for the topic at `path` and its subtree.
+        if self.history is None:
+            return []
+        self.history.refresh()
+        return self.history.buckets(self.history.keys_under(tuple(path)), count, start, end)
+
+    def flush(self):
+        self.storage.flush()
+        for log in (self.history, self.sync):
+            if log is not None:
+                try:
+                    log.flush()
+                except OSError as e:
+                    self._errors.append(e)
+
+    def close(self):
+        self.storage.close()
+        for log in (self.history, self.sync):
+            if log is not None:
+                try:
+                    log.close()
+                except OSError as e:
+                    self._errors.append(e)
+        try:
+            self.search_index.save(self.index_path, self.storage.signature())
+        except Exception as e:
+            self._errors.append(e)
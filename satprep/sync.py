@@ -0,0 +1,399 @@
+import bisect
+import json
+import os
+import time
+
+from .catalog import TopicCatalog
+from .sharing import FileLock, change_field
+
+
+SYNC_FILE = "sat_study_data.sync"
+SYNC_FORMAT = "satprep-sync/1"
+SYNC_COMPACT_BYTES = 1024 * 1024  # log size below which overwritten stamps are left alone
+
+
+def encode_line(entry):
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SyncLog:
+    # A last-writer-wins stamp for every rating, note, topic and subtopic,
+    # used to sync copies of the data kept on different machines. A stamp
+    # is (clock, replica): the clock is wall time in microseconds, pushed
+    # past every clock seen so far, so stamps order edits the way they
+    # happened and ties break the same way on every machine. `vector` holds
+    # the highest clock this copy has everything up to, per replica.
+    #
+    # Stamps are appended to a log beside the study data. Each replica's
+    # stamps are also kept in clock order, so a delta only visits the
+    # stamps newer than what the other machine has. Edits made here are
+    # only noted as they happen and stamped in one write at the next
+    # write_pending(), so a burst of edits to one field, like a dragged
+    # slider, takes one stamp.
+    def __init__(self, path=SYNC_FILE):
+        self.path = path
+        # Not the storage's lock file: importing holds this lock while the
+        # storage takes its own.
+        self.lock = FileLock(f"{path}.lock")
+        self.replica = None
+        self.clock = 0
+        self.stamps = {}      # field -> (clock, replica)
+        self.vector = {}      # replica -> clock
+        self.peers = {}       # replica -> the vector in its last delta
+        self.by_replica = {}  # replica -> [(clock, field)], sorted; may hold overwritten stamps
+        self.lines = 0
+        self.paused = False   # set while applying changes that are stamped already
+        self._pending = {}    # field -> wall time of its latest edit here, in edit order
+        self._writer = None
+        self._offset = 0
+        self._ino = None
+
+    def open(self):
+        # Returns True when the log was just created, so the caller can
+        # stamp the data saved before syncing was used.
+        with self.lock:
+            created = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            if created:
+                with open(self.path, "wb") as f:
+                    f.write(encode_line({"replica": os.urandom(6).hex()}))
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._load()
+        return created
+
+    def stamp(self, changes):
+        # Notes changes made here, to be stamped by write_pending().
+        if self.paused or self._writer is None:
+            return
+        now = time.time_ns() // 1000
+        for change in changes:
+            field = change_field(change)
+            self._pending.pop(field, None)
+            self._pending[field] = now
+
+    def write_pending(self):
+        if not self._pending or self._writer is None:
+            return
+        with self.lock:
+            self._refresh()
+            self._write_pending()
+
+    def delta(self, since):
+        # (field, stamp) for every field whose latest stamp is newer than
+        # `since`, a vector from another machine.
+        with self.lock:
+            self._refresh()
+            self._write_pending()
+            entries = []
+            for replica, stamps in self.by_replica.items():
+                start = bisect.bisect_left(stamps, (since.get(replica, 0) + 1,))
+                for clock, field in stamps[start:]:
+                    if self.stamps.get(field) == (clock, replica):
+                        entries.append((field, (clock, replica)))
+            return entries
+
+    def since_peers(self):
+        # What every machine this one has synced with already has.
+        if not self.peers:
+            return {}
+        replicas = set().union(*self.peers.values())
+        return {replica: min(vector.get(replica, 0) for vector in self.peers.values())
+                for replica in replicas}
+
+    def is_newer(self, field, stamp):
+        current = self.stamps.get(field)
+        return current is None or stamp > current
+
+    def received(self, entries, replica, vector, complete):
+        # Records the stamps of entries taken from another machine's delta.
+        # With `complete`, the delta held everything this copy was missing
+        # up to `vector`, so this copy's vector catches up to it.
+        with self.lock:
+            lines = []
+            for field, stamp in entries:
+                self._add(field, stamp)
+                lines.append([stamp[0], stamp[1], list(field)])
+            if complete:
+                for name, clock in vector.items():
+                    self.vector[name] = max(self.vector.get(name, 0), clock)
+                lines.append({"vector": self.vector})
+            peer = self.peers.setdefault(replica, {})
+            for name, clock in vector.items():
+                peer[name] = max(peer.get(name, 0), clock)
+            lines.append({"peer": replica, "vector": peer})
+            self._append(lines)
+
+    def flush(self):
+        if self._writer is not None:
+            self.write_pending()
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+
+    def close(self):
+        if self._writer is None:
+            return
+        with self.lock:
+            self._refresh()
+            self.flush()
+            self._writer.close()
+            self._writer = None
+            if self._offset > SYNC_COMPACT_BYTES and len(self.stamps) * 2 < self.lines:
+                self._compact()
+        self.lock.close()
+
+    def _compact(self):
+        # Rewrites the log with only the latest stamp per field; other
+        # processes see the new file and reload it.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_line({"replica": self.replica}))
+            f.write(encode_line({"vector": self.vector}))
+            for replica, vector in self.peers.items():
+                f.write(encode_line({"peer": replica, "vector": vector}))
+            for field, (clock, replica) in self.stamps.items():
+                f.write(encode_line([clock, replica, list(field)]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @property
+    def stats(self):
+        return {"sync_fields": len(self.stamps), "sync_lines": self.lines, "sync_peers": len(self.peers)}
+
+    def _write_pending(self):
+        # Callers hold the lock and have refreshed, so the clocks follow
+        # every stamp other processes wrote.
+        if not self._pending:
+            return
+        lines = []
+        for field, when in self._pending.items():
+            self.clock = max(self.clock + 1, when)
+            self._add(field, (self.clock, self.replica))
+            lines.append([self.clock, self.replica, list(field)])
+        self._pending = {}
+        self.vector[self.replica] = self.clock
+        self._append(lines)
+
+    def _add(self, field, stamp):
+        clock, replica = stamp
+        current = self.stamps.get(field)
+        if current is None or stamp > current:
+            self.stamps[field] = stamp
+        self.clock = max(self.clock, clock)
+        stamps = self.by_replica.setdefault(replica, [])
+        if not stamps or stamps[-1] < (clock, field):
+            stamps.append((clock, field))
+        else:
+            bisect.insort(stamps, (clock, field))
+        self.lines += 1
+
+    def _load(self):
+        if self._writer is not None:
+            self._writer.close()
+        self.replica = None
+        self.clock = 0
+        self.stamps = {}
+        self.vector = {}
+        self.peers = {}
+        self.by_replica = {}
+        self.lines = 0
+        self._offset = 0
+        self._read()
+        self._writer = open(self.path, "ab")
+        self._ino = os.fstat(self._writer.fileno()).st_ino
+
+    def _refresh(self):
+        # Picks up what other processes using the same files stamped.
+        st = os.stat(self.path)
+        if st.st_ino != self._ino:
+            self._load()
+        elif st.st_size > self._offset:
+            self._read()
+
+    def _read(self):
+        # Reads lines from _offset on; callers hold the lock, so a partial
+        # line at the end was torn by a crash.
+        good = self._offset
+        with open(self.path, "rb") as f:
+            f.seek(good)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                if isinstance(entry, list):
+                    clock, replica, field = entry
+                    self._add(tuple(field), (clock, replica))
+                    if replica == self.replica:
+                        self.vector[replica] = max(self.vector.get(replica, 0), clock)
+                elif "replica" in entry:
+                    self.replica = self.replica or entry["replica"]
+                elif "peer" in entry:
+                    self.peers[entry["peer"]] = entry["vector"]
+                else:
+                    for name, clock in entry["vector"].items():
+                        self.vector[name] = max(self.vector.get(name, 0), clock)
+        if good != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+        self._offset = good
+
+    def _append(self, lines):
+        self._writer.seek(0, os.SEEK_END)
+        self._writer.write(b"".join(map(encode_line, lines)))
+        self._writer.flush()
+        self._offset = self._writer.tell()
+
+
+def existing_changes(store):
+    # Everything saved before the sync log existed, so it can be stamped.
+    for topic_id in store.current_ratings:
+        yield {"op": "rating", "path": store.key(topic_id)}
+    for key, _ in store.storage.iter_notes():
+        yield {"op": "note", "path": key}
+    for subject in TopicCatalog.SUBJECTS:
+        for topic, subtopics in store.catalog.overlay[subject].items():
+            yield {"op": "topic", "subject": subject, "topic": topic}
+            for subtopic in subtopics:
+                yield {"op": "subtopic", "subject": subject, "topic": topic, "subtopic": subtopic}
+
+
+def field_change(store, field):
+    # The change that gives another copy this copy's value for `field`.
+    if field[0] == "rating":
+        return {"op": "rating", "path": field[1],
+                "value": store.get_rating(store.registry.resolve_key(field[1]))}
+    if field[0] == "note":
+        return {"op": "note", "path": field[1], "text": store.storage.load_note(field[1])}
+    return store.catalog_restore(*field[1:])
+
+
+def export_delta(store, path, since=None):
+    # Writes what a machine at vector `since` is missing; by default, what
+    # any machine synced with before is missing, and everything for the
+    # first sync. Returns the number of changes written.
+    log = store.sync
+    if since is None:
+        since = log.since_peers()
+    # Topics before their subtopics, and both before ratings and notes.
+    order = {"topic": 0, "subtopic": 1, "rating": 2, "note": 2}
+    entries = sorted(log.delta(since), key=lambda entry: (order[entry[0][0]], entry[1]))
+    changes = [dict(field_change(store, field), stamp=list(stamp)) for field, stamp in entries]
+    delta = {"format": SYNC_FORMAT, "replica": log.replica, "vector": log.vector,
+             "since": since, "changes": changes}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return len(changes)
+
+
+def check_change(change):
+    # Raises ValueError for an entry that did not come from export_delta.
+    if not isinstance(change, dict):
+        raise ValueError("not an object")
+    stamp = change.get("stamp")
+    if not (isinstance(stamp, list) and len(stamp) == 2 and isinstance(stamp[0], int)
+            and isinstance(stamp[1], str)):
+        raise ValueError(f"invalid stamp {stamp!r}")
+    op = change.get("op")
+    if op in ("rating", "note"):
+        if not isinstance(change.get("path"), str):
+            raise ValueError("missing path")
+        value = change.get("value" if op == "rating" else "text")
+        if value is not None and not isinstance(value, (int, float) if op == "rating" else str):
+            raise ValueError(f"invalid {op}")
+        return
+    if op not in ("topic", "subtopic", "remove_topic", "remove_subtopic"):
+        raise ValueError(f"unknown op {op!r}")
+    if change.get("subject") not in TopicCatalog.SUBJECTS or not isinstance(change.get("topic"), str):
+        raise ValueError("missing subject or topic")
+    if op in ("subtopic", "remove_subtopic") and not isinstance(change.get("subtopic"), str):
+        raise ValueError("missing subtopic")
+    if op == "subtopic" and not isinstance(change.get("details"), dict):
+        raise ValueError("missing details")
+
+
+def import_delta(store, path):
+    # Merges a delta file: each entry wins if its stamp is newer than this
+    # copy's for the same field. Returns what changed, as for
+    # StudyStore.apply_changes, and the number of entries read and applied.
+    with open(path, "r", encoding="utf-8") as f:
+        delta = json.load(f)
+    if not isinstance(delta, dict) or delta.get("format") != SYNC_FORMAT:
+        raise ValueError(f"{path} is not a sync file")
+    if not (isinstance(delta.get("replica"), str) and isinstance(delta.get("changes"), list)
+            and isinstance(delta.get("vector"), dict) and isinstance(delta.get("since"), dict)):
+        raise ValueError(f"{path} is incomplete")
+    entries = []
+    for index, change in enumerate(delta["changes"]):
+        try:
+            check_change(change)
+        except ValueError as e:
+            raise ValueError(f"change {index}: {e}")
+        change = dict(change)
+        stamp = tuple(change.pop("stamp"))
+        entries.append((change_field(change), stamp, change))
+    log = store.sync
+    with log.lock:
+        log._refresh()
+        log._write_pending()
+        # Everything newer than `since` is in the file, so if this copy had
+        # at least that, it now has all the sender had.
+        complete = all(log.vector.get(name, 0) >= clock for name, clock in delta["since"].items())
+        accepted = [entry for entry in entries if log.is_newer(entry[0], entry[1])]
+        log.paused = True
+        try:
+            update = store.apply_changes([change for _, _, change in accepted], undoable=False)
+        finally:
+            log.paused = False
+        log.received([(field, stamp) for field, stamp, _ in accepted], delta["replica"],
+                     delta["vector"], complete)
+    return update, len(entries), len(accepted)
+
+
+def main():
+    import argparse
+
+    from .history import HISTORY_DIR
+    from .storage import SEARCH_INDEX_FILE, create_storage
+    from .store import StudyStore
+
+    parser = argparse.ArgumentParser(description="Sync SAT study data between machines through files")
+    parser.add_argument("action", choices=["export", "import", "status"])
+    parser.add_argument("file", nargs="?", help="the delta file to write or read")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"], default="json")
+    parser.add_argument("--directory", default="", help="directory holding the study data")
+    parser.add_argument("--full", action="store_true", help="export everything, not just what other machines lack")
+    args = parser.parse_args()
+    if args.action != "status" and not args.file:
+        parser.error(f"{args.action} needs a file")
+
+    directory = args.directory
+    store = StudyStore(create_storage(args.storage, directory),
+                       index_path=os.path.join(directory, SEARCH_INDEX_FILE),
+                       history_path=os.path.join(directory, HISTORY_DIR),
+                       sync_path=os.path.join(directory, SYNC_FILE))
+    for e in store.load():
+        print(f"Error loading data: {e}")
+    try:
+        if args.action == "export":
+            count = export_delta(store, args.file, since={} if args.full else None)
+            print(f"{count} changes written to {args.file}")
+        elif args.action == "import":
+            _, read, applied = import_delta(store, args.file)
+            print(f"{applied} of {read} changes applied from {args.file}")
+        else:
+            print(json.dumps({"replica": store.sync.replica, "vector": store.sync.vector,
+                              "peers": store.sync.peers, **store.sync.stats}, indent=2))
+    finally:
+        store.close()
+        for e in store.pop_errors():
+            print(f"Error saving data: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import time
+from collections import deque
+
+
+UNDO_LIMIT = 100  # steps kept for undo, and again for redo
+MERGE_SECONDS = 1.0  # edits with the same merge key closer than this form one step
+
+
+class UndoStep:
+    # Changes keyed by what they modify, e.g. ("rating", path key). Merging
+    # keeps the first inverse and the last forward change per target, so a
+    # step costs memory for each thing it touched rather than each event.
+    __slots__ = ("undo", "redo")
+
+    def __init__(self):
+        self.undo = {}
+        self.redo = {}
+
+
+class UndoHistory:
+    # An inverse-operation log: every edit pushes the changes that revert it
+    # and the changes that re-apply it, in the same form as storage records.
+    # Both stacks are bounded deques, so the oldest steps fall off.
+    def __init__(self, limit=UNDO_LIMIT, merge_seconds=MERGE_SECONDS):
+        self.merge_seconds = merge_seconds
+        self.undo_steps = deque(maxlen=limit)
+        self.redo_steps = deque(maxlen=limit)
+        self.replaying = False
+        self._last_key = None
+        self._last_time = 0.0
+
+    def push(self, entries, merge_key=None):
+        # `entries` are (target, undo change, redo change) triples.
+        if self.replaying or not entries:
+            return
+        now = time.monotonic()
+        if merge_key is not None and merge_key == self._last_key \
+                and now - self._last_time < self.merge_seconds and self.undo_steps:
+            step = self.undo_steps[-1]
+        else:
+            step = UndoStep()
+            self.undo_steps.append(step)
+        for target, undo, redo in entries:
+            step.undo.setdefault(target, undo)
+            step.redo[target] = redo
+        self._last_key = merge_key
+        self._last_time = now
+        self.redo_steps.clear()
+
+    def undo(self):
+        # Returns the changes to apply, newest first, or None.
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        self._last_key = None
+        return list(reversed(step.undo.values()))
+
+    def redo(self):
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        self._last_key = None
+        return list(step.redo.values())
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self._last_key = None
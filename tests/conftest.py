@@ -0,0 +1,134 @@
+import importlib.util
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from satprep import StudyStore  # noqa: E402
+
+
+def open_store(storage, directory):
+    # A store keeping every derived file inside `directory`.
+    from satprep import create_storage
+
+    return StudyStore(create_storage(storage, str(directory)),
+                      index_path=os.path.join(directory, "index.json"),
+                      history_path=os.path.join(directory, "history"),
+                      sync_path=os.path.join(directory, "data.sync"))
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    # Opens and loads stores, and closes whatever a test left open.
+    stores = []
+
+    def make(storage="json", directory=None):
+        directory = directory or tmp_path
+        os.makedirs(directory, exist_ok=True)
+        store = open_store(storage, directory)
+        assert store.load() == []
+        stores.append(store)
+        close = store.close
+
+        def closing():
+            stores.remove(store)
+            close()
+
+        store.close = closing
+        return store
+
+    yield make
+    for store in list(stores):
+        store.close()
+
+
+class FakeTree:
+    # Enough of ttk.Treeview for the app's incremental row updates.
+    _ids = itertools.count()
+
+    def __init__(self):
+        self.items = {"": {"children": [], "text": "", "tags": (), "open": False,
+                           "parent": None, "values": ()}}
+
+    def insert(self, parent, index, text="", values=(), tags=(), iid=None, open=False):
+        iid = iid or f"I{next(self._ids)}"
+        self.items[iid] = {"children": [], "text": text, "tags": tuple(tags), "open": open,
+                           "parent": parent, "values": tuple(values)}
+        self.items[parent]["children"].append(iid)
+        return iid
+
+    def get_children(self, item=""):
+        return tuple(self.items[item]["children"])
+
+    def tag_has(self, tag, item):
+        return tag in self.items[item]["tags"]
+
+    def item(self, item, option=None, **options):
+        if options:
+            self.items[item].update(options)
+            return None
+        return self.items[item][option] if option else self.items[item]
+
+    def parent(self, item):
+        return self.items[item]["parent"] or ""
+
+    def delete(self, *items):
+        for item in items:
+            self.delete(*self.items[item]["children"])
+            self.items[self.items[item]["parent"]]["children"].remove(item)
+            del self.items[item]
+
+    def set(self, item, column=None, value=None):
+        self.items[item]["values"] = (value,)
+
+    def exists(self, item):
+        return item in self.items
+
+    def texts(self, item):
+        return [self.items[child]["text"] for child in self.get_children(item)]
+
+
+class Stub:
+    # Accepts any widget call.
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: False
+
+
+@pytest.fixture
+def make_app():
+    # The app without Tk: trees are FakeTrees and other widgets are stubs.
+    pytest.importorskip("tkinter")
+    spec = importlib.util.spec_from_file_location("sat_planner", os.path.join(ROOT, "SAT Planner.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    def make(store):
+        app = module.ModernSATStudyApp.__new__(module.ModernSATStudyApp)
+        app.store = store
+        app.selected_topic = None
+        app.scheduler = None
+        app.profiles = None
+        app.bulk_import = None
+        app.heatmap = app.notes_text = app.rating_var = app.rating_label = app.status_label = Stub()
+        app.math_tree = FakeTree()
+        app.reading_tree = FakeTree()
+        app.subject_trees = {"Math": app.math_tree, "Reading": app.reading_tree}
+        store.registry.items.clear()
+        for subject, tree in app.subject_trees.items():
+            app.insert_children(tree, "", store.registry.subject_id(subject))
+        return app
+
+    return make
+
+
+def expand(app, node_id):
+    # Opens a row the way <<TreeviewOpen>> does.
+    tree = app.subject_tree(node_id)
+    item = app.store.registry.items[node_id]
+    app.populate_children(tree, item)
+    tree.item(item, open=True)
+    return item
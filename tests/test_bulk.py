@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from satprep.bulk import BackgroundImport, export_catalog, import_catalog
+from test_undo import SUBTOPIC, TOPIC
+
+ROWS = [
+    {"subject": "reading", "topic": "Poetry", "subtopic": "Meter", "importance": "Low",
+     "key_concepts": "stress; feet", "items": "Iambs;Trochees"},
+    {"subject": "Reading", "topic": "Poetry", "subtopic": "Meter", "importance": "Low",
+     "key_concepts": "stress; feet", "items": "Iambs;Trochees"},
+    {"subject": "Reading", "topic": "Drama"},
+    {"subject": "Math", "topic": TOPIC},
+    {"subject": "Science", "topic": "Cells"},
+    {"subject": "Math", "topic": " "},
+]
+
+
+def write_rows(path, rows):
+    if path.suffix == ".csv":
+        header = "subject,topic,subtopic,importance,key_concepts,items\n"
+        path.write_text(header + "".join(",".join(row.get(field, "") for field in
+                                                   ("subject", "topic", "subtopic", "importance",
+                                                    "key_concepts", "items")) + "\n" for row in rows))
+    else:
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows) + "{not json\n[1]\n")
+
+
+@pytest.mark.parametrize("name", ["topics.csv", "topics.jsonl"])
+def test_import_skips_duplicates_and_invalid_rows(name, tmp_path, make_store):
+    store = make_store()
+    write_rows(tmp_path / name, ROWS)
+    report = import_catalog(store, str(tmp_path / name), batch_size=2)
+    assert report.imported == 2
+    # The repeated Meter row and the base topic.
+    assert report.duplicates == 2
+    assert report.invalid == (2 if name.endswith(".csv") else 4)
+    assert report.errors[0] == f"line {6 if name.endswith('.csv') else 5}: unknown subject 'Science'"
+    assert store.subject_topics("Reading")["Poetry"]["Meter"] == {
+        "subtopics": ["Iambs", "Trochees"], "key_concepts": ["stress", "feet"], "importance": "Low"}
+    assert "Drama" in store.subject_topics("Reading")
+
+    # The catalog already holds everything, so a second import adds nothing.
+    again = import_catalog(store, str(tmp_path / name))
+    assert again.imported == 0 and again.duplicates == 4
+
+
+def test_invalid_lists_are_rejected(tmp_path, make_store):
+    store = make_store()
+    path = tmp_path / "topics.jsonl"
+    path.write_text(json.dumps({"subject": "Math", "topic": TOPIC, "subtopic": "New", "items": [1, 2]}) + "\n")
+    report = import_catalog(store, str(path))
+    assert report.imported == 0 and report.errors == ["line 1: expected a list of strings"]
+
+
+@pytest.mark.parametrize("name", ["export.csv", "export.jsonl"])
+def test_export_round_trips_through_background_import(name, tmp_path, make_store):
+    source = make_store("json", tmp_path / "source")
+    source.apply_catalog_changes([{"op": "subtopic", "subject": "Math", "topic": TOPIC, "subtopic": SUBTOPIC,
+                                   "details": {"subtopics": ["First"], "key_concepts": [], "importance": "High"}}])
+    rows = export_catalog({"Math": source.subject_topics("Math"), "Reading": source.subject_topics("Reading")},
+                          str(tmp_path / name)).rows
+
+    target = make_store("journal", tmp_path / "target")
+    job = BackgroundImport(str(tmp_path / name), batch_size=50).start()
+    while not job.poll(target, budget=1):
+        pass
+    assert job.error is None and job.report.invalid == 0
+    assert job.report.rows == rows and job.report.imported == 1
+    assert target.catalog.overlay_data() == source.catalog.overlay_data()
@@ -0,0 +1,53 @@
+import pytest
+
+from satprep import SATTopics, TopicCatalog, copy_topics
+from test_undo import BASE_LEAVES, SUBTOPIC, TOPIC
+
+DETAILS = {"subtopics": ["First"], "key_concepts": [], "importance": "Low"}
+
+
+def test_overlay_adds_and_removes_over_the_base():
+    catalog = TopicCatalog()
+    base = copy_topics(SATTopics.MATH_TOPICS)
+    assert catalog.add_topic("Math", "Geometry Extras")
+    assert not catalog.add_topic("Math", TOPIC)
+    assert catalog.add_subtopic("Math", "Geometry Extras", "Circles")
+    assert catalog.add_subtopic("Math", TOPIC, "Systems", DETAILS)
+    assert not catalog.add_subtopic("Math", "No such topic", "Anything")
+
+    topics = catalog.topics("Math")
+    assert list(topics)[:len(base)] == list(base) and list(topics)[-1] == "Geometry Extras"
+    assert len(topics) == len(base) + 1
+    assert list(topics[TOPIC]) == list(base[TOPIC]) + ["Systems"]
+    assert topics["Geometry Extras"]["Circles"]["subtopics"] == []
+
+    # Base topics cannot be removed; removing a subtopic the student added
+    # drops the overlay entry that only held it.
+    assert not catalog.remove_topic("Math", TOPIC)
+    assert catalog.remove_subtopic("Math", TOPIC, "Systems")
+    assert TOPIC not in catalog.overlay["Math"]
+    assert catalog.remove_topic("Math", "Geometry Extras")
+    assert not catalog.remove_topic("Math", "Geometry Extras")
+    assert catalog.overlay_data() == {"math": {}, "reading": {}}
+    assert copy_topics(SATTopics.MATH_TOPICS) == base
+
+
+def test_overridden_base_subtopic_shows_through_when_removed():
+    catalog = TopicCatalog()
+    catalog.add_subtopic("Math", TOPIC, SUBTOPIC, DETAILS)
+    assert catalog.topics("Math")[TOPIC][SUBTOPIC]["subtopics"] == ["First"]
+    assert catalog.remove_subtopic("Math", TOPIC, SUBTOPIC)
+    assert list(catalog.topics("Math")[TOPIC][SUBTOPIC]["subtopics"]) == BASE_LEAVES
+    assert not catalog.remove_subtopic("Math", TOPIC, SUBTOPIC)
+    with pytest.raises(TypeError):
+        SATTopics.MATH_TOPICS[TOPIC][SUBTOPIC] = DETAILS
+
+
+def test_loading_a_full_catalog_keeps_only_changes():
+    # Older files stored the whole catalog, base included.
+    custom = {"math": copy_topics(SATTopics.MATH_TOPICS), "reading": {"Poetry": {"Meter": DETAILS}}}
+    custom["math"][TOPIC][SUBTOPIC] = DETAILS
+    catalog = TopicCatalog()
+    catalog.load_overlay(custom)
+    assert catalog.overlay_data() == {"math": {TOPIC: {SUBTOPIC: DETAILS}},
+                                      "reading": {"Poetry": {"Meter": DETAILS}}}
@@ -0,0 +1,60 @@
+import pytest
+
+from satprep import HeatmapLayout, TopicRegistry, rating_color
+
+CATALOG = {"Math": {"Algebra": {"Lines": {"subtopics": ["Slope", "Intercepts", "Parallel"]},
+                                "Systems": {}}},
+           "Reading": {"Poetry": {}, "Drama": {}}}
+
+
+def name(layout, tile):
+    return None if tile is None else "/".join(layout.registry.path(tile)[1:])
+
+
+def test_tiles_in_reading_order():
+    layout = HeatmapLayout(TopicRegistry(CATALOG))
+    layout.set_columns(2)
+    grid = [[name(layout, layout.tile_at(row, column)) for column in range(2)] for row in range(layout.rows)]
+    assert grid == [[None, None],
+                    ["Algebra/Lines/Slope", "Algebra/Lines/Intercepts"],
+                    ["Algebra/Lines/Parallel", "Algebra/Systems"],
+                    [None, None],
+                    ["Poetry", "Drama"]]
+    assert layout.row(3) == ("header", 1) and layout.row(2) == ("tiles", 0, 2)
+    assert len(layout) == 6
+
+
+@pytest.mark.parametrize("columns", [1, 2, 3, 5, 10])
+def test_cell_and_tile_at_agree(columns):
+    registry = TopicRegistry(CATALOG)
+    layout = HeatmapLayout(registry)
+    layout.set_columns(columns)
+    for node_id in range(len(registry.paths)):
+        cell = layout.cell(node_id)
+        if node_id in layout.position:
+            assert layout.tile_at(*cell) == node_id
+        else:
+            assert cell is None
+    tiles = [layout.tile_at(row, column) for row in range(layout.rows) for column in range(columns)]
+    assert sorted(tile for tile in tiles if tile is not None) == sorted(layout.position)
+    assert layout.tile_at(-1, 0) is layout.tile_at(layout.rows, 0) is layout.tile_at(0, columns) is None
+
+
+def test_layout_follows_catalog_edits():
+    registry = TopicRegistry(CATALOG)
+    layout = HeatmapLayout(registry)
+    layout.set_columns(3)
+    lines = registry.ids[("Math", "Algebra", "Lines")]
+    registry.remove_child(lines, "Parallel")
+    registry.add_child(registry.ids[("Reading",)], "Essays")
+    layout.rebuild()
+    assert layout.columns == 3 and len(layout) == 6
+    assert name(layout, layout.tile_at(*layout.cell(registry.ids[("Reading", "Essays")]))) == "Essays"
+    assert layout.cell(registry.ids[("Math", "Algebra", "Lines", "Parallel")]) is None
+
+
+def test_rating_colors():
+    assert rating_color(None) == "#4a4a5a"
+    assert rating_color(1) == rating_color(-3) == "#d03a3a"
+    assert rating_color(10) == rating_color(12) == "#2ec26b"
+    assert rating_color(5.5) == "#e8c23a"
@@ -0,0 +1,74 @@
+import os
+
+from satprep import RatingHistory
+from satprep.registry import path_key
+
+ALGEBRA = path_key(("Math", "Algebra"))
+LINES = path_key(("Math", "Algebra", "Lines"))
+POETRY = path_key(("Reading", "Poetry"))
+
+
+def open_history(tmp_path, coalesce=0):
+    history = RatingHistory(str(tmp_path / "history"), coalesce=coalesce)
+    history.open()
+    return history
+
+
+def test_buckets_summarize_each_period(tmp_path):
+    history = open_history(tmp_path)
+    for when, key, rating in [(0, LINES, 2), (5, LINES, 4), (9, POETRY, 8), (25, ALGEBRA, 6), (31, LINES, 9)]:
+        history.record(key, rating, when)
+    algebra = history.keys_under(("Math", "Algebra"))
+    assert algebra == {history.key_id(LINES), history.key_id(ALGEBRA)}
+
+    assert history.buckets(algebra, 3, 0, 30) == [[0, 2, 4, 3, 2], [20, 6, 6, 6, 1]]
+    assert history.buckets(None, 3, 0, 30) == [[0, 2, 8, 14 / 3, 3], [20, 6, 6, 6, 1]]
+    assert list(history.samples(algebra, start=5, end=31)) == [(5, 0, 4), (25, 2, 6)]
+    assert history.time_span() == (0, 31)
+
+    # Samples on disk and in memory are bucketed alike.
+    history.flush()
+    history.record(LINES, 1, 40)
+    assert history.buckets(algebra, 2, 20, 60) == [[20, 6, 9, 7.5, 2], [40, 1, 1, 1, 1]]
+
+
+def test_slider_events_coalesce(tmp_path):
+    history = open_history(tmp_path, coalesce=2.0)
+    for when, rating in [(0, 3), (1, 4), (2.5, 5), (10, 6)]:
+        history.record(LINES, rating, when)
+    history.record(POETRY, 1, 10.5)
+    assert [(when, rating) for when, _, rating in history.samples()] == [(2.5, 5), (10, 6), (10.5, 1)]
+    assert (history.samples_recorded, history.samples_coalesced) == (3, 2)
+    # Times never go backwards.
+    history.record(LINES, 7, 4)
+    assert history.time_span() == (2.5, 10.5)
+
+
+def test_recovers_from_torn_writes(tmp_path):
+    history = open_history(tmp_path)
+    history.record(LINES, 3, 1)
+    history.record(POETRY, 5, 2)
+    history.close()
+
+    # A crash left one column longer than the others...
+    with open(history.ratings.path, "ab") as f:
+        f.write(b"\0\0\0\0")
+    # ...a sample whose key never reached keys.jsonl, and a torn key line.
+    with open(history.topics.path, "ab") as f:
+        f.write((7).to_bytes(4, "little"))
+    with open(history.times.path, "ab") as f:
+        f.write(b"\0" * 8)
+    with open(history.keys_path, "ab") as f:
+        f.write(b'"[\\"Math')
+
+    history = open_history(tmp_path)
+    assert list(history.samples()) == [(1, 0, 3), (2, 1, 5)]
+    assert history.keys == [LINES, POETRY]
+    assert [os.path.getsize(column.path) for column in history.columns] == [16, 8, 8]
+    history.record(ALGEBRA, 6, 3)
+    history.close()
+
+    history = open_history(tmp_path)
+    assert [(when, history.keys[key_id], rating) for when, key_id, rating in history.samples()] == [
+        (1, LINES, 3), (2, POETRY, 5), (3, ALGEBRA, 6)]
+    history.close()
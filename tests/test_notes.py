@@ -0,0 +1,58 @@
+import os
+
+from satprep import NoteSegment
+
+
+def open_segment(tmp_path):
+    segment = NoteSegment(str(tmp_path / "data.notes"))
+    segment.open()
+    return segment
+
+
+def test_torn_final_record_is_dropped(tmp_path):
+    segment = open_segment(tmp_path)
+    segment.put("a", "first")
+    segment.put("b", "second")
+    segment.close()
+
+    # A crash halfway through appending a new version of "a".
+    segment = open_segment(tmp_path)
+    segment.put("a", "third")
+    segment.flush()
+    size = segment.size
+    with open(segment.path, "r+b") as f:
+        f.truncate(size - 2)
+
+    segment = open_segment(tmp_path)
+    assert dict(segment.items()) == {"a": "first", "b": "second"}
+    assert os.path.getsize(segment.path) < size - 2
+    segment.put("c", "fourth")
+    segment.close()
+    assert dict(open_segment(tmp_path).items()) == {"a": "first", "b": "second", "c": "fourth"}
+
+
+def test_index_is_rebuilt_when_missing_or_stale(tmp_path):
+    segment = open_segment(tmp_path)
+    for key in "abc":
+        segment.put(key, key * 3)
+    segment.put("a", "new")
+    segment.delete("b")
+    segment.close()
+    expected = {"a": "new", "c": "ccc"}
+    assert dict(open_segment(tmp_path).items()) == expected
+
+    with open(segment.index_path) as f:
+        stale = f.read()
+    os.remove(segment.index_path)
+    rebuilt = open_segment(tmp_path)
+    assert dict(rebuilt.items()) == expected
+    assert rebuilt.live_bytes < rebuilt.size
+
+    # An index from before a compaction does not match the new generation.
+    rebuilt.compact()
+    assert rebuilt.live_bytes == rebuilt.size
+    rebuilt.put("d", "ddd")
+    rebuilt.close()
+    with open(segment.index_path, "w") as f:
+        f.write(stale)
+    assert dict(open_segment(tmp_path).items()) == dict(expected, d="ddd")
@@ -0,0 +1,36 @@
+import pytest
+
+from satprep import ProfileStore
+from test_storage import BACKENDS, PATH
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_evicted_profile_is_written_back(backend, tmp_path):
+    profiles = ProfileStore(str(tmp_path), mode=backend, capacity=2)
+    ann, errors = profiles.open("ann")
+    assert errors == []
+    ann.set_rating(ann.registry.ids[PATH], 4)
+    ann.set_note(ann.registry.ids[PATH], "Check the signs")
+    profiles.open("ben")
+    assert profiles.open("ann")[0] is ann
+
+    # ann was used last, so opening a third profile evicts ben, then ann.
+    profiles.open("cara")
+    assert not profiles.is_open("ben") and profiles.is_open("ann")
+    profiles.open("ben")
+    assert not profiles.is_open("ann")
+    assert profiles.stats == {"open": 2, "hits": 1, "misses": 4}
+
+    reopened, errors = profiles.open("ann")
+    assert errors == [] and reopened is not ann
+    assert reopened.get_rating(reopened.registry.ids[PATH]) == 4
+    assert reopened.get_note(reopened.registry.ids[PATH]) == "Check the signs"
+    assert profiles.names() == ["ann", "ben", "cara"]
+    profiles.close()
+    assert profiles.pop_errors() == []
+
+
+@pytest.mark.parametrize("name", ["", " ", ".hidden", "a/b"])
+def test_invalid_profile_names(name, tmp_path):
+    with pytest.raises(ValueError):
+        ProfileStore(str(tmp_path)).open(name)
@@ -0,0 +1,41 @@
+from satprep import TopicRegistry, path_key, subject_of
+
+CATALOG = {"Math": {"Algebra": {"Lines": {"subtopics": ["Slope", "Intercepts"]}}},
+           "Reading": {"Poetry": {}}}
+
+
+def test_interning_keeps_ids():
+    registry = TopicRegistry(CATALOG)
+    lines = registry.ids[("Math", "Algebra", "Lines")]
+    assert registry.intern(("Math", "Algebra", "Lines")) == lines
+    assert [registry.path(child)[-1] for child in registry.children_of(lines)] == ["Slope", "Intercepts"]
+    assert registry.parent(lines) == registry.ids[("Math", "Algebra")]
+    assert registry.key(lines) == path_key(("Math", "Algebra", "Lines")) == '["Math","Algebra","Lines"]'
+
+    # Removed and re-added nodes keep their id; re-adding drops the children.
+    algebra = registry.ids[("Math", "Algebra")]
+    slope = registry.ids[("Math", "Algebra", "Lines", "Slope")]
+    assert registry.remove_child(algebra, "Lines") == lines
+    assert not registry.is_linked(slope)
+    assert registry.add_child(algebra, "Lines") == lines
+    assert registry.is_linked(lines) and not registry.has_children(lines)
+    assert not registry.is_linked(slope)
+
+
+def test_keys_resolve_in_both_formats():
+    registry = TopicRegistry(CATALOG)
+    lines = registry.ids[("Math", "Algebra", "Lines")]
+    assert registry.resolve_key(path_key(("Math", "Algebra", "Lines"))) == lines
+    assert registry.resolve_key("Math - Algebra - Lines") == lines
+    assert subject_of("Math - Algebra - Lines") == subject_of(registry.key(lines)) == "Math"
+
+    # Unknown keys are interned without being linked into the tree.
+    count = len(registry.paths)
+    stored = registry.resolve_key("Reading - Poetry - Meter")
+    assert registry.path(stored) == ("Reading", "Poetry", "Meter")
+    assert len(registry.paths) == count + 1 and not registry.is_linked(stored)
+
+    # Nodes added after the first legacy lookup resolve too.
+    rhyme = registry.add_child(registry.ids[("Reading", "Poetry")], "Rhyme")
+    assert registry.resolve_key("Reading - Poetry - Rhyme") == rhyme
+    assert registry.resolve_key("Reading - Poetry - Meter") == stored
@@ -0,0 +1,47 @@
+import json
+import urllib.request
+
+import pytest
+from conftest import expand
+
+from satprep import export_delta, import_delta
+from test_undo import OVERRIDE, SUBTOPIC, TOPIC
+
+
+def post_changes(app, tmp_path, make_store):
+    from satprep.server import StudyServer
+
+    server = StudyServer(app.store, port=0, on_change=app.show_update).start()
+    try:
+        request = urllib.request.Request(f"{server.url}/changes", method="POST",
+                                         data=json.dumps({"changes": [OVERRIDE]}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            assert json.load(response)["applied"] == 1
+    finally:
+        server.stop()
+
+
+def poll_shared_files(app, tmp_path, make_store):
+    other = make_store("journal")
+    other.apply_catalog_changes([OVERRIDE])
+    app.show_update(app.store.poll_changes())
+
+
+def import_sync_file(app, tmp_path, make_store):
+    other = make_store("journal", tmp_path / "laptop")
+    other.apply_catalog_changes([OVERRIDE])
+    export_delta(other, tmp_path / "laptop.satsync")
+    app.show_update(import_delta(app.store, tmp_path / "laptop.satsync")[0])
+
+
+@pytest.mark.parametrize("deliver", [post_changes, poll_shared_files, import_sync_file])
+def test_replaced_subtopic_rows(deliver, tmp_path, make_store, make_app):
+    app = make_app(make_store("journal"))
+    registry = app.store.registry
+    expand(app, registry.ids[("Math", TOPIC)])
+    open_item = expand(app, registry.ids[("Math", TOPIC, SUBTOPIC)])
+
+    deliver(app, tmp_path, make_store)
+    assert app.math_tree.texts(open_item) == ["First", "Second"]
+    assert [registry.path(int(item))[-1] for item in app.math_tree.get_children(open_item)] == ["First", "Second"]
@@ -0,0 +1,58 @@
+from satprep import RatingRollup, TopicRegistry
+from test_registry import CATALOG
+
+
+def rate(rollup, ratings, node_id, rating):
+    old = ratings.pop(node_id, None)
+    if rating is not None:
+        ratings[node_id] = rating
+    return rollup.rating_changed(node_id, old, rating)
+
+
+def assert_matches_rebuild(rollup):
+    assert rollup.aggs == RatingRollup(rollup.registry, rollup.ratings).aggs
+
+
+def test_min_follows_rating_changes():
+    registry = TopicRegistry(CATALOG)
+    ids = registry.ids
+    slope = ids[("Math", "Algebra", "Lines", "Slope")]
+    intercepts = ids[("Math", "Algebra", "Lines", "Intercepts")]
+    ratings = {}
+    rollup = RatingRollup(registry, ratings)
+
+    assert rate(rollup, ratings, slope, 3) == [slope, ids[("Math", "Algebra", "Lines")],
+                                               ids[("Math", "Algebra")], ids[("Math",)]]
+    rate(rollup, ratings, intercepts, 6)
+    assert rollup.mastery("Math") == {"sum": 9.0, "count": 2, "min": 3, "mean": 4.5}
+
+    # Raising the minimum rescans it; clearing it falls back to the other.
+    rate(rollup, ratings, slope, 8)
+    assert rollup.mastery("Math")["min"] == 6
+    rate(rollup, ratings, intercepts, None)
+    assert rollup.mastery("Math") == {"sum": 8.0, "count": 1, "min": 8, "mean": 8.0}
+    assert_matches_rebuild(rollup)
+    assert rollup.mastery("Reading") == {"sum": 0.0, "count": 0, "min": None, "mean": None}
+
+
+def test_detach_and_attach_subtree():
+    registry = TopicRegistry(CATALOG)
+    ids = registry.ids
+    algebra, lines = ids[("Math", "Algebra")], ids[("Math", "Algebra", "Lines")]
+    ratings = {ids[("Math", "Algebra", "Lines", "Slope")]: 2, lines: 5, algebra: 7}
+    rollup = RatingRollup(registry, ratings)
+
+    assert rollup.detach(lines) == [algebra, ids[("Math",)]]
+    registry.remove_child(algebra, "Lines")
+    assert lines not in rollup.aggs
+    assert rollup.summary(algebra) == {"sum": 7.0, "count": 1, "min": 7, "mean": 7.0}
+    assert_matches_rebuild(rollup)
+
+    # Ratings of a re-added node count again; its old children are gone.
+    registry.add_child(algebra, "Lines")
+    assert rollup.attach(lines) == [lines, algebra, ids[("Math",)]]
+    assert rollup.mastery("Math") == {"sum": 12.0, "count": 2, "min": 5, "mean": 6.0}
+    assert_matches_rebuild(rollup)
+
+    # Unlinked nodes are left alone.
+    assert rate(rollup, ratings, ids[("Math", "Algebra", "Lines", "Slope")], 1) == []
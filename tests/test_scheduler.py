@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+from satprep import StudyScheduler
+from satprep.scheduler import repetitions_for
+from test_storage import LEAF
+
+START = date(2026, 3, 2)
+
+
+def plan(store, days, daily_minutes):
+    scheduler = StudyScheduler(store, START + timedelta(days=days), daily_minutes, start=START)
+    scheduler.build()
+    return scheduler
+
+
+def check(scheduler):
+    # No day is over capacity, and the bookkeeping matches the days.
+    assert all(len(sessions) <= scheduler.capacity for sessions in scheduler.days)
+    assert scheduler.free_days == [day for day, sessions in enumerate(scheduler.days)
+                                   if len(sessions) < scheduler.capacity]
+    placed = sorted((day, id(session)) for entries in scheduler.placed.values() for day, session in entries)
+    assert placed == sorted((day, id(session)) for day, sessions in enumerate(scheduler.days)
+                            for session in sessions)
+
+
+def sessions_of(scheduler, topic_id):
+    return sorted((day, session.repetition) for day, session in scheduler.placed.get(topic_id, ()))
+
+
+def test_capacity_limits_the_plan(make_store):
+    scheduler = plan(make_store(), 10, 60)
+    assert scheduler.capacity == 2 and len(scheduler.days) == 10
+    check(scheduler)
+    assert scheduler.free_days == [] and scheduler.unscheduled
+    assert scheduler.sessions_on(START + timedelta(days=3)) == scheduler.days[3]
+    assert scheduler.sessions_on(START - timedelta(days=1)) == []
+
+    # First passes are placed most urgent first.
+    placed = [session.priority for sessions in scheduler.days for session in sessions if session.repetition == 0]
+    left = [session.priority for session in scheduler.unscheduled if session.repetition == 0]
+    assert min(placed) >= max(left)
+
+
+def test_rating_change_replans_only_that_unit(make_store):
+    store = make_store()
+    leaf = store.registry.ids[LEAF]
+    scheduler = plan(store, 60, 24 * 60)
+    check(scheduler)
+    assert sessions_of(scheduler, leaf)[0][1] == 0
+    assert len(sessions_of(scheduler, leaf)) == repetitions_for(1)
+    others = {topic_id: sessions_of(scheduler, topic_id) for topic_id in scheduler.placed if topic_id != leaf}
+
+    store.set_rating(leaf, 10)
+    before = [list(sessions) for sessions in scheduler.days]
+    changed = scheduler.rating_changed(leaf)
+    check(scheduler)
+    assert len(sessions_of(scheduler, leaf)) == repetitions_for(10) == 1
+    assert changed == {day for day in range(len(before)) if before[day] != scheduler.days[day]}
+    assert {topic_id: sessions_of(scheduler, topic_id) for topic_id in others} == others
+
+    # Re-planning an ancestor covers the units below it.
+    store.set_rating(leaf, None)
+    scheduler.rating_changed(store.registry.parent(leaf))
+    check(scheduler)
+    assert len(sessions_of(scheduler, leaf)) == repetitions_for(1)
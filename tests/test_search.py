@@ -0,0 +1,46 @@
+from satprep import SearchIndex, tokenize
+
+
+def index_of(docs):
+    index = SearchIndex()
+    for doc, text in docs.items():
+        index.update(doc, text)
+    return index
+
+
+def test_ranking_needs_every_term():
+    index = index_of({"a": "Slope of a line", "b": "slope slope intercept line",
+                      "c": "Poetry meter"})
+    assert tokenize("Slope-intercept_form!") == ["slope", "intercept", "form"]
+    assert index.search("line slope") == [("b", 3), ("a", 2)]
+    assert index.search("slope poetry") == []
+    assert index.search("SLOPE", limit=1) == [("b", 2)]
+    assert index.search("  ") == []
+
+
+def test_updates_replace_one_document():
+    index = index_of({"a": "slope", "b": "slope"})
+    index.update("a", "meter")
+    assert index.search("slope") == [("b", 1)]
+    assert index.search("meter") == [("a", 1)]
+    index.remove("b")
+    index.update("a", "")
+    assert index.search("slope") == index.search("meter") == []
+    assert len(index) == 0 and index.postings == {}
+
+
+def test_saved_index_loads_only_for_the_same_data(tmp_path):
+    index = index_of({"a": "slope line", "b": "poetry", "c": "meter"})
+    index.remove("b")
+    path = str(tmp_path / "index.json")
+    index.save(path, [1, 2])
+
+    loaded = SearchIndex.load(path, [1, 2])
+    assert len(loaded) == 2 and loaded.docs == ["a", "c"]
+    assert loaded.search("line") == [("a", 1)]
+    loaded.update("c", "slope")
+    assert sorted(loaded.search("slope")) == [("a", 1), ("c", 1)]
+    assert SearchIndex.load(path, [1, 3]) is None
+    assert SearchIndex.load(str(tmp_path / "missing.json"), [1, 2]) is None
+    (tmp_path / "index.json").write_text("{")
+    assert SearchIndex.load(path, [1, 2]) is None
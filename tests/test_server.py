@@ -0,0 +1,48 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from test_storage import PATH
+
+
+@pytest.fixture
+def post(make_store):
+    from satprep.server import StudyServer
+
+    server = StudyServer(make_store(), port=0).start()
+
+    def post(changes):
+        # Returns the status and the decoded body of POST /changes.
+        request = urllib.request.Request(f"{server.url}/changes", method="POST",
+                                         data=json.dumps({"changes": changes}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    yield post
+    server.stop()
+
+
+def test_some_changes_rejected(post):
+    status, body = post([{"op": "rating", "path": list(PATH), "value": 4},
+                         {"op": "rating", "path": ["Math", "No such topic"], "value": 4},
+                         {"op": "rating", "path": list(PATH), "value": "high"}])
+    assert status == 200
+    assert body["applied"] == 1
+    assert [entry["index"] for entry in body["rejected"]] == [1, 2]
+
+
+@pytest.mark.parametrize("change", [
+    {"op": "rating", "path": list(PATH), "value": "high"},
+    {"op": "rating", "path": ["Math", "No such topic"], "value": 4},
+], ids=["invalid", "unknown topic"])
+def test_every_change_rejected(post, change):
+    status, body = post([change, change])
+    assert status == 422
+    assert body["applied"] == 0
+    assert [entry["index"] for entry in body["rejected"]] == [0, 1]
@@ -0,0 +1,229 @@
+import json
+import threading
+import time
+
+import pytest
+
+import satprep.storage
+from satprep import DATA_FILE, JOURNAL_FILE, FileLock, path_key
+
+BACKENDS = ["json", "journal", "sqlite"]
+PATH = ("Math", "Heart of Algebra", "Linear Equations")
+LEAF = PATH + ("Single-variable equations",)
+CUSTOM = {"op": "subtopic", "subject": "Reading", "topic": "Poetry", "subtopic": "Meter",
+          "details": {"subtopics": ["Iambs"], "key_concepts": [], "importance": "Low"}}
+
+
+def first_subtopic(store, subject):
+    topic, subtopics = next(iter(store.subject_topics(subject).items()))
+    return subject, topic, next(iter(subtopics))
+
+
+def finishes(fn, timeout=1.0):
+    # Runs fn on a thread; returns whether it finished within `timeout`.
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def state(store):
+    # Everything a store saves, keyed by path.
+    return {"ratings": {store.registry.path(topic_id): rating
+                        for topic_id, rating in store.current_ratings.items()},
+            "notes": dict(store.storage.iter_notes()),
+            "custom_topics": store.catalog.overlay_data()}
+
+
+def edit(store, rating=7):
+    ids = store.registry.ids
+    store.set_rating(ids[PATH], rating)
+    store.set_rating(ids[LEAF], 3.5)
+    store.set_note(ids[PATH], "Isolate the variable first.")
+    store.apply_catalog_changes([{"op": "topic", "subject": "Reading", "topic": "Poetry"}, CUSTOM])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_save_and_load_round_trip(backend, make_store):
+    store = make_store(backend)
+    edit(store)
+    store.set_rating(store.registry.ids[LEAF], None)
+    store.save()
+    saved = state(store)
+    store.close()
+
+    reopened = make_store(backend)
+    assert state(reopened) == saved
+    assert reopened.get_rating(reopened.registry.ids[LEAF]) is None
+    assert reopened.subject_topics("Reading")["Poetry"]["Meter"]["subtopics"] == ["Iambs"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_legacy_keys_are_migrated(backend, tmp_path, make_store):
+    legacy = " - ".join(PATH)
+    with open(tmp_path / DATA_FILE, "w") as f:
+        json.dump({"ratings": {legacy: 6}, "notes": {legacy: "old note"},
+                   "custom_topics": {"math": {}, "reading": {}}}, f)
+
+    store = make_store(backend)
+    topic_id = store.registry.ids[PATH]
+    assert store.get_rating(topic_id) == 6
+    assert store.get_note(topic_id) == "old note"
+    store.set_rating(store.registry.ids[LEAF], 2)
+    store.close()
+
+    reopened = make_store(backend)
+    assert reopened.get_rating(reopened.registry.ids[PATH]) == 6
+    assert dict(reopened.storage.iter_notes()) == {path_key(PATH): "old note"}
+    if backend == "json":
+        with open(tmp_path / DATA_FILE) as f:
+            assert set(json.load(f)["ratings"]) == {path_key(PATH), path_key(LEAF)}
+
+
+def test_torn_journal_record_is_dropped(tmp_path, make_store):
+    store = make_store("journal")
+    store.set_rating(store.registry.ids[PATH], 4)
+    store.close()
+    with open(tmp_path / JOURNAL_FILE, "ab") as f:
+        f.write(b'{"op":"rating","path":"[\\"Math\\",')
+
+    store = make_store("journal")
+    assert store.get_rating(store.registry.ids[PATH]) == 4
+    store.set_rating(store.registry.ids[LEAF], 9)
+    store.close()
+
+    store = make_store("journal")
+    assert store.get_rating(store.registry.ids[PATH]) == 4
+    assert store.get_rating(store.registry.ids[LEAF]) == 9
+    with open(tmp_path / JOURNAL_FILE, "rb") as f:
+        assert all(json.loads(line) for line in f)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_stores_sharing_files_converge(backend, make_store):
+    first = make_store(backend)
+    second = make_store(backend)
+    edit(first)
+    second.set_rating(second.registry.ids[first_subtopic(second, "Reading")], 5)
+    first.flush()
+    second.flush()
+
+    for _ in range(2):
+        for store in (first, second):
+            store.poll_changes()
+            store.flush()
+    assert state(first) == state(second)
+    assert second.get_note(second.registry.ids[PATH]) == "Isolate the variable first."
+    assert "Poetry" in second.subject_topics("Reading")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_later_edit_wins_on_shared_files(backend, make_store):
+    first = make_store(backend)
+    second = make_store(backend)
+    first.set_rating(first.registry.ids[PATH], 2)
+    first.flush()
+    second.set_rating(second.registry.ids[PATH], 8)
+    second.poll_changes()
+    second.flush()
+    first.poll_changes()
+    assert first.get_rating(first.registry.ids[PATH]) == 8
+    assert second.get_rating(second.registry.ids[PATH]) == 8
+
+
+def test_file_lock_is_reentrant_and_exclusive(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    lock = FileLock(str(tmp_path / "data.lock"))
+    with lock:
+        with lock:
+            pass
+        with open(tmp_path / "data.lock", "a+b") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(tmp_path / "data.lock", "a+b") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    lock.close()
+    assert lock.acquisitions == 1
+
+
+def test_rating_does_not_wait_for_the_writer(make_store):
+    # The writer thread holds the lock while it writes a snapshot.
+    store = make_store("json")
+    holding = threading.Event()
+    release = threading.Event()
+
+    def write():
+        with store.storage.lock:
+            holding.set()
+            release.wait(5)
+
+    threading.Thread(target=write, daemon=True).start()
+    assert holding.wait(5)
+    try:
+        assert finishes(lambda: store.set_rating(store.registry.ids[PATH], 5))
+    finally:
+        release.set()
+    store.flush()
+    assert make_store("json").get_rating(store.registry.ids[PATH]) == 5
+
+
+def test_compaction_does_not_block_appends(make_store, monkeypatch):
+    store = make_store("journal")
+    writing = threading.Event()
+    release = threading.Event()
+    write_json_atomic = satprep.storage.write_json_atomic
+
+    def slow_write(path, data, indent=4):
+        if path.endswith(".compact"):
+            writing.set()
+            release.wait(5)
+        return write_json_atomic(path, data, indent)
+
+    monkeypatch.setattr(satprep.storage, "write_json_atomic", slow_write)
+    store.storage.threshold = 1
+    store.set_rating(store.registry.ids[PATH], 1)
+    assert writing.wait(5)
+    try:
+        assert finishes(lambda: store.set_rating(store.registry.ids[LEAF], 2))
+    finally:
+        release.set()
+    store.close()
+
+    reopened = make_store("journal")
+    assert reopened.get_rating(reopened.registry.ids[PATH]) == 1
+    assert reopened.get_rating(reopened.registry.ids[LEAF]) == 2
+    assert reopened.storage.compactions == 0 and store.storage.compactions == 1
+
+
+def test_stores_sharing_history(make_store):
+    first = make_store()
+    second = make_store()
+    other = first_subtopic(second, "Reading")
+    first.set_rating(first.registry.ids[PATH], 4)
+    second.set_rating(second.registry.ids[other], 9)
+    first.flush()
+    second.flush()
+    first.set_rating(first.registry.ids[other], 6)
+    first.flush()
+
+    def means(store, path):
+        return [bucket[3] for bucket in store.progress(path, 1, 0, time.time() + 1)]
+
+    for store in (first, second, make_store()):
+        assert means(store, PATH) == [4]
+        assert means(store, other) == [7.5]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_save_drops_what_the_snapshot_lacks(backend, make_store):
+    store = make_store(backend)
+    edit(store)
+    store.flush()
+    store.storage.save({"ratings": {path_key(LEAF): 2}, "notes": {},
+                        "custom_topics": store.catalog.overlay_data()})
+    store.close()
+
+    reopened = make_store(backend)
+    assert state(reopened)["ratings"] == {LEAF: 2}
+    if backend == "sqlite":
+        assert state(reopened)["notes"] == {}
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from satprep import DATA_FILE, export_delta, import_delta
+from test_storage import CUSTOM, LEAF, PATH, edit, state
+
+
+def exchange(sender, receiver, path):
+    export_delta(sender, path)
+    return import_delta(receiver, path)
+
+
+@pytest.fixture
+def machines(tmp_path, make_store):
+    # Two copies of the study data, as on a desktop and a laptop.
+    def make(backend="json"):
+        return make_store(backend, tmp_path / "desktop"), make_store(backend, tmp_path / "laptop")
+
+    return make
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite"])
+def test_exchange_converges(backend, machines, tmp_path):
+    desktop, laptop = machines(backend)
+    edit(desktop)
+    laptop.set_rating(laptop.registry.ids[LEAF], 9)
+
+    exchange(desktop, laptop, tmp_path / "a.satsync")
+    exchange(laptop, desktop, tmp_path / "b.satsync")
+    assert state(desktop) == state(laptop)
+    # The laptop rated the leaf after the desktop did.
+    assert desktop.get_rating(desktop.registry.ids[LEAF]) == 9
+    assert laptop.subject_topics("Reading")["Poetry"]["Meter"]["subtopics"] == ["Iambs"]
+
+
+def test_import_is_idempotent(machines, tmp_path):
+    desktop, laptop = machines()
+    edit(desktop)
+    export_delta(desktop, tmp_path / "a.satsync")
+
+    _, read, applied = import_delta(laptop, tmp_path / "a.satsync")
+    assert applied == read > 0
+    before = state(laptop)
+    _, read, applied = import_delta(laptop, tmp_path / "a.satsync")
+    assert applied == 0
+    assert state(laptop) == before
+
+
+def test_last_writer_wins_in_any_order(machines, tmp_path):
+    desktop, laptop = machines()
+    laptop.set_rating(laptop.registry.ids[PATH], 3)
+    desktop.set_rating(desktop.registry.ids[PATH], 8)
+    export_delta(desktop, tmp_path / "a.satsync")
+    export_delta(laptop, tmp_path / "b.satsync")
+
+    import_delta(desktop, tmp_path / "b.satsync")
+    import_delta(laptop, tmp_path / "a.satsync")
+    assert desktop.get_rating(desktop.registry.ids[PATH]) == 8
+    assert laptop.get_rating(laptop.registry.ids[PATH]) == 8
+
+
+def test_delta_holds_only_what_the_peer_lacks(machines, tmp_path):
+    desktop, laptop = machines()
+    edit(desktop)
+    exchange(desktop, laptop, tmp_path / "a.satsync")
+    exchange(laptop, desktop, tmp_path / "b.satsync")
+
+    desktop.set_rating(desktop.registry.ids[PATH], 1)
+    desktop.set_note(desktop.registry.ids[PATH], None)
+    desktop.apply_catalog_changes([dict(CUSTOM, op="remove_subtopic")])
+    assert export_delta(desktop, tmp_path / "c.satsync") == 3
+    import_delta(laptop, tmp_path / "c.satsync")
+    assert laptop.get_rating(laptop.registry.ids[PATH]) == 1
+    assert laptop.get_note(laptop.registry.ids[PATH]) is None
+    assert laptop.subject_topics("Reading")["Poetry"] == {}
+    assert export_delta(desktop, tmp_path / "d.satsync", since=laptop.sync.vector) == 0
+
+
+def test_repeated_edits_take_one_stamp(machines, tmp_path):
+    desktop, laptop = machines()
+    lines = desktop.sync.lines
+    for rating in range(1, 11):
+        desktop.set_rating(desktop.registry.ids[PATH], rating)
+    desktop.set_note(desktop.registry.ids[PATH], "Draft")
+    desktop.poll_changes()
+    assert desktop.sync.lines == lines + 2
+
+    # Edits not yet stamped are stamped before a delta is made.
+    desktop.set_rating(desktop.registry.ids[LEAF], 2)
+    assert exchange(desktop, laptop, tmp_path / "a.satsync")[2] == 3
+    assert laptop.get_rating(laptop.registry.ids[PATH]) == 10
+
+
+def test_data_saved_before_syncing_is_sent(tmp_path, make_store):
+    (tmp_path / "desktop").mkdir()
+    with open(tmp_path / "desktop" / DATA_FILE, "w") as f:
+        json.dump({"ratings": {" - ".join(PATH): 6}, "custom_topics": {"math": {}, "reading": {}}}, f)
+    desktop = make_store("json", tmp_path / "desktop")
+    laptop = make_store("json", tmp_path / "laptop")
+
+    exchange(desktop, laptop, tmp_path / "a.satsync")
+    assert laptop.get_rating(laptop.registry.ids[PATH]) == 6
+
+
+def test_stamps_survive_reopening(machines, tmp_path):
+    desktop, laptop = machines()
+    desktop.set_rating(desktop.registry.ids[PATH], 4)
+    exchange(desktop, laptop, tmp_path / "a.satsync")
+    exchange(laptop, desktop, tmp_path / "b.satsync")
+    stamps, vector = dict(desktop.sync.stamps), dict(desktop.sync.vector)
+    directory = desktop.sync.path
+    desktop.close()
+
+    from satprep import SyncLog
+
+    log = SyncLog(directory)
+    assert not log.open()
+    assert log.stamps == stamps
+    assert log.vector == vector
+    assert log.peers == {laptop.sync.replica: laptop.sync.vector}
+    log.close()
+
+
+def test_invalid_files_are_rejected(machines, tmp_path):
+    _, laptop = machines()
+    path = tmp_path / "bad.satsync"
+    path.write_text(json.dumps({"format": "something else"}))
+    with pytest.raises(ValueError):
+        import_delta(laptop, path)
+    path.write_text(json.dumps({"format": "satprep-sync/1", "replica": "x", "vector": {}, "since": {},
+                                "changes": [{"op": "rating", "path": 1, "stamp": [1, "x"]}]}))
+    with pytest.raises(ValueError):
+        import_delta(laptop, path)
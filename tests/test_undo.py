@@ -0,0 +1,63 @@
+from conftest import expand
+
+from satprep import SATTopics
+
+TOPIC = next(iter(SATTopics.MATH_TOPICS))
+SUBTOPIC = next(iter(SATTopics.MATH_TOPICS[TOPIC]))
+BASE_LEAVES = list(SATTopics.MATH_TOPICS[TOPIC][SUBTOPIC]["subtopics"])
+OVERRIDE = {"op": "subtopic", "subject": "Math", "topic": TOPIC, "subtopic": SUBTOPIC,
+            "details": {"subtopics": ["First", "Second"], "key_concepts": [], "importance": "High"}}
+
+
+def leaves(store):
+    node_id = store.registry.ids[("Math", TOPIC, SUBTOPIC)]
+    return [store.registry.path(child)[-1] for child in store.registry.children_of(node_id)]
+
+
+def test_undo_redo_subtopic_override(make_store):
+    store = make_store()
+    store.apply_catalog_changes([OVERRIDE])
+    assert leaves(store) == ["First", "Second"]
+
+    store.undo()
+    assert leaves(store) == BASE_LEAVES
+    assert SUBTOPIC not in store.catalog.overlay["Math"].get(TOPIC, {})
+
+    store.redo()
+    assert leaves(store) == ["First", "Second"]
+
+
+def test_undo_redo_is_saved(make_store, tmp_path):
+    store = make_store("journal")
+    store.apply_catalog_changes([OVERRIDE])
+    store.undo()
+    store.close()
+    assert leaves(make_store("journal")) == BASE_LEAVES
+
+
+def test_undo_refills_open_subtopic_row(make_store, make_app):
+    app = make_app(make_store())
+    registry = app.store.registry
+    expand(app, registry.ids[("Math", TOPIC)])
+    item = expand(app, registry.ids[("Math", TOPIC, SUBTOPIC)])
+
+    app.apply_catalog_changes([OVERRIDE])
+    assert app.math_tree.texts(item) == ["First", "Second"]
+
+    app.show_update(app.store.undo(), keep_edits=False)
+    assert app.math_tree.texts(item) == BASE_LEAVES
+
+    app.show_update(app.store.redo(), keep_edits=False)
+    assert app.math_tree.texts(item) == ["First", "Second"]
+
+
+def test_undo_keeps_placeholder_on_closed_subtopic_row(make_store, make_app):
+    app = make_app(make_store())
+    registry = app.store.registry
+    expand(app, registry.ids[("Math", TOPIC)])
+    node_id = registry.ids[("Math", TOPIC, SUBTOPIC)]
+
+    app.apply_catalog_changes([OVERRIDE])
+    app.show_update(app.store.undo(), keep_edits=False)
+    assert app.math_tree.texts(registry.items[node_id]) == ["..."]
+    assert app.math_tree.texts(expand(app, node_id)) == BASE_LEAVES